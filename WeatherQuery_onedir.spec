@@ -9,7 +9,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=['weather', 'openpyxl', 'pandas'],
+    hiddenimports=['weather', 'weather_stats', 'weather_pattern', 'weather_query', 'weather_store', 'weather_binary', 'weather_history', 'weather_registry', 'weather_branches', 'weather_validate', 'weather_watchdog', 'weather_profile', 'weather_update', 'openpyxl', 'pandas'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""分页查询回归测试：数据重新加载后旧游标失效"""
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from weather import HOUR_COLS, Weather  # noqa: E402
+
+
+def _write_workbook(path, hour_id):
+    types = pd.DataFrame([[101, "晴", "晴夜", "", "", "", "", "春"], [102, "多云", "多云夜", "", "", "", "", "春"]],
+                         columns=["id", "nameDay", "nameNight", "c3", "c4", "c5", "c6", "desc"])
+    rows = pd.DataFrame([[d, 1, d] + [hour_id] * 24 for d in range(1, 6)], columns=["id", "month", "day"] + HOUR_COLS)
+    with pd.ExcelWriter(path) as writer:
+        types.to_excel(writer, sheet_name="weatherType", startrow=4, index=False)
+        rows.to_excel(writer, sheet_name="weatherList", startrow=4, index=False)
+    return str(path)
+
+
+def test_cursor_rejected_after_reload_with_same_day_count(tmp_path):
+    path = _write_workbook(tmp_path / "weather.xlsx", 101)
+    weather = Weather(custom_excel_path=path)
+    weather.read_file()
+    first = weather.get_weather_page(page_size=2, show_all=True)
+    assert weather.get_weather_page(first.cursor, page_size=2, show_all=True).done == 4
+
+    # 修改后重新加载（天数不变）：旧游标不能再用
+    _write_workbook(path, 102)
+    os.utime(path, (os.path.getatime(path), os.path.getmtime(path) + 10))
+    reloaded = Weather(custom_excel_path=path)
+    reloaded.read_file()
+    assert reloaded.get_weather_page(page_size=2, show_all=True).total == first.total
+    with pytest.raises(ValueError):
+        reloaded.get_weather_page(first.cursor, page_size=2, show_all=True)
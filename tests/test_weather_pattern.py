@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""weather_pattern 回归测试：时长上限为 0 的条件步骤按格式错误拒绝"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from weather import Weather  # noqa: E402
+from weather_pattern import compile_pattern  # noqa: E402
+
+
+@pytest.mark.parametrize("text", ["119{0}", "101 > 119{0,0}", "101 > 119{,0}"])
+def test_zero_length_step_rejected(text):
+    with pytest.raises(ValueError, match="时长上限至少为 1 小时"):
+        compile_pattern(text, Weather())
+
+
+def test_zero_length_gap_allowed():
+    pattern = compile_pattern("101 > *{0} > 119{1,2}", Weather())
+    assert [(step.lo, step.hi) for step in pattern.steps] == [(1, pattern.steps[0].hi), (1, 2)]
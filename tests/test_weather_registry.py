@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""weather_registry 回归测试：被引用的数据不会被同一文件的其他加载顶替或淘汰"""
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from weather import DEFAULT_WEATHER_CATEGORIES, HOUR_COLS  # noqa: E402
+from weather_registry import DatasetRegistry  # noqa: E402
+
+
+def _write_workbook(path, hour_id=101):
+    types = pd.DataFrame([[101, "晴", "晴夜", "", "", "", "", "春"], [119, "极光", "极光夜", "", "", "", "", "冬"]],
+                         columns=["id", "nameDay", "nameNight", "c3", "c4", "c5", "c6", "desc"])
+    rows = pd.DataFrame([[1, 1, 1] + [hour_id] * 24, [2, 1, 2] + [119] * 24], columns=["id", "month", "day"] + HOUR_COLS)
+    with pd.ExcelWriter(path) as writer:
+        types.to_excel(writer, sheet_name="weatherType", startrow=4, index=False)
+        rows.to_excel(writer, sheet_name="weatherList", startrow=4, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    return _write_workbook(tmp_path / "weather.xlsx")
+
+
+def _refs(registry, weather):
+    return [entry.refs for entry in registry._items.values() if entry.weather is weather]
+
+
+def test_acquired_entry_survives_load_with_other_categories(workbook):
+    registry = DatasetRegistry(max_items=1)
+    w = registry.load(workbook)
+    assert registry.acquire(w)
+
+    other_categories = dict(DEFAULT_WEATHER_CATEGORIES, 测试分类=[119])
+    other = registry.load(workbook, categories=other_categories)
+    assert other is not w
+    assert other.categories == other_categories
+    # 引用中的数据仍在登记表中，按原分类表仍能取到它
+    assert _refs(registry, w) == [1]
+    assert registry.get(workbook, DEFAULT_WEATHER_CATEGORIES) is w
+
+    registry.release(w)
+    assert _refs(registry, w) == [0]
+
+
+def test_put_keeps_referenced_entry_with_same_key(workbook):
+    registry = DatasetRegistry()
+    w = registry.load(workbook)
+    assert registry.acquire(w)
+
+    duplicate = DatasetRegistry().load(workbook)
+    assert registry.put(workbook, duplicate) is w
+    assert _refs(registry, w) == [1]
+
+    registry.release(w)
+    assert _refs(registry, w) == [0]
+
+
+def test_acquire_does_not_swap_evicted_data_over_newer_entry(workbook, tmp_path):
+    registry = DatasetRegistry(max_items=1)
+    w = registry.load(workbook)
+    registry.load(_write_workbook(tmp_path / "other.xlsx", hour_id=119))  # 挤出 w
+    newer = registry.load(workbook)
+    assert newer is not w
+    assert not registry.acquire(w)
+    assert registry.get(workbook) is newer
@@ -16,45 +16,742 @@ def _ensure_deps():
 
 
 _ensure_deps()
+import csv
+import hashlib
+import io
+import itertools
+import json
 import os
+import sys
+import threading
+import numpy as np
 import pandas as pd
 
+HOUR_COLS = [f'h{i}' for i in range(24)]
+
+# 两张表读取后的列类型（见 type_schema / list_schema）：id / 月 / 日 / 小时为可空小整数（空格子、非数字为 <NA>），名称为分类字符串。
+# weatherType 只保留查询用到的列：id、nameDay 与第 8 列的类型名（季节、流星雨规模、彩虹等，表头不固定，按位置取并改名为 typeName）；
+# 对比报告需要全部列时用 Weather.read_full_type()。weatherList 只保留 id、month、day、h0~h23
+TYPE_NAME_COLUMN = 'typeName'
+TYPE_NAME_POSITION = 7
+TYPE_COLUMNS = ['id', 'nameDay', TYPE_NAME_COLUMN]
+LIST_COLUMNS = ['id', 'month', 'day'] + HOUR_COLS
+_INT_DTYPES = ('Int8', 'Int16', 'Int32', 'Int64')
+
+# 天气分类：分类名 -> ID 列表（元素可为整数或 "起-止" 字符串）。
+# 可通过 Weather(categories=...) 替换（GUI 从配置文件的 weather_categories 读取），无需改代码。
+# SPECIAL_CATEGORY 为「特殊天气」的统一判定（单日特殊天气、范围特殊天气都以此为准）。
+SPECIAL_CATEGORY = "特殊天气"
+DEFAULT_WEATHER_CATEGORIES = {
+    "晴天": [101, 102, 105],
+    "雨天": [201, 202, 203, 204],
+    "酷暑": [104],
+    "花瓣雨": [106],
+    "流星雨": ["107-118"],
+    "极光": [119, 120, 121],
+    "雪天": [211, 212, 213],  # 小雪、中雪、大雪
+    "彩虹": ["301-305"],
+    SPECIAL_CATEGORY: [104, 106, "107-121", "211-213", "301-305"],
+}
+
+# 分支注册表：分支名 -> 目录（项目根目录，或 weather.xlsx 所在的 logic 目录）。
+# 以下为默认值；可用 set_branches() 替换（GUI 从配置文件的 branches 读取），无需改代码。
+DEFAULT_BRANCHES = {
+    'stage': 'H:\\zhangjunjie_stage_1\\RawAssets\\DesignerAssets\\NewDatabase\\logic',
+    'hotfix': 'H:\\zhangjunjie_obt_hotfix1_1\\RawAssets\\DesignerAssets\\NewDatabase\\logic',
+    'review': 'H:\\zhangjunjie_obt_review1_1\\RawAssets\\DesignerAssets\\NewDatabase\\logic',
+    'release': 'H:\\zhangjunjie_obt_release3_1\\RawAssets\\DesignerAssets\\NewDatabase\\logic'
+}
+BRANCHES = dict(DEFAULT_BRANCHES)
+
+
+def set_branches(branches):
+    """替换分支注册表（分支名 -> 目录）；传入空值时恢复默认"""
+    BRANCHES.clear()
+    BRANCHES.update(branches or DEFAULT_BRANCHES)
+
+
+def resolve_excel_path(path):
+    """项目根目录 / logic 目录 / weather.xlsx 完整路径 -> weather.xlsx 路径（文件不存在时返回按项目根目录拼接的路径）"""
+    path = path.strip()
+    if os.path.isfile(path):
+        return path
+    logic = os.path.join(path, "weather.xlsx")
+    if os.path.isfile(logic):
+        return logic
+    return os.path.join(path, Weather.RELATIVE_EXCEL_PATH)
+
+
+def normalize_path(path):
+    """绝对路径并统一大小写（Windows），用作按文件登记、记录时的键"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+# 各月天数（按闰年，2 月 29 天）；日期序号 doy = 该日在闰年中的第几天（从 0 起），小时序号 = doy*24 + 小时
+MONTH_DAYS = (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+_MONTH_START = np.concatenate([[0], np.cumsum(MONTH_DAYS)[:-1]]).astype(np.int32)
+
+
+def day_ordinals(months, days):
+    """月、日数组 -> 日期序号数组（0~365），非法日期为 -1"""
+    months = np.asarray(months, dtype=np.int32)
+    days = np.asarray(days, dtype=np.int32)
+    valid = (months >= 1) & (months <= 12) & (days >= 1)
+    m0 = np.clip(months - 1, 0, 11)
+    valid &= days <= np.asarray(MONTH_DAYS, dtype=np.int32)[m0]
+    return np.where(valid, _MONTH_START[m0] + days - 1, -1).astype(np.int32)
+
+
+def hour_ordinals(months, days, hours):
+    """月、日、小时数组 -> 全年小时序号数组（doy*24 + 小时），非法日期或小时不在 0~23 时为 -1"""
+    doy = day_ordinals(months, days).astype(np.int64)
+    hours = np.asarray(hours, dtype=np.int64)
+    valid = (doy >= 0) & (hours >= 0) & (hours <= 23)
+    return np.where(valid, doy * 24 + hours, -1)
+
+
+def file_fingerprint(path):
+    """文件内容指纹（SHA-256 十六进制），用于判断 weather.xlsx 是否变化"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def frame_to_json(df):
+    """DataFrame -> (JSON 文本, 列类型字典)，用于把读取的表存入索引库 / 历史库"""
+    dtypes = {str(c): str(t) for c, t in df.dtypes.items()}
+    return df.to_json(orient="split", force_ascii=False), dtypes
+
+
+def frame_from_json(text, dtypes):
+    """frame_to_json 的逆过程：全空列在 JSON 中会变为 object，按记录的列类型还原"""
+    df = pd.read_json(io.StringIO(text), orient="split", dtype=False, convert_dates=False)
+    return df.astype({c: dtypes[str(c)] for c in df.columns if dtypes.get(str(c), "object") != "object"})
+
+
+def file_stamp(path):
+    """(文件大小, 修改时间)：低成本判断文件是否变化；文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _is_nullable_int(column):
+    return pd.api.types.is_extension_array_dtype(column.dtype) and pd.api.types.is_integer_dtype(column.dtype)
+
+
+def _small_int(column, integers_only=False):
+    """一列 -> 能容纳其取值的最小可空整数列（Int8 / Int16 / Int32 / Int64）。空格子与非数字为 <NA>；
+    非整数按截断取整（与小时天气 ID 一直以来的解析一致），integers_only 时为 <NA>。
+    返回 (新列, [(行号, 'non_numeric' / 'non_integer', 原值文本), ...])"""
+    numeric = pd.to_numeric(column, errors='coerce').to_numpy(dtype='float64', na_value=np.nan, copy=True)
+    numeric[~(np.abs(numeric) < 2 ** 63)] = np.nan
+    non_numeric = np.isnan(numeric) & ~column.isna().to_numpy()
+    non_integer = ~np.isnan(numeric) & (numeric != np.floor(numeric))
+    issues = []
+    if non_numeric.any() or non_integer.any():
+        raw = column.to_numpy(dtype=object)
+        issues = [(int(r), 'non_numeric' if non_numeric[r] else 'non_integer', repr(raw[r]))
+                  for r in np.flatnonzero(non_numeric | non_integer)]
+    if integers_only:
+        numeric[non_integer] = np.nan
+    else:
+        numeric = np.trunc(numeric)
+    present = numeric[~np.isnan(numeric)]
+    low, high = (present.min(), present.max()) if len(present) else (0, 0)
+    dtype = next(t for t in _INT_DTYPES if np.iinfo(t.lower()).min <= low and high <= np.iinfo(t.lower()).max)
+    return pd.Series(numeric, index=column.index, name=column.name).astype(dtype), issues
+
+
+def _typed_frame(df, int_columns, category_columns, sheet, integers_only):
+    """df 中的 int_columns 转为可空小整数、category_columns 转为分类，其余列不变；没有要转换的列时返回 df 本身。
+    返回 (表, 单元格问题)：问题为 [(表名, 行号, 列名, 'non_numeric' / 'non_integer', 原值文本), ...]，没有转换整数列时为 None"""
+    columns = {}
+    issues = None
+    changed = False
+    for name in df.columns:
+        column = df[name]
+        if name in int_columns and not _is_nullable_int(column):
+            column, bad = _small_int(column, integers_only)
+            issues = (issues or []) + [(sheet, r, str(name), kind, text) for r, kind, text in bad]
+            changed = True
+        elif name in category_columns and not isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.astype('category')
+            changed = True
+        columns[name] = column
+    return (pd.DataFrame(columns, index=df.index) if changed else df), issues
+
+
+def type_schema(df, prune=True):
+    """weatherType 按列类型规则整理（可重复调用）：id 为可空整数（非整数为 <NA>），nameDay 与类型名为分类。
+    prune 时只保留 TYPE_COLUMNS（第 8 列改名为 typeName），否则保留全部列与原列名（对比用）。返回 (表, 单元格问题或 None)"""
+    if prune:
+        if TYPE_NAME_COLUMN not in df.columns and df.shape[1] > TYPE_NAME_POSITION:
+            df = df.rename(columns={df.columns[TYPE_NAME_POSITION]: TYPE_NAME_COLUMN})
+        keep = [c for c in TYPE_COLUMNS if c in df.columns]
+        if keep != list(df.columns):
+            df = df[keep]
+        names = ['nameDay', TYPE_NAME_COLUMN]
+    else:
+        names = ['nameDay'] + ([df.columns[TYPE_NAME_POSITION]] if df.shape[1] > TYPE_NAME_POSITION else [])
+    return _typed_frame(df, ['id'], names, 'weatherType', integers_only=True)
+
+
+def list_schema(df):
+    """weatherList 按列类型规则整理（可重复调用）：只保留 LIST_COLUMNS，均为可空小整数（非整数截断取整）。
+    返回 (表, 单元格问题或 None)"""
+    keep = [c for c in df.columns if c in LIST_COLUMNS]
+    if len(keep) != df.shape[1]:
+        df = df[keep]
+    return _typed_frame(df, LIST_COLUMNS, [], 'weatherList', integers_only=False)
+
+
+def ordinal_to_month_day(doy):
+    """日期序号 -> (月, 日)"""
+    doy = int(doy)
+    month = int(np.searchsorted(_MONTH_START, doy, side='right'))
+    return month, doy - int(_MONTH_START[month - 1]) + 1
+
+
+def run_bounds(values, breaks=None):
+    """一维数组的游程：返回 (起点下标, 终点下标(不含))。值变化处或 breaks[i] 为 True 处（i 与 i-1 之间断开）开始新游程"""
+    n = len(values)
+    if n == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    new_run = np.empty(n, dtype=bool)
+    new_run[0] = True
+    new_run[1:] = values[1:] != values[:-1]
+    if breaks is not None:
+        new_run |= breaks
+    starts = np.flatnonzero(new_run)
+    ends = np.append(starts[1:], n)
+    return starts, ends
+
+
+def parse_id_spec(spec):
+    """把分类配置中的 ID 列表展开为整数列表：支持 119、"119"、"107-118" 混写"""
+    if isinstance(spec, (int, str)):
+        spec = [spec]
+    ids = []
+    for item in spec:
+        if isinstance(item, str) and "-" in item.strip().lstrip("-"):
+            lo, hi = item.split("-", 1)
+            ids.extend(range(int(lo), int(hi) + 1))
+        else:
+            ids.append(int(item))
+    return ids
+
+
+def format_id_ranges(ids):
+    """把 ID 列表压缩为「104、106、107-121」形式，用于提示文字与报告"""
+    ids = sorted(set(int(x) for x in ids))
+    parts = []
+    i = 0
+    while i < len(ids):
+        j = i
+        while j + 1 < len(ids) and ids[j + 1] == ids[j] + 1:
+            j += 1
+        parts.append(str(ids[i]) if i == j else f"{ids[i]}-{ids[j]}")
+        i = j + 1
+    return "、".join(parts)
+
+
+class _NameTable(dict):
+    """天气 ID -> 名称 的共享表：首次访问时解析并 intern，同一名称在所有查询结果中只存一份"""
+
+    def __init__(self, resolve):
+        super().__init__()
+        self._resolve = resolve
+
+    def __missing__(self, wid):
+        name = self._resolve(wid)
+        if isinstance(name, str):
+            name = sys.intern(name)
+        # 多个查询线程可能同时解析同一 ID：以先写入的为准
+        return self.setdefault(wid, name)
+
+
+class _WeatherData:
+    """read_file 后编译出的紧凑数据：与 weatherList 行对齐的月、日数组，
+    (行数 × 24) 的小时天气 ID 矩阵（空/非数字单元格为 -1），以及共享名称表。
+    derived 为已算好的 DERIVED 数组（如编译文件中内存映射的只读视图），hour_bits 为已算好的小时分类位掩码，
+    给出时直接使用，不再重新计算"""
+    __slots__ = ("serial", "months", "days", "doy", "order", "loose_rows", "row_of_doy", "hour_ids", "names", "category_bits",
+                 "id_bits", "hour_bits", "year_ids", "seg_start", "seg_end", "seg_id", "fragments", "fragments_lock")
+
+    # 只由 months / days / hour_ids 决定的派生数组（与分类表无关），编译文件中按此名单存放
+    DERIVED = ("doy", "order", "loose_rows", "row_of_doy", "year_ids", "seg_start", "seg_end", "seg_id")
+
+    _serials = itertools.count(1)
+
+    def __init__(self, months, days, hour_ids, names, category_bits, id_bits, derived=None, hour_bits=None):
+        # 每次编译（每次加载）唯一的序号，分页游标据此识别数据是否已重新加载
+        self.serial = next(_WeatherData._serials)
+        self.months = months
+        self.days = days
+        self.hour_ids = hour_ids
+        self.names = names
+        # 分类名 -> 位值；id_bits[id] 为该 ID 所属分类位掩码（末位留 0，hour_ids 中的 -1 正好索引到它）
+        self.category_bits = category_bits
+        self.id_bits = id_bits
+        self.hour_bits = id_bits[hour_ids] if hour_bits is None else hour_bits
+        if derived is not None:
+            for name in self.DERIVED:
+                setattr(self, name, derived[name])
+        else:
+            self._derive()
+        # 每行（每天）渲染好的输出片段（_DayFragment），首次用到时生成；数据不变则一直有效。
+        # 数据登记后由多个查询线程共用，写入片段时持 fragments_lock，已有片段不再覆盖
+        self.fragments = [None] * len(months)
+        self.fragments_lock = threading.Lock()
+
+    def _derive(self):
+        months, days, hour_ids = self.months, self.days, self.hour_ids
+        # 日期序号；order 为合法且不重复日期的行号（按日期排序），用于把全年拼成连续的逐小时序列
+        self.doy = day_ordinals(months, days)
+        valid = np.flatnonzero(self.doy >= 0)
+        _, first = np.unique(self.doy[valid], return_index=True)
+        self.order = valid[first]
+        # 不在全年序列中的行（重复日期的后续行、非法日期行），按行号排序；时段查询对它们逐行单独合并
+        self.loose_rows = np.setdiff1d(np.arange(len(months)), self.order)
+        self.row_of_doy = np.full(sum(MONTH_DAYS), -1, dtype=np.int64)
+        self.row_of_doy[self.doy[self.order]] = self.order
+        # 按小时序号直接索引的全年天气 ID 表（366*24 项，缺失日期为 -1），逐点 / 时间窗查询用
+        self.year_ids = np.full(sum(MONTH_DAYS) * 24, -1, dtype=np.int32)
+        self.year_ids.reshape(-1, 24)[self.doy[self.order]] = hour_ids[self.order]
+        # 全年时段模型：在跨日相连的逐小时序列上做一次游程，得到每段的起止小时序号（止不含）与 ID；
+        # 缺失日期处断开。各按日视图都是它在当日 [doy*24, doy*24+24) 上的投影。
+        ordinals = (self.doy[self.order].astype(np.int64)[:, None] * 24 + np.arange(24)).ravel()
+        ids = hour_ids[self.order].ravel()
+        breaks = np.zeros(len(ordinals), dtype=bool)
+        breaks[1:] = np.diff(ordinals) != 1
+        starts, ends = run_bounds(ids, breaks)
+        self.seg_start = ordinals[starts] if len(ids) else np.zeros(0, dtype=np.int64)
+        self.seg_end = ordinals[ends - 1] + 1 if len(ids) else np.zeros(0, dtype=np.int64)
+        self.seg_id = ids[starts] if len(ids) else np.zeros(0, dtype=np.int32)
+
+
+class _DayFragment:
+    """某一行（一天）渲染好的输出片段：文本块（标题 + 逐段天气）、24 小时 ID（空单元格为 None）、
+    逐段表格行（时间段, 天气, ID）及带日期的表格行。范围 / 全部日期查询直接拼接各天的片段"""
+    __slots__ = ("text", "ids", "table", "dated_table")
+
+    def __init__(self, text, ids, table, dated_table):
+        self.text = text
+        self.ids = ids
+        self.table = table
+        self.dated_table = dated_table
+
+
+class WeatherPage:
+    """分页查询（get_weather_page / iter_pages）的一页：若干天的文本、逐小时 ID 与表格行。
+    cursor 为取下一页的续传游标，已是最后一页时为 None；各页 text 以换行相连即为一次性查询的完整文本"""
+    __slots__ = ("text", "ids", "table_columns", "table_rows", "cursor", "done", "total")
+
+    def __init__(self, text, ids, table_columns, table_rows, cursor, done, total):
+        self.text = text
+        self.ids = ids
+        self.table_columns = table_columns
+        self.table_rows = table_rows
+        self.cursor = cursor
+        self.done = done      # 截至本页已输出的天数
+        self.total = total    # 查询涉及的总天数
+
+    def __repr__(self):
+        return f"WeatherPage({self.done}/{self.total}, cursor={self.cursor!r})"
+
+
+class WeatherSegment:
+    """一段连续的同 ID 天气，起止为全年小时序号（doy*24 + 小时，end 不含），可跨零点、跨多日。
+    month/day/start 为开始日期与开始小时；end 为从开始当日 0 点起算的结束小时（跨日时大于 24），
+    end_month/end_day/end_hour 为结束日期与该日的结束小时（1~24）。
+    日期非法的行（如 2月30日）不在全年序列中：date 为该行的 (月, 日)，起止序号即当日小时（0~24）。
+    记录不保存名称字符串，name 由所属数据集的共享名称表按需解析；
+    可像旧版列表一样解包为 (month, day, start, end, name)；天气 ID 只作为属性 wid 提供。"""
+    __slots__ = ("start_ordinal", "end_ordinal", "wid", "_names", "_date")
+
+    def __init__(self, start_ordinal, end_ordinal, wid, names, date=None):
+        self.start_ordinal = start_ordinal
+        self.end_ordinal = end_ordinal
+        self.wid = wid
+        self._names = names
+        self._date = date
+
+    def _month_day(self, ordinal):
+        return self._date if self._date is not None else ordinal_to_month_day(ordinal // 24)
+
+    @property
+    def month(self):
+        return self._month_day(self.start_ordinal)[0]
+
+    @property
+    def day(self):
+        return self._month_day(self.start_ordinal)[1]
+
+    @property
+    def start(self):
+        return self.start_ordinal % 24
+
+    @property
+    def end(self):
+        return self.end_ordinal - self.start_ordinal // 24 * 24
+
+    @property
+    def end_month(self):
+        return self._month_day(self.end_ordinal - 1)[0]
+
+    @property
+    def end_day(self):
+        return self._month_day(self.end_ordinal - 1)[1]
+
+    @property
+    def end_hour(self):
+        return (self.end_ordinal - 1) % 24 + 1
+
+    @property
+    def hours(self):
+        return self.end_ordinal - self.start_ordinal
+
+    @property
+    def spans_days(self):
+        return self.end > 24
+
+    @property
+    def name(self):
+        return self._names[self.wid]
+
+    def __iter__(self):
+        return iter((self.month, self.day, self.start, self.end, self.name))
+
+    def __getitem__(self, i):
+        return tuple(self)[i]
+
+    def __len__(self):
+        return 5
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.month}月{self.day}日 {self.start}点~{self.end_month}月{self.end_day}日 {self.end_hour}点, id={self.wid})"
+
+
+class WeatherIdSegment(WeatherSegment):
+    """find_weather_ids_time_ranges 返回的时段：与旧版该接口的列表一致，解包为 (month, day, start, end, wid, name)"""
+    __slots__ = ()
+
+    def __iter__(self):
+        return iter((self.month, self.day, self.start, self.end, self.wid, self.name))
+
+    def __len__(self):
+        return 6
+
 
 class Weather:
     # 自定义路径时，在此相对路径下查找 weather.xlsx（根目录由调用方选择）
     RELATIVE_EXCEL_PATH = os.path.join("RawAssets", "DesignerAssets", "NewDatabase", "logic", "weather.xlsx")
 
-    def __init__(self, branch='stage', custom_excel_path=None):
+    # 两张原始表；由编译文件打开时先不解析，首次访问 df_weather_type / df_weather_list 时由 _frames_loader 加载
+    _df_weather_type = None
+    _df_weather_list = None
+    _frames_loader = None
+    _validation = None
+    # 完整的 weatherType（只在调用方提供时保留，见 read_full_type）、读取时发现的非数字 / 非整数单元格
+    # （见 _typed_frame；None 表示未知，如由已整理的表构造）、读取时源文件的 (大小, 修改时间)
+    _df_weather_type_full = None
+    _cell_issues = None
+    _source_stamp = None
+
+    def __init__(self, branch='stage', custom_excel_path=None, categories=None, branches=None):
+        # 两张表延迟加载时的锁：同一份数据可能被多个线程（查询、对比、预加载）同时首次访问
+        self._frames_lock = threading.Lock()
+        # 数据检查结果写入时的锁：多个查询线程同时首次 validate() 时以先算完的为准
+        self._validation_lock = threading.Lock()
+        # 天气分类表（分类名 -> ID 列表），默认 DEFAULT_WEATHER_CATEGORIES
+        self.categories = dict(categories) if categories else dict(DEFAULT_WEATHER_CATEGORIES)
         # 若指定了自定义 excel 路径，直接使用
         if custom_excel_path:
             self.path = custom_excel_path
             self.current_branch = 'custom'
             self.branches = {}
             return
-        # 定义4个分支路径
-        self.branches = {
-            'stage': 'H:\\zhangjunjie_stage_1\\RawAssets\\DesignerAssets\\NewDatabase\\logic',
-            'hotfix': 'H:\\zhangjunjie_obt_hotfix1_1\\RawAssets\\DesignerAssets\\NewDatabase\\logic',
-            'review': 'H:\\zhangjunjie_obt_review1_1\\RawAssets\\DesignerAssets\\NewDatabase\\logic',
-            'release': 'H:\\zhangjunjie_obt_release3_1\\RawAssets\\DesignerAssets\\NewDatabase\\logic'
-        }
-        self.current_branch = branch if branch in self.branches else 'stage'
-        branch_path = self.branches[self.current_branch]
-        self.path = f"{branch_path}\\weather.xlsx"
+        # 分支注册表：默认取模块级 BRANCHES（可由配置文件覆盖）
+        self.branches = dict(branches if branches is not None else BRANCHES)
+        if not self.branches:
+            raise ValueError("未配置任何分支")
+        if branch in self.branches:
+            self.current_branch = branch
+        else:
+            self.current_branch = 'stage' if 'stage' in self.branches else next(iter(self.branches))
+        self.path = resolve_excel_path(self.branches[self.current_branch])
     
     def read_file(self):
-        self.df_weather_type = pd.read_excel(self.path, sheet_name='weatherType',skiprows=4)
-        self.df_weather_list = pd.read_excel(self.path, sheet_name='weatherList',skiprows=4)
+        # 同一文件（内容未变、分类表相同）已在进程内加载过时直接共用，不再解析；
+        # 经 REGISTRY.load 加载，多个线程同时读同一文件时只解析一次（见 weather_registry）
+        from weather_registry import REGISTRY
+        shared = REGISTRY.load(self.path, lambda path: self._read_excel(), self.categories)
+        if shared is not self:
+            self._share(shared)
         return self.df_weather_type, self.df_weather_list
 
+    def _read_excel(self):
+        """直接解析 Excel 并编译（不经数据登记表），返回 self"""
+        self._source_stamp = file_stamp(self.path)
+        with pd.ExcelFile(self.path) as book:
+            df_type = book.parse('weatherType', skiprows=4)
+            df_list = book.parse('weatherList', skiprows=4, usecols=lambda c: c in LIST_COLUMNS)
+        self._set_frames(df_type, df_list)
+        self._compile()
+        return self
+
+    def _share(self, other):
+        """与内容相同的另一份数据共用已解析的两张表与编译结果（均只读）；对方的表尚未解析时，首次访问时经对方解析一次"""
+        if other._frames_loader is not None:
+            self._df_weather_type = self._df_weather_list = None
+            self._frames_loader = lambda: (other.df_weather_type, other.df_weather_list)
+        else:
+            self._frames_loader = None
+            self._df_weather_type, self._df_weather_list = other._df_weather_type, other._df_weather_list
+        self._data = other._data
+        self._validation = other._validation
+        self._df_weather_type_full = other._df_weather_type_full
+        self._cell_issues = other._cell_issues
+        self._source_stamp = other._source_stamp
+
+    def _set_frames(self, df_weather_type, df_weather_list, keep_full_type=False):
+        """按列类型规则整理并保存两张表（见 type_schema / list_schema）；表已整理过时保留已记录的单元格问题"""
+        if keep_full_type:
+            self._df_weather_type_full = type_schema(df_weather_type, prune=False)[0]
+        self._df_weather_type, type_issues = type_schema(df_weather_type)
+        self._df_weather_list, list_issues = list_schema(df_weather_list)
+        if type_issues is not None or list_issues is not None:
+            self._cell_issues = (type_issues or []) + (list_issues or [])
+
+    @property
+    def df_weather_type(self):
+        self._ensure_frames()
+        return self._df_weather_type
+
+    @df_weather_type.setter
+    def df_weather_type(self, value):
+        self._df_weather_type = value
+
+    @property
+    def df_weather_list(self):
+        self._ensure_frames()
+        return self._df_weather_list
+
+    @df_weather_list.setter
+    def df_weather_list(self, value):
+        self._df_weather_list = value
+
+    def read_full_type(self):
+        """weatherType 的全部列（对比报告用；df_weather_type 只保留查询用到的列）。
+        构造时保留了完整表的直接返回；否则从源文件重新读取该表（不缓存），源文件在加载后已变化或无法读取时退回 df_weather_type"""
+        if self._df_weather_type_full is not None:
+            return self._df_weather_type_full
+        if self._source_stamp is not None and file_stamp(self.path) == self._source_stamp:
+            try:
+                return type_schema(pd.read_excel(self.path, sheet_name='weatherType', skiprows=4), prune=False)[0]
+            except Exception:
+                pass
+        return self.df_weather_type
+
+    def _ensure_frames(self):
+        """延迟加载两张表。加载完成（两张表都已就绪）后才清除 _frames_loader，其他线程不会取到一半的结果"""
+        if self._frames_loader is None:
+            return
+        with self._frames_lock:
+            loader = self._frames_loader
+            if loader is not None:
+                self._set_frames(*loader())
+                self._frames_loader = None
+
+    @classmethod
+    def from_compiled(cls, path, months, days, hour_ids, names, frames_loader=None, categories=None, cell_issues=None,
+                      derived=None, id_bits=None, hour_bits=None):
+        """由已编译的数组直接构造（如内存映射的编译文件，数组可为只读视图）：names 为 {ID: 名称}，
+        两张原始表在首次访问时由 frames_loader() 返回 (df_weather_type, df_weather_list)；
+        cell_issues 为读取源文件时记录的单元格问题（见 _typed_frame）。
+        derived 为已算好的派生数组（见 _WeatherData.DERIVED）；id_bits / hour_bits 为写入时按分类表算好的位掩码，
+        与本次分类表算出的 id_bits 相同时直接使用 hour_bits，否则重新计算"""
+        weather = cls(custom_excel_path=path, categories=categories)
+        weather._frames_loader = frames_loader
+        weather._cell_issues = cell_issues
+        weather._source_stamp = file_stamp(path)
+        category_bits, own_id_bits = weather._compile_categories(int(hour_ids.max(initial=0)))
+        if id_bits is None or not np.array_equal(id_bits, own_id_bits):
+            hour_bits = None
+        table = _NameTable(weather.get_weather_type)
+        table.update(names)
+        weather._data = _WeatherData(months, days, hour_ids, table, category_bits, own_id_bits, derived, hour_bits)
+        return weather
+
+    @classmethod
+    def from_frames(cls, path, df_weather_type, df_weather_list, categories=None, keep_full_type=False, cell_issues=None):
+        """由已读取的 weatherType / weatherList 两张表直接构造并编译（不读 Excel），供索引库等快速加载使用。
+        keep_full_type 时保留传入的完整 weatherType 供对比（如历史版本，源文件已不是这份内容）；
+        cell_issues 为读取源文件时记录的单元格问题（传入的表已整理过时用于数据检查）"""
+        weather = cls(custom_excel_path=path, categories=categories)
+        if not keep_full_type:
+            weather._source_stamp = file_stamp(path)
+        weather._set_frames(df_weather_type, df_weather_list, keep_full_type)
+        if cell_issues is not None:
+            weather._cell_issues = cell_issues
+        weather._compile()
+        return weather
+
+    def _compile(self):
+        """把 weatherList 编译为整数数组（每次 read_file 后执行一次），供各查询向量化使用"""
+        df = self.df_weather_list
+        hour_ids = np.ascontiguousarray(df[HOUR_COLS].to_numpy(dtype=np.int32, na_value=-1))
+        months = df['month'].to_numpy(dtype=np.int16, na_value=0)
+        days = df['day'].to_numpy(dtype=np.int16, na_value=0)
+        category_bits, id_bits = self._compile_categories(int(hour_ids.max(initial=0)))
+        previous = getattr(self, '_data', None)
+        self._data = _WeatherData(months, days, hour_ids, _NameTable(self.get_weather_type), category_bits, id_bits)
+        self._validation = None
+        if previous is not None:
+            self._reuse_fragments(previous)
+
+    def _compile_categories(self, max_id):
+        """分类表 -> (分类名->位值, 按 ID 索引的位掩码查找表)；每次加载编译一次"""
+        category_ids = {name: parse_id_spec(spec) for name, spec in self.categories.items()}
+        if len(category_ids) > 63:
+            raise ValueError(f"天气分类最多 63 个，当前 {len(category_ids)} 个")
+        top = max([max_id] + [max(ids) for ids in category_ids.values() if ids])
+        id_bits = np.zeros(top + 2, dtype=np.int64)
+        category_bits = {}
+        for bit, (name, ids) in enumerate(category_ids.items()):
+            category_bits[name] = 1 << bit
+            ids = [x for x in ids if x >= 0]
+            id_bits[ids] |= 1 << bit
+        return category_bits, id_bits
+
+    def category_ids(self, name):
+        """某分类包含的天气 ID（升序）"""
+        return sorted(set(parse_id_spec(self.categories[name])))
+
+    def categories_of(self, weather_id):
+        """某天气 ID 所属的分类名列表"""
+        data = self._data
+        wid = int(weather_id)
+        bits = int(data.id_bits[wid]) if 0 <= wid < len(data.id_bits) - 1 else 0
+        return [name for name, bit in data.category_bits.items() if bits & bit]
+
+    def category_mask(self, names):
+        """(行数 × 24) 布尔矩阵：该小时的天气属于 names 中任一分类"""
+        if isinstance(names, str):
+            names = [names]
+        data = self._data
+        bits = 0
+        for name in names:
+            bits |= data.category_bits[name]
+        return (data.hour_bits & bits) != 0
+
+    def hour_series(self):
+        """全年连续的逐小时序列：(小时序号数组, 天气 ID 数组)，按日期排序、跨日相连；缺失日期处序号不连续"""
+        data = self._data
+        rows = data.order
+        ordinals = (data.doy[rows].astype(np.int64)[:, None] * 24 + np.arange(24)).ravel()
+        return ordinals, data.hour_ids[rows].ravel()
+
+    def ids_for(self, selector):
+        """把查询条件解析为天气 ID 列表：分类名（如「雨天」）、单个 ID、"301-305" 或逗号分隔的混写"""
+        selector = str(selector).strip()
+        if selector in self.categories:
+            return self.category_ids(selector)
+        ids = []
+        for part in selector.replace("，", ",").split(","):
+            part = part.strip()
+            if not part:
+                continue
+            ids.extend(self.category_ids(part) if part in self.categories else parse_id_spec(part))
+        return ids
+
+    def transition_matrix(self, by_category=False, lag=1, include_self=True):
+        """天气转移计数矩阵（全年逐小时序列，跨日连续）：返回 (labels, counts)，
+        counts[a, b] 为某小时是 labels[a]、lag 小时后是 labels[b] 的次数。详见 weather_stats.transition_matrix"""
+        from weather_stats import transition_matrix
+        return transition_matrix(self, by_category=by_category, lag=lag, include_self=include_self)
+
+    def validate(self):
+        """数据检查（未知 ID、缺失 / 重复 / 不存在的日期、空或非数字的小时格、未使用的 ID），结果缓存到下次加载。
+        返回 ValidationReport，详见 weather_validate.validate_weather"""
+        report = self._validation
+        if report is None:
+            from weather_validate import validate_weather
+            report = validate_weather(self)
+            with self._validation_lock:
+                if self._validation is None:
+                    self._validation = report
+                report = self._validation
+        return report
+
+    def co_occurrence(self, within, by_category=False):
+        """滞后共现矩阵：某天气之后 1~within 小时内出现另一天气的（小时对）次数，返回 (labels, counts)"""
+        from weather_stats import co_occurrence_matrix
+        return co_occurrence_matrix(self, within, by_category=by_category)
+
+    def followed_within(self, selector_a, selector_b, within):
+        """A 的每段结束后 within 小时内出现 B 的段数：返回 (后接 B 的段数, A 总段数)。
+        selector 可为分类名或 ID（见 ids_for），如 followed_within("雨天", "彩虹", 3)"""
+        from weather_stats import followed_within
+        return followed_within(self, self.ids_for(selector_a), self.ids_for(selector_b), within)
+
+    def find_pattern(self, pattern):
+        """时序模式查找（跨日连续），如 "雨天{2,} > *{0,4} > 301-305 > 晴天"；写法见 weather_pattern 模块说明。
+        返回 (matches, formatted_output)，matches 为 PatternMatch 列表"""
+        from weather_pattern import compile_pattern
+        compiled = compile_pattern(pattern, self)
+        matches = compiled.search(self)
+        return matches, compiled.format_matches(matches, self)
+
+    def query(self, expression, result="segments"):
+        """条件表达式查询，如 "id in (119..121) and month in 6..8 and hour in 18..23"；写法见 weather_query 模块说明。
+        result 为 segments 时返回 WeatherSegment 列表，counts 返回 (总小时数, {ID: 小时数})，days 返回 [(月, 日), ...]"""
+        from weather_query import compile_query
+        compiled = compile_query(expression)
+        if result == "segments":
+            return compiled.segments(self)
+        if result == "counts":
+            return compiled.counts(self)
+        if result == "days":
+            return compiled.days(self)
+        raise ValueError(f"未知的结果类型：{result}（应为 segments / counts / days）")
+
+    def _day_row(self, month, day):
+        """某日期在 weatherList 中的行号（有重复时取第一行），不存在返回 None"""
+        rows = np.flatnonzero((self._data.months == month) & (self._data.days == day))
+        return int(rows[0]) if len(rows) else None
+
+    def _range_row_mask(self, start_month, start_day, end_month, end_day):
+        """日期范围内的行（布尔数组，与 weatherList 行对齐）；规则与按日遍历时一致"""
+        m, d = self._data.months, self._data.days
+        if start_month == end_month:
+            return (m == start_month) & (d >= start_day) & (d <= end_day)
+        return (((m == start_month) & (d >= start_day))
+                | ((m > start_month) & (m < end_month))
+                | ((m == end_month) & (d <= end_day)))
+
+    def _type_rows(self, weather_id):
+        """weatherType 中 id 等于 weather_id 的行号数组"""
+        return np.flatnonzero(self.df_weather_type['id'].eq(weather_id).fillna(False).to_numpy(dtype=bool))
+
+    def _type_value(self, weather_id, column):
+        """weatherType 中某 id 第一行的某列（表中没有该 id 时抛 IndexError）"""
+        return self.df_weather_type[column].iat[self._type_rows(weather_id)[0]]
+
     def get_weather_type(self,weather_id):
         if weather_id in range(5) or weather_id in range(101,107) or weather_id in range(201,214):
-            weather_name = self.df_weather_type[self.df_weather_type['id'] == weather_id]['nameDay'].values[0]
+            weather_name = self._type_value(weather_id, 'nameDay')
         elif weather_id in range(107,119) or weather_id in range(301,306) or weather_id == 399:
             # 对于weather_id在107-118范围内的特殊处理
             if weather_id in range(107,119):
                 # 从season_part中提取流星类型信息
-                season_part = self.df_weather_type[self.df_weather_type['id'] == weather_id].iloc[0,7]
+                season_part = self._type_value(weather_id, TYPE_NAME_COLUMN)
                 
                 # 1. 移除季节部分(如"春季"、"夏季"等)
                 meteor_type = season_part
@@ -68,7 +765,7 @@ class Weather:
                     meteor_type = f"{meteor_type}流星雨"
                 
                 # 3. 获取地点信息并处理
-                weather_part = self.df_weather_type[self.df_weather_type['id'] == weather_id]['nameDay'].values[0]
+                weather_part = self._type_value(weather_id, 'nameDay')
                 # 从地点信息中去掉可能的"流星雨"关键词
                 if '-流星雨' in weather_part:
                     weather_part = weather_part.replace('-流星雨', '').strip()
@@ -88,13 +785,13 @@ class Weather:
                 else:
                     weather_name = weather_part
             else:
-                weather_name = f"{self.df_weather_type[self.df_weather_type['id'] == weather_id].iloc[0,7]}-{self.df_weather_type[self.df_weather_type['id'] == weather_id]['nameDay'].values[0]}"
+                weather_name = f"{self._type_value(weather_id, TYPE_NAME_COLUMN)}-{self._type_value(weather_id, 'nameDay')}"
         else:
             # 未在上述区间内的 id（如 119、200+ 等）尝试从表取 nameDay，否则返回未知（Excel 可能读成浮点）
             _id = int(weather_id) if isinstance(weather_id, float) else weather_id
-            match = self.df_weather_type[self.df_weather_type['id'] == _id]
-            if not match.empty and 'nameDay' in match.columns:
-                weather_name = match['nameDay'].values[0]
+            rows = self._type_rows(_id)
+            if len(rows) and 'nameDay' in self.df_weather_type.columns:
+                weather_name = self.df_weather_type['nameDay'].iat[rows[0]]
             else:
                 weather_name = f"未知({weather_id})"
         return weather_name
@@ -102,6 +799,55 @@ class Weather:
     # 输出格式：每行宽度（用于对齐与分隔线）
     _OUTPUT_WIDTH = 44
 
+    def _day_fragment(self, r):
+        """第 r 行（一天）的渲染片段，首次用到时生成并缓存在当前数据上"""
+        data = self._data
+        fragment = data.fragments[r]
+        if fragment is None:
+            month, day = int(data.months[r]), int(data.days[r])
+            ids, hourly = self._format_hourly_weather(r)
+            table = tuple(self._format_hourly_weather_table(r))
+            date_str = f"{month}月{day}日"
+            fragment = _DayFragment("\n".join(self._format_day_header(month, day) + hourly), tuple(ids), table,
+                                    tuple((date_str,) + row for row in table))
+            with data.fragments_lock:
+                if data.fragments[r] is None:
+                    data.fragments[r] = fragment
+                fragment = data.fragments[r]
+        return fragment
+
+    def reuse_fragments(self, other):
+        """沿用另一份数据（通常是同一文件上一次加载的结果）中已渲染的片段：
+        同一日期的小时 ID 未变、且涉及的天气名称未变的天直接复用，其余天在下次用到时重新渲染。返回复用的天数"""
+        if other is None or other is self or getattr(other, '_data', None) is None:
+            return 0
+        return self._reuse_fragments(other._data)
+
+    def _reuse_fragments(self, old):
+        new = self._data
+        # 只处理各日期的首行（与查询一致）；按日期序号对齐新旧两份数据
+        rows = new.order
+        old_rows = old.row_of_doy[new.doy[rows]]
+        have = old_rows >= 0
+        rows, old_rows = rows[have], old_rows[have]
+        have = np.array([old.fragments[r] is not None for r in old_rows], dtype=bool)
+        rows, old_rows = rows[have], old_rows[have]
+        if not len(rows):
+            return 0
+        same = (new.hour_ids[rows] == old.hour_ids[old_rows]).all(axis=1)
+        rows, old_rows = rows[same], old_rows[same]
+        # 名称变了的 ID（如 weatherType 改了 nameDay）所在的天也要重新渲染
+        used = np.unique(new.hour_ids[rows])
+        changed = [w for w in used.tolist() if w >= 0 and new.names[w] != old.names[w]]
+        if changed:
+            keep = ~np.isin(new.hour_ids[rows], changed).any(axis=1)
+            rows, old_rows = rows[keep], old_rows[keep]
+        with new.fragments_lock:
+            for r, o in zip(rows.tolist(), old_rows.tolist()):
+                if new.fragments[r] is None:
+                    new.fragments[r] = old.fragments[o]
+        return len(rows)
+
     def _format_day_header(self, month, day):
         """返回单日标题的若干行（分隔线 + 标题 + 下划线）"""
         title = f"  ◆ {month}月{day}日 天气情况"
@@ -111,58 +857,140 @@ class Weather:
             "─" * self._OUTPUT_WIDTH,
         ]
 
-    # 特殊天气 ID 集合：104、106、107-121、211-213、301-305（用于单日「本日特殊天气」展示）
-    SPECIAL_WEATHER_IDS = {104, 106} | set(range(107, 122)) | set(range(211, 214)) | set(range(301, 306))
+    # 特殊天气 ID 集合（默认分类表中 SPECIAL_CATEGORY 的 ID）：104、106、107-121、211-213、301-305
+    SPECIAL_WEATHER_IDS = set(parse_id_spec(DEFAULT_WEATHER_CATEGORIES[SPECIAL_CATEGORY]))
+
+    def segments(self, weather_ids=None):
+        """全年时段模型（加载时计算一次）：返回 WeatherSegment 列表，连续同 ID 跨零点合并；
+        weather_ids 为 None 时返回全部（不含空单元格段），否则只返回这些 ID 的时段。
+        重复日期的后续行与非法日期行不在全年序列中，按行单独合并（不跨日），排在全年时段之后"""
+        return self._segments(weather_ids, WeatherSegment)
+
+    def _segments(self, weather_ids, segment_type):
+        data = self._data
+        if weather_ids is None:
+            keep = data.seg_id >= 0
+        else:
+            keep = np.isin(data.seg_id, [int(x) for x in weather_ids])
+        result = [
+            segment_type(int(s), int(e), int(w), data.names)
+            for s, e, w in zip(data.seg_start[keep], data.seg_end[keep], data.seg_id[keep])
+        ]
+        wanted = None if weather_ids is None else {int(x) for x in weather_ids}
+        for r in data.loose_rows:
+            doy = int(data.doy[r])
+            base, date = (doy * 24, None) if doy >= 0 else (0, (int(data.months[r]), int(data.days[r])))
+            for start, end, w_id in self._row_segments(r):
+                if w_id >= 0 and (wanted is None or w_id in wanted):
+                    result.append(segment_type(base + start, base + end, w_id, data.names, date))
+        return result
+
+    def weather_at(self, months, days, hours):
+        """批量逐点查询：月、日、小时（标量或等长数组）-> 天气 ID 数组，非法时刻或缺失日期为 -1。
+        直接按小时序号索引全年表，适合模拟 / 回放中的大批量查询"""
+        return self.weather_at_ordinals(hour_ordinals(months, days, hours))
+
+    def weather_at_ordinals(self, ordinals):
+        """按全年小时序号（doy*24 + 小时）批量查询天气 ID，越界或 -1 返回 -1"""
+        year_ids = self._data.year_ids
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        valid = (ordinals >= 0) & (ordinals < len(year_ids))
+        return np.where(valid, year_ids[np.where(valid, ordinals, 0)], -1).astype(np.int32)
+
+    def weather_names(self, weather_ids):
+        """天气 ID 数组 -> 名称数组（object），-1 为「无数据」；相同 ID 只解析一次"""
+        ids = np.asarray(weather_ids, dtype=np.int64)
+        unique, inverse = np.unique(ids, return_inverse=True)
+        names = np.array([self._segment_name(int(w)) for w in unique], dtype=object)
+        return names[inverse].reshape(ids.shape)
+
+    def _window_ordinals(self, start, end):
+        """(月, 日, 小时) 起止 -> 小时序号区间 [lo, hi)；结束小时可为 24（表示当日结束）"""
+        (sm, sd, sh), (em, ed, eh) = start, end
+        lo = int(hour_ordinals(sm, sd, sh))
+        end_doy = int(day_ordinals(em, ed))
+        if lo < 0 or end_doy < 0 or not 0 <= int(eh) <= 24:
+            raise ValueError(f"时间窗不合法：{sm}月{sd}日{sh}点 ~ {em}月{ed}日{eh}点")
+        hi = end_doy * 24 + int(eh)
+        if hi <= lo:
+            raise ValueError(f"时间窗结束须晚于开始：{sm}月{sd}日{sh}点 ~ {em}月{ed}日{eh}点")
+        return lo, hi
+
+    def window_ids(self, start, end):
+        """时间窗逐小时天气：start / end 为 (月, 日, 小时)，如 (3, 5, 18) ~ (3, 7, 6) 表示 3月5日18点 至 3月7日6点（不含）。
+        返回 (小时序号数组, 天气 ID 数组)，缺失日期为 -1"""
+        lo, hi = self._window_ordinals(start, end)
+        return np.arange(lo, hi, dtype=np.int64), self._data.year_ids[lo:hi].copy()
+
+    def window_segments(self, start, end, weather_ids=None):
+        """时间窗内的天气时段：全年时段模型截取到 [start, end) 上，返回 WeatherSegment 列表（首尾段按窗口截断，不含空单元格段）；
+        weather_ids 不为 None 时只返回这些 ID 的时段"""
+        lo, hi = self._window_ordinals(start, end)
+        data = self._data
+        i = np.searchsorted(data.seg_end, lo, side='right')
+        j = np.searchsorted(data.seg_start, hi, side='left')
+        seg_id = data.seg_id[i:j]
+        keep = seg_id >= 0 if weather_ids is None else np.isin(seg_id, [int(x) for x in weather_ids])
+        starts = np.maximum(data.seg_start[i:j][keep], lo)
+        ends = np.minimum(data.seg_end[i:j][keep], hi)
+        return [WeatherSegment(int(s), int(e), int(w), data.names) for s, e, w in zip(starts, ends, seg_id[keep])]
+
+    def _row_segments(self, r):
+        """第 r 行（某一日）的天气时段 [(起始小时, 结束小时(不含), ID)]：全年时段模型在当日的投影，跨日部分截断到当日。
+        重复日期或非法日期的行不在全年序列中，按该行单独合并。ID 为 -1 表示空单元格。"""
+        data = self._data
+        doy = int(data.doy[r])
+        if doy >= 0 and data.row_of_doy[doy] == r:
+            day_start = doy * 24
+            lo = np.searchsorted(data.seg_end, day_start, side='right')
+            hi = np.searchsorted(data.seg_start, day_start + 24, side='left')
+            return [
+                (max(int(s) - day_start, 0), min(int(e) - day_start, 24), int(w))
+                for s, e, w in zip(data.seg_start[lo:hi], data.seg_end[lo:hi], data.seg_id[lo:hi])
+            ]
+        ids = data.hour_ids[r]
+        starts, ends = run_bounds(ids)
+        return [(int(s), int(e), int(ids[s])) for s, e in zip(starts, ends)]
+
+    @staticmethod
+    def _hour_span_text(start, end):
+        """当日时段显示：单小时为「5点」，多小时为「起~止点」；止为最后一小时，但 23 点显示为 24"""
+        last = end - 1
+        if start == last:
+            return f"{start}~24点" if start == 23 else f"{start}点"
+        return f"{start}~{24 if last == 23 else last}点"
+
+    def _segment_name(self, w_id):
+        return self._data.names[w_id] if w_id >= 0 else "无数据"
 
     def get_special_weather_for_day(self, month, day):
-        """获取指定日期的特殊天气时段（仅 ID 在 SPECIAL_WEATHER_IDS 内），合并连续相同 ID。
+        """获取指定日期的特殊天气时段（属于 SPECIAL_CATEGORY 分类的 ID），连续相同 ID 合并（全年时段模型在当日的投影）。
         有则返回格式化字符串，无则返回空字符串（不显示该日）。"""
-        day_data = self.df_weather_list[(self.df_weather_list["month"] == month) & (self.df_weather_list["day"] == day)]
-        if day_data.empty:
+        r = self._day_row(month, day)
+        if r is None:
             return ""
-        row = day_data.iloc[0]
+        return self._format_special_for_row(r)
+
+    def _format_special_for_row(self, r):
+        data = self._data
+        special_bit = data.category_bits.get(SPECIAL_CATEGORY, 0)
         lines = []
-        i = 0
-        while i < 24:
-            w_id = self._cell_to_id(row[f"h{i}"])
-            if w_id is None or w_id not in self.SPECIAL_WEATHER_IDS:
-                i += 1
+        for start, end, w_id in self._row_segments(r):
+            if w_id < 0 or not data.id_bits[w_id] & special_bit:
                 continue
-            w_name = self.get_weather_type(row[f"h{i}"])
-            start = i
-            while i + 1 < 24 and self._cell_to_id(row[f"h{i+1}"]) == w_id:
-                i += 1
-            end = i
-            end_display = 24 if end == 23 else end
-            id_suffix = f" ({w_id})" if w_id is not None else ""
-            if start == end:
-                if start == 23:
-                    lines.append(f"    · {start}~24点  {w_name}{id_suffix}")
-                else:
-                    lines.append(f"    · {start}点  {w_name}{id_suffix}")
-            else:
-                lines.append(f"    · {start}~{end_display}点  {w_name}{id_suffix}")
-            i += 1
+            lines.append(f"    · {self._hour_span_text(start, end)}  {data.names[w_id]} ({w_id})")
         return "\n".join(lines) if lines else ""
 
-    def get_special_weather_for_range(self, start_month, start_day, end_month, end_day):
-        """获取日期范围内每日的特殊天气，按日显示并带具体时间段；无特殊天气的日期不显示。"""
+    def get_special_weather_for_range(self, start_month, start_day, end_month, end_day, progress=None):
+        """获取日期范围内每日的特殊天气，按日显示并带具体时间段；无特殊天气的日期不显示。
+        progress: 可选回调 progress(已处理行数, 总行数)，回调内抛异常即中止查询（用于取消）。"""
         parts = []
-        for index, row in self.df_weather_list.iterrows():
-            current_month = int(row["month"])
-            current_day = int(row["day"])
-            in_range = False
-            if start_month == end_month:
-                in_range = start_month == current_month and start_day <= current_day <= end_day
-            else:
-                if current_month == start_month and current_day >= start_day:
-                    in_range = True
-                elif start_month < current_month < end_month:
-                    in_range = True
-                elif current_month == end_month and current_day <= end_day:
-                    in_range = True
-            if not in_range:
-                continue
+        data = self._data
+        rows = np.flatnonzero(self._range_row_mask(start_month, start_day, end_month, end_day))
+        for n, r in enumerate(rows, 1):
+            self._report_progress(progress, n, len(rows))
+            current_month, current_day = int(data.months[r]), int(data.days[r])
+            # 同一日期有重复行时与单日查询一致，取第一行
             day_special = self.get_special_weather_for_day(current_month, current_day)
             if not day_special:
                 continue
@@ -174,52 +1002,22 @@ class Weather:
             parts.append("")
         return "\n".join(parts).strip() if parts else "该范围内无特殊天气"
 
-    def _format_hourly_weather_table(self, row):
-        """单天逐段表格行：[(时间段, 天气名, ID), ...]，用于 GUI 表格展示。"""
-        table_rows = []
-        i = 0
-        while i < 24:
-            w_id = self._cell_to_id(row[f'h{i}'])
-            w_name = self.get_weather_type(row[f'h{i}'])
-            start = i
-            while i + 1 < 24 and self._cell_to_id(row[f'h{i+1}']) == w_id:
-                i += 1
-            end = i
-            end_display = 24 if end == 23 else end
-            if start == end:
-                time_str = f"{start}~24点" if start == 23 else f"{start}点"
-            else:
-                time_str = f"{start}~{end_display}点"
-            table_rows.append((time_str, w_name, str(w_id) if w_id is not None else ""))
-            i += 1
-        return table_rows
-
-    def _format_hourly_weather(self, row):
-        """格式化单天每小时天气数据；连续相同天气合并为「起始~结束点：天气名」"""
-        weather_ids = []
-        for i in range(24):
-            weather_ids.append(row[f'h{i}'])
-        # 合并连续相同天气的小时
+    def _format_hourly_weather_table(self, r):
+        """第 r 行（单天）逐段表格行：[(时间段, 天气名, ID), ...]，用于 GUI 表格展示。"""
+        return [
+            (self._hour_span_text(start, end), self._segment_name(w_id), str(w_id) if w_id >= 0 else "")
+            for start, end, w_id in self._row_segments(r)
+        ]
+
+    def _format_hourly_weather(self, r):
+        """格式化第 r 行（单天）每小时天气数据；连续相同天气合并为「起始~结束点：天气名」。
+        返回 (当日 24 个小时的天气 ID 列表（空单元格为 None）, 文本行列表)"""
+        weather_ids = [int(x) if x >= 0 else None for x in self._data.hour_ids[r]]
         hourly_data = []
-        i = 0
-        while i < 24:
-            w_id = self._cell_to_id(row[f'h{i}'])
-            w_name = self.get_weather_type(row[f'h{i}'])
-            start = i
-            while i + 1 < 24 and self._cell_to_id(row[f'h{i+1}']) == w_id:
-                i += 1
-            end = i
+        for start, end, w_id in self._row_segments(r):
             # 最后一小时（23点）显示为 23~24点，与「到24点」一致；结果中附带天气 ID
-            end_display = 24 if end == 23 else end
-            id_suffix = f" ({w_id})" if w_id is not None else ""
-            if start == end:
-                if start == 23:
-                    hourly_data.append(f"    {start}~24点：{w_name}{id_suffix}")
-                else:
-                    hourly_data.append(f"    {start}点：{w_name}{id_suffix}")
-            else:
-                hourly_data.append(f"    {start}~{end_display}点：{w_name}{id_suffix}")
-            i += 1
+            id_suffix = f" ({w_id})" if w_id >= 0 else ""
+            hourly_data.append(f"    {self._hour_span_text(start, end)}：{self._segment_name(w_id)}{id_suffix}")
         return weather_ids, hourly_data
     
     def _save_to_file(self, data):
@@ -242,8 +1040,15 @@ class Weather:
         
         return file_path
     
+    @staticmethod
+    def _report_progress(progress, done, total, every=16):
+        """每处理 every 行（及最后一行）调用一次 progress(done, total)；progress 为 None 时不做事"""
+        if progress is not None and (done % every == 0 or done == total):
+            progress(done, total)
+
     def get_weather_list_by_day(self, month=None, day=None, show_all=False, save_to_file=False, 
-                               start_month=None, start_day=None, end_month=None, end_day=None):
+                               start_month=None, start_day=None, end_month=None, end_day=None,
+                               progress=None):
         """
         获取指定日期、日期范围或所有日期的天气列表
         
@@ -255,6 +1060,7 @@ class Weather:
         :param start_day: 开始日期（可选，用于日期范围）
         :param end_month: 结束月份（可选，用于日期范围）
         :param end_day: 结束日期（可选，用于日期范围）
+        :param progress: 可选回调 progress(已处理行数, 总行数)，回调内抛异常即中止（用于取消）
         :return: (weather_data, weather_data_translate, output_file_path, table_columns, table_rows)
            table_columns/table_rows 为 None 或空时表示无表格数据，仅用文本展示。
         """
@@ -268,120 +1074,101 @@ class Weather:
         # 处理指定日期的情况
         if month and day:
             # 获取指定日期的数据
-            day_data = self.df_weather_list[(self.df_weather_list['month'] == month) & (self.df_weather_list['day'] == day)]
-            if not day_data.empty:
-                row = day_data.iloc[0]
-                daily_weather_ids, hourly_data = self._format_hourly_weather(row)
-                weather_data = daily_weather_ids
-                header_lines = self._format_day_header(month, day)
-                weather_data_translate = "\n".join(header_lines) + "\n" + "\n".join(hourly_data)
+            r = self._day_row(month, day)
+            if r is not None:
+                fragment = self._day_fragment(r)
+                weather_data = list(fragment.ids)
+                weather_data_translate = fragment.text
                 table_columns = ["时间段", "天气", "ID"]
-                table_rows = self._format_hourly_weather_table(row)
+                table_rows = list(fragment.table)
         
-        # 处理日期范围的情况
-        elif start_month and start_day and end_month and end_day:
-            # 准备存储范围内的天气数据
-            range_weather_translate = []
-            range_weather_data = []
-            
-            # 遍历所有日期数据
-            for index, row in self.df_weather_list.iterrows():
-                current_month = int(row['month'])
-                current_day = int(row['day'])
-                
-                # 检查当前日期是否在范围内
-                # 同月份的情况
-                if start_month == end_month:
-                    if start_month == current_month and start_day <= current_day <= end_day:
-                        # 在范围内，添加数据
-                        range_weather_translate.extend(self._format_day_header(current_month, current_day))
-                        daily_weather_ids, hourly_data = self._format_hourly_weather(row)
-                        range_weather_data.extend(daily_weather_ids)
-                        range_weather_translate.extend(hourly_data)
-                        range_weather_translate.append("")
-                # 跨月份的情况
-                else:
-                    # 开始月份
-                    if current_month == start_month and current_day >= start_day:
-                        range_weather_translate.extend(self._format_day_header(current_month, current_day))
-                        daily_weather_ids, hourly_data = self._format_hourly_weather(row)
-                        range_weather_data.extend(daily_weather_ids)
-                        range_weather_translate.extend(hourly_data)
-                        range_weather_translate.append("")
-                    # 中间月份
-                    elif start_month < current_month < end_month:
-                        range_weather_translate.extend(self._format_day_header(current_month, current_day))
-                        daily_weather_ids, hourly_data = self._format_hourly_weather(row)
-                        range_weather_data.extend(daily_weather_ids)
-                        range_weather_translate.extend(hourly_data)
-                        range_weather_translate.append("")
-                    # 结束月份
-                    elif current_month == end_month and current_day <= end_day:
-                        range_weather_translate.extend(self._format_day_header(current_month, current_day))
-                        daily_weather_ids, hourly_data = self._format_hourly_weather(row)
-                        range_weather_data.extend(daily_weather_ids)
-                        range_weather_translate.extend(hourly_data)
-                        range_weather_translate.append("")
-            
-            # 生成结果
-            if range_weather_translate:
-                weather_data = range_weather_data
-                weather_data_translate = "\n".join(range_weather_translate)
+        # 处理日期范围 / 显示所有日期的情况
+        elif (start_month and start_day and end_month and end_day) or show_all:
+            rows = self._report_rows(show_all, start_month, start_day, end_month, end_day)
+            weather_data, lines, table_rows = self._format_days(rows, progress)
+            if lines:
+                weather_data_translate = "\n".join(lines)
                 table_columns = ["日期", "时间段", "天气", "ID"]
-                table_rows = []
-                for index, row in self.df_weather_list.iterrows():
-                    current_month = int(row['month'])
-                    current_day = int(row['day'])
-                    if start_month == end_month:
-                        if start_month != current_month or not (start_day <= current_day <= end_day):
-                            continue
-                    else:
-                        if current_month == start_month and current_day < start_day:
-                            continue
-                        if current_month == end_month and current_day > end_day:
-                            continue
-                        if current_month < start_month or current_month > end_month:
-                            continue
-                    date_str = f"{current_month}月{current_day}日"
-                    for time_str, w_name, id_str in self._format_hourly_weather_table(row):
-                        table_rows.append((date_str, time_str, w_name, id_str))
-                
                 # 如果需要保存到文件
                 if save_to_file:
                     output_file_path = self._save_to_file(weather_data_translate)
-        
-        # 处理显示所有日期的情况
-        elif show_all:
-            # 遍历所有日期数据
-            all_weather_translate = []
-            all_weather_data = []
-            
-            for index, row in self.df_weather_list.iterrows():
-                month_val = int(row['month'])
-                day_val = int(row['day'])
-                all_weather_translate.extend(self._format_day_header(month_val, day_val))
-                daily_weather_ids, hourly_data = self._format_hourly_weather(row)
-                all_weather_data.extend(daily_weather_ids)
-                all_weather_translate.extend(hourly_data)
-                all_weather_translate.append("")
-            
-            weather_data = all_weather_data
-            weather_data_translate = "\n".join(all_weather_translate)
-            table_columns = ["日期", "时间段", "天气", "ID"]
-            table_rows = []
-            for index, row in self.df_weather_list.iterrows():
-                month_val = int(row['month'])
-                day_val = int(row['day'])
-                date_str = f"{month_val}月{day_val}日"
-                for time_str, w_name, id_str in self._format_hourly_weather_table(row):
-                    table_rows.append((date_str, time_str, w_name, id_str))
-            
-            # 如果需要保存到文件
-            if save_to_file:
-                output_file_path = self._save_to_file(weather_data_translate)
+            else:
+                table_rows = None
         
         return weather_data, weather_data_translate, output_file_path, table_columns, table_rows
             
+    # 分页查询默认每页天数
+    PAGE_DAYS = 31
+
+    def _report_rows(self, show_all=False, start_month=None, start_day=None, end_month=None, end_day=None):
+        """日期范围 / 全部日期查询涉及的行号（按表中顺序）；给出完整范围时按范围，否则 show_all 时为全部行"""
+        if start_month and start_day and end_month and end_day:
+            return np.flatnonzero(self._range_row_mask(start_month, start_day, end_month, end_day))
+        if show_all:
+            return np.arange(len(self._data.months))
+        raise ValueError("请指定日期范围（开始 / 结束的月、日）或 show_all=True")
+
+    def iter_days(self, show_all=False, start_month=None, start_day=None, end_month=None, end_day=None):
+        """逐天生成日期范围 / 全部日期的结果：(月, 日, 文本块, 24 小时 ID, 带日期的表格行)。
+        每天在取到时才渲染（已渲染过的直接取缓存），调用方可边取边显示 / 写出"""
+        data = self._data
+        for r in self._report_rows(show_all, start_month, start_day, end_month, end_day):
+            fragment = self._day_fragment(r)
+            yield int(data.months[r]), int(data.days[r]), fragment.text, fragment.ids, fragment.dated_table
+
+    def get_weather_page(self, cursor=None, page_size=None, show_all=False,
+                         start_month=None, start_day=None, end_month=None, end_day=None):
+        """分页版的日期范围 / 全部日期查询：返回从 cursor 起最多 page_size 天（默认 PAGE_DAYS）的 WeatherPage。
+        cursor 为上一页的 page.cursor（首页传 None），查询条件须与首页相同；数据重新加载后旧游标失效（ValueError）"""
+        page_size = int(page_size or self.PAGE_DAYS)
+        if page_size <= 0:
+            raise ValueError(f"每页天数须为正整数：{page_size}")
+        rows = self._report_rows(show_all, start_month, start_day, end_month, end_day)
+        if start_month and start_day and end_month and end_day:
+            scope = f"{start_month}.{start_day}-{end_month}.{end_day}"
+        else:
+            scope = "all"
+        total = len(rows)
+        serial = self._data.serial
+        offset = 0
+        if cursor:
+            # 游标格式：条件@偏移/总天数#数据序号；序号不同即数据已重新加载（即使天数相同）
+            body, _, cursor_serial = str(cursor).rpartition("#")
+            cursor_scope, _, position = body.rpartition("@")
+            offset, _, cursor_total = position.partition("/")
+            if (cursor_scope != scope or not offset.isdigit() or cursor_total != str(total)
+                    or cursor_serial != str(serial)):
+                raise ValueError(f"分页游标与查询条件不符或数据已重新加载，请从第一页重新查询：{cursor}")
+            offset = int(offset)
+        end = min(offset + page_size, total)
+        ids, blocks, table_rows = self._format_days(rows[offset:end])
+        next_cursor = f"{scope}@{end}/{total}#{serial}" if end < total else None
+        return WeatherPage("\n".join(blocks), ids, ["日期", "时间段", "天气", "ID"], table_rows, next_cursor, end, total)
+
+    def iter_pages(self, page_size=None, **query):
+        """依次生成全部 WeatherPage（参数同 get_weather_page，不含 cursor）；首页渲染完即可取到"""
+        cursor = None
+        while True:
+            page = self.get_weather_page(cursor, page_size, **query)
+            yield page
+            cursor = page.cursor
+            if cursor is None:
+                return
+
+    def _format_days(self, rows, progress=None):
+        """按行号顺序拼接多天的渲染片段：返回 (逐小时 ID 列表, 文本块列表（每天一块，块间为空串）, 表格行 (日期, 时间段, 天气, ID))"""
+        all_ids = []
+        lines = []
+        table_rows = []
+        for n, r in enumerate(rows, 1):
+            self._report_progress(progress, n, len(rows))
+            fragment = self._day_fragment(r)
+            all_ids.extend(fragment.ids)
+            lines.append(fragment.text)
+            lines.append("")
+            table_rows.extend(fragment.dated_table)
+        return all_ids, lines, table_rows
+
     def find_weather_id(self,weather_id):
         """
         查找包含指定weather_id的所有日期和时间
@@ -391,21 +1178,12 @@ class Weather:
         # 存储结果的字典，键为日期字符串，值为该日期中包含指定weather_id的小时列表
         result_dict = {}
         
-        # 遍历weatherList的每一行数据
-        for index, row in self.df_weather_list.iterrows():
-            month = int(row['month'])
-            day = int(row['day'])
-            date_str = f"{month}月{day}日"
-            
-            # 检查每小时的天气ID
-            matching_hours = []
-            for i in range(24):
-                if f'h{i}' in row and row[f'h{i}'] == weather_id:
-                    matching_hours.append(f"{i}点")
-            
-            # 如果该日期有匹配的小时，添加到结果字典
-            if matching_hours:
-                result_dict[date_str] = matching_hours
+        # 在编译后的小时矩阵中找出含该 ID 的行（按 weatherList 行序），同一日期有多行时以后一行为准
+        data = self._data
+        matches = data.hour_ids == weather_id
+        for r in np.flatnonzero(matches.any(axis=1)):
+            date_str = f"{int(data.months[r])}月{int(data.days[r])}日"
+            result_dict[date_str] = [f"{int(i)}点" for i in np.flatnonzero(matches[r])]
         
         # 构建输出字符串
         if not result_dict:
@@ -425,7 +1203,7 @@ class Weather:
     def get_special_weather_in_range(self, start_month, start_day, end_month, end_day, save_to_file=False):
         """
         获取指定日期范围内的特殊天气时间
-        特殊天气：天气id不为101-106，201-204的天气均为特殊天气
+        特殊天气：属于 SPECIAL_CATEGORY 分类的天气（与单日「本日特殊天气」判定一致）
         
         :param start_month: 开始月份
         :param start_day: 开始日期
@@ -433,55 +1211,31 @@ class Weather:
         :param end_day: 结束日期
         :param save_to_file: 是否保存到txt文件
         :return: (special_weather_list, formatted_output, output_file_path)
+                 special_weather_list 为 WeatherSegment 列表，每个特殊小时一条
         """
-        # 定义正常天气ID范围
-        normal_weather_ranges = [(101, 106), (201, 204)]
-        
-        def is_special_weather(weather_id):
-            """检查是否为特殊天气"""
-            for start, end in normal_weather_ranges:
-                if start <= weather_id <= end:
-                    return False
-            return True
-        
-        # 存储特殊天气数据
+        # 存储特殊天气数据：每个特殊小时一条 WeatherSegment（start ~ start+1 点）
         special_weather_list = []
         formatted_output = ""
         output_file_path = None
-        
-        # 遍历所有日期数据
-        for index, row in self.df_weather_list.iterrows():
-            current_month = int(row['month'])
-            current_day = int(row['day'])
-            
-            # 检查当前日期是否在范围内
-            is_in_range = False
-            # 同月份的情况
-            if start_month == end_month:
-                if start_month == current_month and start_day <= current_day <= end_day:
-                    is_in_range = True
-            # 跨月份的情况
+
+        data = self._data
+        hour_ids = data.hour_ids
+        is_special = self.category_mask(SPECIAL_CATEGORY)
+        is_special &= self._range_row_mask(start_month, start_day, end_month, end_day)[:, None]
+        for r, h in zip(*np.nonzero(is_special)):
+            # 逐行输出（重复日期的行各自列出）；非法日期行不在全年序列中，按当日小时记录并带上该行日期
+            doy = int(data.doy[r])
+            if doy >= 0:
+                ordinal, date = doy * 24 + int(h), None
             else:
-                if (start_month == current_month and current_day >= start_day) or \
-                   (start_month < current_month < end_month) or \
-                   (end_month == current_month and current_day <= end_day):
-                    is_in_range = True
-            
-            if is_in_range:
-                # 检查每小时的天气
-                for i in range(24):
-                    weather_id = row[f'h{i}']
-                    if is_special_weather(weather_id):
-                        weather_name = self.get_weather_type(weather_id)
-                        
-                        # 格式化输出：例如"  1月 1日  12点～13点  彩虹"
-                        special_weather_list.append([current_month, current_day, i, i+1, weather_name])
-        
-        # 生成格式化输出
+                ordinal, date = int(h), (int(data.months[r]), int(data.days[r]))
+            special_weather_list.append(WeatherSegment(ordinal, ordinal + 1, int(hour_ids[r, h]), data.names, date))
+
+        # 生成格式化输出（名称在此时才解析为字符串）
         if special_weather_list:
             formatted_parts = []
-            for month, day, start_hour, end_hour, weather_name in special_weather_list:
-                formatted_parts.append(f"  {month}月{day:>2}日  {start_hour:>2}点～{end_hour:>2}点  {weather_name}")
+            for seg in special_weather_list:
+                formatted_parts.append(f"  {seg.month}月{seg.day:>2}日  {seg.start:>2}点～{seg.end:>2}点  {seg.name}")
             formatted_output = "\n".join(formatted_parts)
             
             # 如果需要保存到文件
@@ -490,60 +1244,22 @@ class Weather:
         
         return special_weather_list, formatted_output, output_file_path
     
-    @staticmethod
-    def _cell_to_id(x):
-        """将 Excel 单元格值统一转为整数 ID，便于与 weather_ids 比较（避免 303.0、'303' 等漏匹配）"""
-        if x is None or (hasattr(pd, 'isna') and pd.isna(x)):
-            return None
-        try:
-            return int(float(x))
-        except (TypeError, ValueError):
-            return None
-
-    def find_weather_ids_time_ranges(self, weather_ids, save_to_file=False):
+    def find_weather_ids_time_ranges(self, weather_ids, save_to_file=False, progress=None):
         """
         查找指定weather_ids的天气有哪几天的几点到几点。
         输出按查询的 ID 顺序分组，同一 ID 内按时间（月、日、起始小时）排序。
+        连续出现的天气跨零点不拆开，如 22 点到次日 3 点的极光为一段（显示结束日期）。
         :param weather_ids: 要查找的天气ID列表，如[110, 121, 301]
         :param save_to_file: 是否保存到txt文件
+        :param progress: 可选回调 progress(已处理行数, 总行数)，回调内抛异常即中止（用于取消）
         :return: (weather_ranges, formatted_output, output_file_path, table_columns, table_rows)
+                 weather_ranges 为 WeatherIdSegment 列表（与旧版一致，可解包为 month, day, start, end, wid, name）
         """
-        weather_ids_set = set(int(x) for x in weather_ids)
-        weather_ranges = []  # (month, day, start_hour, end_hour, weather_id_int, weather_name)
-
-        for index, row in self.df_weather_list.iterrows():
-            current_month = int(row['month'])
-            current_day = int(row['day'])
-            current_ranges = []
-            start_hour = None
-            start_id = None  # 当前连续段的天气 ID，ID 变化时必须结束当前段、另起一段
-
-            for i in range(24):
-                w_id = self._cell_to_id(row[f'h{i}'])
-                if w_id is not None and w_id in weather_ids_set:
-                    if start_hour is None:
-                        start_hour = i
-                        start_id = int(w_id)
-                    elif int(w_id) != start_id:
-                        # 同一行内 ID 变化：先结束当前段，再开始新段
-                        end_hour = i
-                        w_name = self.get_weather_type(row[f'h{start_hour}'])
-                        current_ranges.append([current_month, current_day, start_hour, end_hour, start_id, w_name])
-                        start_hour = i
-                        start_id = int(w_id)
-                else:
-                    if start_hour is not None:
-                        end_hour = i
-                        w_name = self.get_weather_type(row[f'h{start_hour}'])
-                        current_ranges.append([current_month, current_day, start_hour, end_hour, start_id, w_name])
-                        start_hour = None
-                        start_id = None
-
-            if start_hour is not None:
-                w_name = self.get_weather_type(row[f'h{start_hour}'])
-                current_ranges.append([current_month, current_day, start_hour, 24, start_id, w_name])
-            weather_ranges.extend(current_ranges)
-        
+        weather_ids_int = [int(x) for x in weather_ids]
+        # 直接取全年时段模型中这些 ID 的时段：跨零点的连续天气为一段（可跨多日）
+        weather_ranges = self._segments(weather_ids_int, WeatherIdSegment)
+        self._report_progress(progress, 1, 1)
+
         # 按查询的 ID 顺序分组，组内按 (月, 日, 起始小时) 排序（key 统一为 int 避免 109 vs 109.0 导致漏显）
         formatted_output = ""
         output_file_path = None
@@ -555,29 +1271,26 @@ class Weather:
             formatted_output = f"未找到weather_id为{', '.join(map(str, weather_ids))}的天气数据"
             return weather_ranges, formatted_output, output_file_path, table_columns, table_rows
         
-        # 按查询顺序输出每个 ID：直接从 weather_ranges 中筛出该 ID 的时段，避免 dict key 类型差异导致漏显
-        def segment_id_as_int(r):
-            try:
-                v = r[4]
-                return int(v) if v is not None else None
-            except (TypeError, ValueError):
-                return None
+        # 按查询顺序输出每个 ID：先按 ID 分桶，组内按 (月, 日, 起始小时) 排序
+        by_id = {wid: [] for wid in weather_ids_int}
+        for seg in weather_ranges:
+            by_id[seg.wid].append(seg)
 
         parts = []
-        weather_ids_int = [int(x) for x in weather_ids]
         for wid in weather_ids_int:
-            ranges_list = []
-            for r in weather_ranges:
-                if segment_id_as_int(r) == wid:
-                    month, day, sh, eh, _, w_name = r
-                    ranges_list.append((month, day, sh, eh, w_name))
-            ranges_list.sort(key=lambda x: (x[0], x[1], x[2]))  # 月、日、起始小时
-            w_name_header = self.get_weather_type(wid) if ranges_list else ""
+            ranges_list = sorted(by_id[wid], key=lambda x: (x.month, x.day, x.start))  # 月、日、起始小时
+            w_name_header = self._data.names[wid] if ranges_list else ""
             parts.append(f"--- 天气 ID {wid} {w_name_header} ---")
             if ranges_list:
-                for month, day, start_hour, end_hour, w_name in ranges_list:
-                    parts.append(f"  {month}月{day:>2}日  {start_hour:>2}点～{end_hour:>2}点  {w_name}")
-                    time_str = f"{start_hour}~{end_hour}点" if start_hour != end_hour else f"{start_hour}点"
+                for seg in ranges_list:
+                    month, day, start_hour, end_hour, w_name = seg.month, seg.day, seg.start, seg.end, seg.name
+                    if seg.spans_days:
+                        end_text = f"{seg.end_month}月{seg.end_day}日{seg.end_hour:>2}点"
+                        parts.append(f"  {month}月{day:>2}日  {start_hour:>2}点～{end_text}  {w_name}")
+                        time_str = f"{start_hour}点~{seg.end_month}月{seg.end_day}日{seg.end_hour}点"
+                    else:
+                        parts.append(f"  {month}月{day:>2}日  {start_hour:>2}点～{end_hour:>2}点  {w_name}")
+                        time_str = f"{start_hour}~{end_hour}点" if start_hour != end_hour else f"{start_hour}点"
                     table_rows.append((f"{month}月{day}日", time_str, w_name))
             else:
                 parts.append("  （无）")
@@ -590,115 +1303,167 @@ class Weather:
         return weather_ranges, formatted_output, output_file_path, table_columns, table_rows
 
     @staticmethod
-    def compare_branches(branch_a, branch_b, save_to_file=False):
-        """
-        对比两个分支路径下的 weather.xlsx，返回差别说明。
-
-        :param branch_a: 分支名，如 'stage'、'hotfix'、'review'、'release'
-        :param branch_b: 另一分支名
-        :param save_to_file: 是否将对比结果保存为 txt
-        :return: (diff_dict, formatted_report, output_file_path)
-                 diff_dict 含 type_only_a, type_only_b, type_value_diff, list_only_a, list_only_b, list_hour_diff 等
-        """
-        wa = Weather(branch=branch_a)
-        wb = Weather(branch=branch_b)
-        if not os.path.isfile(wa.path):
-            raise FileNotFoundError(f"分支 {branch_a} 文件不存在: {wa.path}")
-        if not os.path.isfile(wb.path):
-            raise FileNotFoundError(f"分支 {branch_b} 文件不存在: {wb.path}")
-
-        wa.read_file()
-        wb.read_file()
-
-        def _norm_id(x):
-            if pd.isna(x):
-                return None
-            return int(x) if isinstance(x, float) else x
-
-        # ---------- weatherType 对比（以 id 为键）----------
-        da = wa.df_weather_type.copy()
-        db = wb.df_weather_type.copy()
-        da['_id'] = da['id'].map(_norm_id)
-        db['_id'] = db['id'].map(_norm_id)
-        ids_a = set(da['_id'].dropna().unique())
-        ids_b = set(db['_id'].dropna().unique())
+    def diff_weather(wa, wb, full_type=True):
+        """对比两份已加载的数据（weatherType 以 id 为键、weatherList 以 月-日 为键），返回差异字典：
+        type_only_a, type_only_b, type_value_diff, list_only_a, list_only_b, list_hour_diff（不含路径信息）。
+        full_type 时比较 weatherType 的全部列（见 read_full_type，可能重新读取源文件），否则只比较查询用到的列；
+        小时差异按编译后的小时 ID 比较（空格子与非数字均为空，记为 None）"""
+        # ---------- weatherType 对比（以 id 为键，同一 id 取第一行）----------
+        da = wa.read_full_type() if full_type else wa.df_weather_type
+        db = wb.read_full_type() if full_type else wb.df_weather_type
+        ta = da[da['id'].notna()].drop_duplicates('id').set_index('id')
+        tb = db[db['id'].notna()].drop_duplicates('id').set_index('id')
+        ids_a = set(ta.index.tolist())
+        ids_b = set(tb.index.tolist())
         type_only_a = sorted(ids_a - ids_b)
         type_only_b = sorted(ids_b - ids_a)
         common_ids = sorted(ids_a & ids_b)
 
-        # 选共同列（排除 _id）比较
-        cols_type = [c for c in da.columns if c in db.columns and c != '_id' and c != 'id']
-        type_value_diff = []  # [(id, col, val_a, val_b), ...]
-        for wid in common_ids:
-            row_a = da[da['_id'] == wid].iloc[0]
-            row_b = db[db['_id'] == wid].iloc[0]
-            for col in cols_type:
-                v_a, v_b = row_a[col], row_b[col]
-                if pd.isna(v_a):
-                    v_a = None
-                if pd.isna(v_b):
-                    v_b = None
-                if v_a != v_b:
-                    type_value_diff.append((wid, col, v_a, v_b))
+        # 共同列整列比较（空值视为相同），只对不同的单元格逐个取值
+        cols_type = [c for c in ta.columns if c in tb.columns]
+        type_hits = []  # [(id 序号, 列序号, val_a, val_b), ...]
+        for j, col in enumerate(cols_type):
+            col_a = ta[col].loc[common_ids].astype(object).to_numpy()
+            col_b = tb[col].loc[common_ids].astype(object).to_numpy()
+            null_a, null_b = pd.isna(col_a), pd.isna(col_b)
+            changed = np.flatnonzero((null_a != null_b) | (~null_a & ~null_b & (col_a != col_b)))
+            type_hits.extend((i, j, None if null_a[i] else col_a[i], None if null_b[i] else col_b[i]) for i in changed)
+        type_hits.sort(key=lambda h: (h[0], h[1]))
+        type_value_diff = [(common_ids[i], cols_type[j], v_a, v_b) for i, j, v_a, v_b in type_hits]  # [(id, col, val_a, val_b), ...]
 
         # ---------- weatherList 对比（以 month+day 为键）----------
-        la = wa.df_weather_list.copy()
-        lb = wb.df_weather_list.copy()
-        la['_key'] = la['month'].astype(int).astype(str) + '-' + la['day'].astype(int).astype(str)
-        lb['_key'] = lb['month'].astype(int).astype(str) + '-' + lb['day'].astype(int).astype(str)
-        keys_a = set(la['_key'].unique())
-        keys_b = set(lb['_key'].unique())
-        list_only_a = sorted(keys_a - keys_b, key=lambda x: (int(x.split('-')[0]), int(x.split('-')[1])))
-        list_only_b = sorted(keys_b - keys_a, key=lambda x: (int(x.split('-')[0]), int(x.split('-')[1])))
-        common_keys = sorted(keys_a & keys_b, key=lambda x: (int(x.split('-')[0]), int(x.split('-')[1])))
-
-        hour_cols = [f'h{i}' for i in range(24)]
+        data_a, data_b = wa._data, wb._data
+        rows_a = Weather._first_rows_by_day(data_a)
+        rows_b = Weather._first_rows_by_day(data_b)
+        list_only_a = [f"{m}-{d}" for m, d in sorted(rows_a.keys() - rows_b.keys())]
+        list_only_b = [f"{m}-{d}" for m, d in sorted(rows_b.keys() - rows_a.keys())]
+        common_keys = sorted(rows_a.keys() & rows_b.keys())
+
+        # 同一日期取各自第一行，24 小时整行比较
+        ra = np.array([rows_a[k] for k in common_keys], dtype=np.intp)
+        rb = np.array([rows_b[k] for k in common_keys], dtype=np.intp)
+        hours_a, hours_b = data_a.hour_ids[ra], data_b.hour_ids[rb]
         list_hour_diff = []  # [(month, day, hour, id_a, id_b), ...]
-        for key in common_keys:
-            row_a = la[la['_key'] == key].iloc[0]
-            row_b = lb[lb['_key'] == key].iloc[0]
-            month, day = int(row_a['month']), int(row_a['day'])
-            for i in range(24):
-                col = f'h{i}'
-                id_a = row_a[col]
-                id_b = row_b[col]
-                if _norm_id(id_a) != _norm_id(id_b):
-                    list_hour_diff.append((month, day, i, id_a, id_b))
-
-        diff_dict = {
-            'branch_a': branch_a,
-            'branch_b': branch_b,
-            'path_a': wa.path,
-            'path_b': wb.path,
+        for r, i in zip(*np.nonzero(hours_a != hours_b)):
+            id_a, id_b = int(hours_a[r, i]), int(hours_b[r, i])
+            month, day = common_keys[r]
+            list_hour_diff.append((month, day, int(i), id_a if id_a >= 0 else None, id_b if id_b >= 0 else None))
+
+        return {
             'type_only_a': type_only_a,
             'type_only_b': type_only_b,
             'type_value_diff': type_value_diff,
             'list_only_a': list_only_a,
             'list_only_b': list_only_b,
             'list_hour_diff': list_hour_diff,
+            'list_hour_ranges': Weather._hour_diff_ranges(list_hour_diff),
         }
 
-        # 生成可读报告
-        lines = [
-            "═" * 60,
-            f"  分支对比：{branch_a}  vs  {branch_b}",
-            "═" * 60,
-            "",
-            f"  路径 A: {wa.path}",
-            f"  路径 B: {wb.path}",
+    @staticmethod
+    def _first_rows_by_day(data):
+        """(月, 日) -> 该日期在 weatherList 中的第一行行号"""
+        rows = {}
+        for r, key in enumerate(zip(data.months.tolist(), data.days.tolist())):
+            rows.setdefault(key, r)
+        return rows
+
+    @staticmethod
+    def _hour_diff_ranges(list_hour_diff):
+        """逐小时差异合并为连续区间（跨零点相连、A→B 相同）：
+        [(月, 日, 起始小时, 结束月, 结束日, 结束小时(1~24，不含), id_a, id_b, 小时数), ...]，id 为整数（空为 None）"""
+        ranges = []
+        prev_ordinal = None
+        for month, day, hour, id_a, id_b in list_hour_diff:
+            doy = int(day_ordinals(month, day))
+            ordinal = doy * 24 + hour if doy >= 0 else None
+            pair = (id_a, id_b)
+            last = ranges[-1] if ranges else None
+            if last is not None and ordinal is not None and prev_ordinal == ordinal - 1 and (last[6], last[7]) == pair:
+                last[3], last[4], last[5] = month, day, hour + 1
+                last[8] += 1
+            else:
+                ranges.append([month, day, hour, month, day, hour + 1, pair[0], pair[1], 1])
+            prev_ordinal = ordinal
+        return [tuple(r) for r in ranges]
+
+    @staticmethod
+    def _day_key_ranges(keys):
+        """「月-日」列表（已排序）合并连续日期：["3-5", "3-6", "3-7", "4-1"] -> ["3-5 ~ 3-7", "4-1"]"""
+        parts = []
+        start = prev = prev_doy = None
+        for key in keys:
+            month, day = (int(x) for x in key.split('-'))
+            doy = int(day_ordinals(month, day))
+            if start is not None and doy >= 0 and prev_doy == doy - 1:
+                prev, prev_doy = key, doy
+                continue
+            if start is not None:
+                parts.append(start if start == prev else f"{start} ~ {prev}")
+            start = prev = key
+            prev_doy = doy if doy >= 0 else None
+        if start is not None:
+            parts.append(start if start == prev else f"{start} ~ {prev}")
+        return parts
+
+    @staticmethod
+    def _hour_range_text(r):
+        month, day, start, end_month, end_day, end, _, _, _ = r
+        if (month, day) != (end_month, end_day):
+            return f"{month}月{day}日 {start}点～{end_month}月{end_day}日 {end}点"
+        if end == start + 1:
+            return f"{month}月{day}日 {start}点"
+        return f"{month}月{day}日 {start}点～{end}点"
+
+    @staticmethod
+    def _hour_change_counts(ranges):
+        """各天气 ID 在小时差异中的变化：{id: [作为 A 被替换的小时数, 作为 B 新出现的小时数]}，按区间累加"""
+        counts = {}
+        for r in ranges:
+            id_a, id_b, hours = r[6], r[7], r[8]
+            if id_a is not None:
+                counts.setdefault(id_a, [0, 0])[0] += hours
+            if id_b is not None:
+                counts.setdefault(id_b, [0, 0])[1] += hours
+        return counts
+
+    @staticmethod
+    def format_compare_report(diff_dict, title, header_lines, only_a, only_b):
+        """差异字典 -> 对比报告文本：先摘要（各类差异数与各天气 ID 的小时变化），再列明细；
+        小时差异按连续区间（A→B 相同）合并，日期按连续范围合并，报告长度随不同改动的处数增长而非单元格数。
+        title 为标题，header_lines 为标题下的路径说明行，only_a / only_b 为「仅存在于…」的说法（如 "仅存在于路径 A"）"""
+        type_only_a, type_only_b = diff_dict['type_only_a'], diff_dict['type_only_b']
+        type_value_diff = diff_dict['type_value_diff']
+        list_only_a, list_only_b = diff_dict['list_only_a'], diff_dict['list_only_b']
+        ranges = diff_dict['list_hour_ranges']
+        hour_total = sum(r[8] for r in ranges)
+
+        def _id_text(wid):
+            return "空" if wid is None else str(wid)
+
+        lines = ["═" * 60, f"  {title}", "═" * 60, ""] + list(header_lines) + [
+            "─" * 60,
+            "  【摘要】",
+            "─" * 60,
+            f"  weatherType: {only_a} {len(type_only_a)} 个 id，{only_b} {len(type_only_b)} 个 id，字段取值不同 {len(type_value_diff)} 处",
+            f"  weatherList: {only_a} {len(list_only_a)} 天，{only_b} {len(list_only_b)} 天，"
+            f"小时天气不同 {hour_total} 小时（合并为 {len(ranges)} 段）",
+        ]
+        counts = Weather._hour_change_counts(ranges)
+        if counts:
+            lines.append("  各天气 ID 的小时变化（A 中被替换 / B 中新出现）:")
+            for wid, (lost, gained) in sorted(counts.items(), key=lambda kv: (-(kv[1][0] + kv[1][1]), str(kv[0]))):
+                lines.append(f"    {_id_text(wid):>6}: -{lost:<6} +{gained}")
+        lines += [
             "",
             "─" * 60,
             "  【weatherType】天气类型表",
             "─" * 60,
         ]
-        if type_only_a:
-            lines.append(f"  仅存在于 {branch_a} 的 id: {type_only_a}")
-        else:
-            lines.append(f"  仅存在于 {branch_a} 的 id: 无")
-        if type_only_b:
-            lines.append(f"  仅存在于 {branch_b} 的 id: {type_only_b}")
-        else:
-            lines.append(f"  仅存在于 {branch_b} 的 id: 无")
+        for label, ids in ((only_a, type_only_a), (only_b, type_only_b)):
+            if ids:
+                lines.append(f"  {label} 的 id: {Weather._jsonable(ids)}")
+            else:
+                lines.append(f"  {label} 的 id: 无")
         if type_value_diff:
             lines.append(f"  同 id 下字段取值不同（共 {len(type_value_diff)} 处）:")
             for wid, col, v_a, v_b in type_value_diff:
@@ -709,28 +1474,108 @@ class Weather:
         lines.append("─" * 60)
         lines.append("  【weatherList】每日天气表")
         lines.append("─" * 60)
-        if list_only_a:
-            lines.append(f"  仅存在于 {branch_a} 的日期（共 {len(list_only_a)} 天）:")
-            for k in list_only_a:
-                lines.append(f"    {k}")
-        else:
-            lines.append(f"  仅存在于 {branch_a} 的日期: 无")
-        if list_only_b:
-            lines.append(f"  仅存在于 {branch_b} 的日期（共 {len(list_only_b)} 天）:")
-            for k in list_only_b:
-                lines.append(f"    {k}")
-        else:
-            lines.append(f"  仅存在于 {branch_b} 的日期: 无")
-        if list_hour_diff:
-            lines.append(f"  同一日期下小时天气不同（共 {len(list_hour_diff)} 处）:")
-            for month, day, hour, id_a, id_b in list_hour_diff:
-                lines.append(f"    {month}月{day}日 {hour}点: A={id_a}  →  B={id_b}")
+        for label, keys in ((only_a, list_only_a), (only_b, list_only_b)):
+            if keys:
+                lines.append(f"  {label} 的日期（共 {len(keys)} 天）:")
+                for k in Weather._day_key_ranges(keys):
+                    lines.append(f"    {k}")
+            else:
+                lines.append(f"  {label} 的日期: 无")
+        if ranges:
+            lines.append(f"  同一日期下小时天气不同（共 {hour_total} 小时，{len(ranges)} 段）:")
+            for r in ranges:
+                hours = f"（{r[8]} 小时）" if r[8] > 1 else ""
+                lines.append(f"    {Weather._hour_range_text(r)}: A={_id_text(r[6])}  →  B={_id_text(r[7])}{hours}")
         else:
             lines.append("  同一日期下小时天气不同: 无")
         lines.append("")
         lines.append("═" * 60)
+        return "\n".join(lines)
+
+    @staticmethod
+    def _jsonable(value):
+        """差异字典中的值 -> 可 JSON 序列化的值（numpy 标量转 Python 数，NaN 转 None，元组转列表）"""
+        if isinstance(value, dict):
+            return {str(k): Weather._jsonable(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [Weather._jsonable(v) for v in value]
+        if isinstance(value, np.integer):
+            return int(value)
+        if isinstance(value, (float, np.floating)):
+            return None if np.isnan(value) else float(value)
+        return value
+
+    @staticmethod
+    def diff_to_json(diff_dict):
+        """差异字典 -> JSON 文本（含合并后的小时区间与各 ID 小时变化，便于脚本处理）"""
+        data = Weather._jsonable(diff_dict)
+        data['list_hour_ranges'] = [
+            dict(zip(("month", "day", "start_hour", "end_month", "end_day", "end_hour", "id_a", "id_b", "hours"), r))
+            for r in data['list_hour_ranges']
+        ]
+        data['hour_change_by_id'] = {
+            str(wid): {"lost": lost, "gained": gained}
+            for wid, (lost, gained) in Weather._hour_change_counts(diff_dict['list_hour_ranges']).items()
+        }
+        return json.dumps(data, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def diff_to_csv(diff_dict):
+        """差异字典 -> CSV 文本：每行一处差异（类别、开始、结束、列、A、B、小时数），小时差异按合并后的区间"""
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["类别", "开始", "结束", "列", "A", "B", "小时数"])
+        plain = Weather._jsonable
+        for wid in diff_dict['type_only_a']:
+            writer.writerow(["仅A有的id", plain(wid), "", "", "", "", ""])
+        for wid in diff_dict['type_only_b']:
+            writer.writerow(["仅B有的id", plain(wid), "", "", "", "", ""])
+        for wid, col, v_a, v_b in diff_dict['type_value_diff']:
+            writer.writerow(["字段不同", plain(wid), "", col, plain(v_a), plain(v_b), ""])
+        for key in diff_dict['list_only_a']:
+            writer.writerow(["仅A有的日期", key, "", "", "", "", ""])
+        for key in diff_dict['list_only_b']:
+            writer.writerow(["仅B有的日期", key, "", "", "", "", ""])
+        for month, day, start, end_month, end_day, end, id_a, id_b, hours in diff_dict['list_hour_ranges']:
+            writer.writerow(["小时不同", f"{month}-{day} {start}", f"{end_month}-{end_day} {end}", "",
+                             plain(id_a), plain(id_b), hours])
+        return out.getvalue()
+
+    @staticmethod
+    def compare_branches(branch_a, branch_b, save_to_file=False, branches=None):
+        """
+        对比两个分支路径下的 weather.xlsx，返回差别说明。
 
-        formatted_report = "\n".join(lines)
+        :param branch_a: 分支名，如 'stage'、'hotfix'、'review'、'release'
+        :param branch_b: 另一分支名
+        :param save_to_file: 是否将对比结果保存为 txt
+        :param branches: 分支注册表，默认模块级 BRANCHES
+        :return: (diff_dict, formatted_report, output_file_path)
+                 diff_dict 含 type_only_a, type_only_b, type_value_diff, list_only_a, list_only_b, list_hour_diff 等
+        """
+        from weather_registry import REGISTRY
+        wa = Weather(branch=branch_a, branches=branches)
+        wb = Weather(branch=branch_b, branches=branches)
+        if not os.path.isfile(wa.path):
+            raise FileNotFoundError(f"分支 {branch_a} 文件不存在: {wa.path}")
+        if not os.path.isfile(wb.path):
+            raise FileNotFoundError(f"分支 {branch_b} 文件不存在: {wb.path}")
+
+        # 对比与分类表无关：进程内已加载的数据（不论分类表）直接取用，否则读取一次并登记
+        wa = REGISTRY.load(wa.path)
+        wb = REGISTRY.load(wb.path)
+
+        diff_dict = {'branch_a': branch_a, 'branch_b': branch_b, 'path_a': wa.path, 'path_b': wb.path}
+        diff_dict.update(Weather.diff_weather(wa, wb))
+
+        # 生成可读报告
+        formatted_report = Weather.format_compare_report(
+            diff_dict,
+            f"分支对比：{branch_a}  vs  {branch_b}",
+            [f"  路径 A: {wa.path}", f"  路径 B: {wb.path}", ""],
+            f"仅存在于 {branch_a}",
+            f"仅存在于 {branch_b}",
+        )
         output_file_path = None
         if save_to_file:
             output_file_path = Weather._save_to_file_static(
@@ -754,17 +1599,7 @@ class Weather:
         :return: (diff_dict, formatted_report, output_file_path)
         """
         def _to_excel_path(p):
-            p = p.strip()
-            if not p:
-                return None
-            if p.endswith('.xlsx') and os.path.isfile(p):
-                return p
-            full = os.path.join(p, Weather.RELATIVE_EXCEL_PATH)
-            if os.path.isfile(full):
-                return full
-            if os.path.isfile(p):
-                return p
-            return full  # 让后续 isfile 报错
+            return resolve_excel_path(p) if p and p.strip() else None
 
         path_a = _to_excel_path(excel_path_a)
         path_b = _to_excel_path(excel_path_b)
@@ -773,128 +1608,33 @@ class Weather:
         if not path_b or not os.path.isfile(path_b):
             raise FileNotFoundError(f"路径 B 对应的 weather.xlsx 不存在: {path_b or excel_path_b}")
 
-        wa = Weather(custom_excel_path=path_a)
-        wb = Weather(custom_excel_path=path_b)
-        wa.read_file()
-        wb.read_file()
+        # 进程内已加载的数据（如界面当前显示的路径 A）直接取用，不再解析
+        from weather_registry import REGISTRY
+        wa = REGISTRY.load(path_a)
+        wb = REGISTRY.load(path_b)
+        return Weather.compare_weathers(wa, wb, label_a, label_b, save_to_file)
 
+    @staticmethod
+    def compare_weathers(wa, wb, label_a=None, label_b=None, save_to_file=False):
+        """
+        对比两份已加载的数据（如预加载的分支），报告格式同 compare_two_paths。
+
+        :return: (diff_dict, formatted_report, output_file_path)
+        """
+        path_a, path_b = wa.path, wb.path
         name_a = label_a if label_a is not None else path_a
         name_b = label_b if label_b is not None else path_b
 
-        def _norm_id(x):
-            if pd.isna(x):
-                return None
-            return int(x) if isinstance(x, float) else x
-
-        da = wa.df_weather_type.copy()
-        db = wb.df_weather_type.copy()
-        da['_id'] = da['id'].map(_norm_id)
-        db['_id'] = db['id'].map(_norm_id)
-        ids_a = set(da['_id'].dropna().unique())
-        ids_b = set(db['_id'].dropna().unique())
-        type_only_a = sorted(ids_a - ids_b)
-        type_only_b = sorted(ids_b - ids_a)
-        common_ids = sorted(ids_a & ids_b)
-        cols_type = [c for c in da.columns if c in db.columns and c != '_id' and c != 'id']
-        type_value_diff = []
-        for wid in common_ids:
-            row_a = da[da['_id'] == wid].iloc[0]
-            row_b = db[db['_id'] == wid].iloc[0]
-            for col in cols_type:
-                v_a, v_b = row_a[col], row_b[col]
-                if pd.isna(v_a):
-                    v_a = None
-                if pd.isna(v_b):
-                    v_b = None
-                if v_a != v_b:
-                    type_value_diff.append((wid, col, v_a, v_b))
-
-        la = wa.df_weather_list.copy()
-        lb = wb.df_weather_list.copy()
-        la['_key'] = la['month'].astype(int).astype(str) + '-' + la['day'].astype(int).astype(str)
-        lb['_key'] = lb['month'].astype(int).astype(str) + '-' + lb['day'].astype(int).astype(str)
-        keys_a = set(la['_key'].unique())
-        keys_b = set(lb['_key'].unique())
-        list_only_a = sorted(keys_a - keys_b, key=lambda x: (int(x.split('-')[0]), int(x.split('-')[1])))
-        list_only_b = sorted(keys_b - keys_a, key=lambda x: (int(x.split('-')[0]), int(x.split('-')[1])))
-        common_keys = sorted(keys_a & keys_b, key=lambda x: (int(x.split('-')[0]), int(x.split('-')[1])))
-        list_hour_diff = []
-        for key in common_keys:
-            row_a = la[la['_key'] == key].iloc[0]
-            row_b = lb[lb['_key'] == key].iloc[0]
-            month, day = int(row_a['month']), int(row_a['day'])
-            for i in range(24):
-                col = f'h{i}'
-                id_a, id_b = row_a[col], row_b[col]
-                if _norm_id(id_a) != _norm_id(id_b):
-                    list_hour_diff.append((month, day, i, id_a, id_b))
-
-        diff_dict = {
-            'path_a': path_a,
-            'path_b': path_b,
-            'type_only_a': type_only_a,
-            'type_only_b': type_only_b,
-            'type_value_diff': type_value_diff,
-            'list_only_a': list_only_a,
-            'list_only_b': list_only_b,
-            'list_hour_diff': list_hour_diff,
-        }
-
-        lines = [
-            "═" * 60,
-            f"  分支对比：路径 A  vs  路径 B",
-            "═" * 60,
-            "",
-            f"  路径 A: {name_a}",
-            f"  路径 B: {name_b}",
-            "",
-            f"  文件 A: {path_a}",
-            f"  文件 B: {path_b}",
-            "",
-            "─" * 60,
-            "  【weatherType】天气类型表",
-            "─" * 60,
-        ]
-        if type_only_a:
-            lines.append(f"  仅存在于路径 A 的 id: {type_only_a}")
-        else:
-            lines.append(f"  仅存在于路径 A 的 id: 无")
-        if type_only_b:
-            lines.append(f"  仅存在于路径 B 的 id: {type_only_b}")
-        else:
-            lines.append(f"  仅存在于路径 B 的 id: 无")
-        if type_value_diff:
-            lines.append(f"  同 id 下字段取值不同（共 {len(type_value_diff)} 处）:")
-            for wid, col, v_a, v_b in type_value_diff:
-                lines.append(f"    id={wid}, 列「{col}」: A={v_a!r}  →  B={v_b!r}")
-        else:
-            lines.append("  同 id 下字段取值不同: 无")
-        lines.append("")
-        lines.append("─" * 60)
-        lines.append("  【weatherList】每日天气表")
-        lines.append("─" * 60)
-        if list_only_a:
-            lines.append(f"  仅存在于路径 A 的日期（共 {len(list_only_a)} 天）:")
-            for k in list_only_a:
-                lines.append(f"    {k}")
-        else:
-            lines.append(f"  仅存在于路径 A 的日期: 无")
-        if list_only_b:
-            lines.append(f"  仅存在于路径 B 的日期（共 {len(list_only_b)} 天）:")
-            for k in list_only_b:
-                lines.append(f"    {k}")
-        else:
-            lines.append(f"  仅存在于路径 B 的日期: 无")
-        if list_hour_diff:
-            lines.append(f"  同一日期下小时天气不同（共 {len(list_hour_diff)} 处）:")
-            for month, day, hour, id_a, id_b in list_hour_diff:
-                lines.append(f"    {month}月{day}日 {hour}点: A={id_a}  →  B={id_b}")
-        else:
-            lines.append("  同一日期下小时天气不同: 无")
-        lines.append("")
-        lines.append("═" * 60)
+        diff_dict = {'path_a': path_a, 'path_b': path_b}
+        diff_dict.update(Weather.diff_weather(wa, wb))
 
-        formatted_report = "\n".join(lines)
+        formatted_report = Weather.format_compare_report(
+            diff_dict,
+            "分支对比：路径 A  vs  路径 B",
+            [f"  路径 A: {name_a}", f"  路径 B: {name_b}", "", f"  文件 A: {path_a}", f"  文件 B: {path_b}", ""],
+            "仅存在于路径 A",
+            "仅存在于路径 B",
+        )
         output_file_path = None
         if save_to_file:
             output_file_path = Weather._save_to_file_static(formatted_report, "weather_compare_two_paths")
@@ -966,11 +1706,13 @@ if __name__ == '__main__':
         print(f"  已保存到: {range_file}")
     print()
 
-    # # 4.3 显示全部日期（仅打印前几行示意）
-    # print("4.3 显示全部日期 (show_all=True, 仅打印前500字)")
-    # _, all_text, _ = weather.get_weather_list_by_day(show_all=True)
-    # print(all_text[:500] + "..." if len(all_text) > 500 else all_text)
-    # print()
+    # 4.3 显示全部日期：分页逐页输出（首页渲染完立即打印，不必等全年格式化完成）
+    print("4.3 显示全部日期 (iter_pages, 每页 31 天, 仅打印首页)")
+    for page in weather.iter_pages(show_all=True):
+        if page.done <= weather.PAGE_DAYS:
+            print(page.text)
+        print(f"  已输出 {page.done}/{page.total} 天")
+    print()
 
     # # ========== 5. find_weather_id(weather_id) 用法 ==========
     # print("=" * 50)
@@ -7,17 +7,29 @@
 import calendar
 import json
 import os
+import queue
 import subprocess
 import sys
 import tempfile
-import threading
 import tkinter as tk
-import urllib.request
 import webbrowser
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox, scrolledtext, filedialog
 from datetime import date, datetime
 
-from weather import Weather
+from weather import Weather, DEFAULT_WEATHER_CATEGORIES, SPECIAL_CATEGORY, parse_id_spec, format_id_ranges, resolve_excel_path, set_branches
+from weather_stats import WeatherStats, TRANSITION_COLUMNS, transition_rows
+from weather_query import compile_query
+from weather_store import load_weather
+from weather_binary import load_weather as load_compiled_weather
+from weather_history import WeatherHistory, format_entries
+from weather_branches import BranchPrefetcher
+from weather_registry import REGISTRY, DEFAULT_MAX_ITEMS, DEFAULT_MAX_MB, DatasetSnapshot
+from weather_validate import NOTICE, validate_paths, format_reports
+from weather_watchdog import StallWatchdog
+from weather_profile import ProfileSession
+from weather_update import MANIFEST_NAME, UPDATE_CHECK_TTL, check_release, fetch_manifest, download, plan_delta, delta_bytes, stage_delta
 
 # 相对路径：在所选根目录下拼接此路径得到 weather.xlsx
 EXCEL_REL_PATH = os.path.join("RawAssets", "DesignerAssets", "NewDatabase", "logic", "weather.xlsx")
@@ -74,6 +86,136 @@ def _save_folder(folder):
         pass
 
 
+def _load_weather_categories():
+    """读取天气分类表：配置文件中 weather_categories（分类名 -> ID 列表，可写 "107-118"）覆盖默认分类。
+    配置无效时回退默认值。"""
+    data, _, _ = _load_config()
+    categories = data.get("weather_categories")
+    if not isinstance(categories, dict) or not categories:
+        return dict(DEFAULT_WEATHER_CATEGORIES)
+    try:
+        for spec in categories.values():
+            parse_id_spec(spec)
+    except (TypeError, ValueError):
+        return dict(DEFAULT_WEATHER_CATEGORIES)
+    return categories
+
+
+def _load_segment_store_path():
+    """读取可选的时段索引库路径（配置 segment_store，相对路径按程序目录解析），未配置返回 None"""
+    data, _, _ = _load_config()
+    path = data.get("segment_store")
+    if not isinstance(path, str) or not path.strip():
+        return None
+    return path if os.path.isabs(path) else os.path.join(_app_dir(), path)
+
+
+def _load_compiled_cache_dir():
+    """读取可选的编译文件缓存目录（配置 compiled_cache，相对路径按程序目录解析），未配置返回 None"""
+    data, _, _ = _load_config()
+    path = data.get("compiled_cache")
+    if not isinstance(path, str) or not path.strip():
+        return None
+    return path if os.path.isabs(path) else os.path.join(_app_dir(), path)
+
+
+def _load_history_dir():
+    """读取可选的版本历史目录（配置 history_dir，相对路径按程序目录解析），未配置返回 None"""
+    data, _, _ = _load_config()
+    path = data.get("history_dir")
+    if not isinstance(path, str) or not path.strip():
+        return None
+    return path if os.path.isabs(path) else os.path.join(_app_dir(), path)
+
+
+def _load_branches():
+    """读取分支注册表（配置 branches：分支名 -> 项目根目录或 logic 目录），未配置或格式错误返回空字典"""
+    data, _, _ = _load_config()
+    branches = data.get("branches")
+    if not isinstance(branches, dict):
+        return {}
+    return {str(name): path for name, path in branches.items() if isinstance(path, str) and path.strip()}
+
+
+def _load_branch_cache_limits():
+    """读取常驻内存的数据上限（配置 branch_cache_max 份数、branch_cache_mb 估算内存），返回 (份数, 字节数)"""
+    data, _, _ = _load_config()
+    try:
+        max_items = int(data.get("branch_cache_max", DEFAULT_MAX_ITEMS))
+        max_mb = float(data.get("branch_cache_mb", DEFAULT_MAX_MB))
+    except (TypeError, ValueError):
+        max_items, max_mb = DEFAULT_MAX_ITEMS, DEFAULT_MAX_MB
+    return max_items, int(max_mb * (1 << 20))
+
+
+def _read_weather(excel_path, store_path=None, compiled_dir=None, history_dir=None, previous=None):
+    """按配置读取一份数据：索引库 > 编译文件缓存 > 直接读 Excel；配置了版本历史时顺带记录。
+    previous 为同一文件上一次加载的数据时沿用其中未改动的天已渲染的输出片段。
+    片段沿用与数据检查都在返回前做完，数据登记、交给查询线程之后不再由加载线程修改"""
+    if store_path:
+        # 配置了索引库：文件未变化时直接从库中还原，否则读取 Excel 后写入库
+        w = load_weather(store_path, excel_path, categories=WEATHER_CATEGORIES)
+    elif compiled_dir:
+        # 配置了编译文件缓存：文件未变化时直接内存映射打开，否则读取 Excel 后写出编译文件
+        w = load_compiled_weather(compiled_dir, excel_path, categories=WEATHER_CATEGORIES)
+    else:
+        w = Weather(custom_excel_path=excel_path, categories=WEATHER_CATEGORIES)
+        w.read_file()
+    if previous is not None:
+        w.reuse_fragments(previous)
+    if history_dir:
+        # 配置了版本历史：内容与上次记录不同时存入历史库（失败不影响加载）
+        try:
+            WeatherHistory(history_dir).record(w, excel_path)
+        except Exception:
+            pass
+    # 数据检查（向量化，只需几毫秒）：在后台线程中算好并缓存，切换到该数据时直接显示结论
+    try:
+        w.validate()
+    except Exception:
+        pass
+    return w
+
+
+def _load_stall_threshold_ms():
+    """读取界面卡顿记录阈值（配置 stall_threshold_ms，默认 1000 毫秒；0 表示关闭）"""
+    data, _, _ = _load_config()
+    try:
+        return max(int(data.get("stall_threshold_ms", 1000)), 0)
+    except (TypeError, ValueError):
+        return 1000
+
+
+def _load_update_base_url():
+    """读取按文件增量更新的下载地址（配置 update_base_url，如内网镜像；未配置时用发布清单中的 base_url）"""
+    data, _, _ = _load_config()
+    value = data.get("update_base_url")
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+
+def _load_update_check():
+    """读取检查更新的设置与缓存：(上次的检查结果缓存, 缓存有效期秒数)。
+    配置 update_check_hours 为有效期（默认 6 小时），0 表示不在启动后自动检查"""
+    data, _, _ = _load_config()
+    cache = data.get("update_check")
+    try:
+        hours = float(data.get("update_check_hours", UPDATE_CHECK_TTL / 3600))
+    except (TypeError, ValueError):
+        hours = UPDATE_CHECK_TTL / 3600
+    return (cache if isinstance(cache, dict) else None), max(hours, 0) * 3600
+
+
+def _save_update_check(cache):
+    """保存检查更新结果缓存（ETag、检查时间、发布信息）到配置"""
+    data, _, _ = _load_config()
+    data["update_check"] = cache
+    try:
+        with open(_config_path(), "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    except Exception:
+        pass
+
+
 def _load_save_folder():
     """读取上次选择的保存文件目录，首次返回 None"""
     _, _, folder = _load_config()
@@ -100,20 +242,54 @@ WEEK_HEADERS = ("日", "一", "二", "三", "四", "五", "六")
 # 使 monthcalendar 第一列是周日，与表头一致（默认是周一）
 calendar.setfirstweekday(calendar.SUNDAY)
 
-# 特殊天气：属性名 -> 包含的天气 ID 列表（用于多选查询）
-SPECIAL_WEATHER_ATTRS = {
-    "晴天": [101, 102, 105],
-    "雨天": [201, 202, 203, 204],
-    "酷暑": [104],
-    "花瓣雨": [106],
-    "流星雨": list(range(107, 119)),  # 107-118
-    "极光": [119, 120, 121],
-    "雪天": [211, 212, 213],  # 小雪、中雪、大雪
-    "彩虹": [301, 302, 303, 304, 305],
-}
+# 特殊天气：属性名 -> 包含的天气 ID 列表（用于多选查询），来自分类表（不含 SPECIAL_CATEGORY 本身）
+WEATHER_CATEGORIES = _load_weather_categories()
+SPECIAL_WEATHER_ATTRS = {name: parse_id_spec(spec) for name, spec in WEATHER_CATEGORIES.items() if name != SPECIAL_CATEGORY}
+
+class _TaskCancelled(Exception):
+    """后台任务已被同一通道的新任务取代（协作式取消，由 _Task.check 抛出）"""
+
+
+class _Task:
+    """后台任务句柄：worker 内用 progress()/partial() 回传进度与部分结果，用 check() 响应取消。
+    同一通道（channel）同一时刻只有最新提交的任务有效，旧任务被标记 cancelled 并在下次检查时退出。"""
+    __slots__ = ("channel", "cancelled", "handlers", "_queue")
+
+    def __init__(self, channel, result_queue, handlers):
+        self.channel = channel
+        self.cancelled = False
+        self.handlers = handlers  # (on_done, on_error, on_progress, on_partial)
+        self._queue = result_queue
+
+    def check(self):
+        if self.cancelled:
+            raise _TaskCancelled()
+
+    def progress(self, done, total):
+        """供 Weather 查询方法的 progress 回调使用；任务已取消时抛出 _TaskCancelled 中止查询"""
+        self.check()
+        self._queue.put(("progress", self, (done, total)))
+
+    def partial(self, payload):
+        self.check()
+        self._queue.put(("partial", self, payload))
 
 
 class WeatherApp:
+    # 后台线程数（加载 / 查询 / 对比 / 更新共用一个线程池）与结果队列轮询间隔（毫秒）
+    MAX_WORKERS = 2
+    TASK_POLL_MS = 40
+    # 每次轮询最多处理的消息数，避免一次处理过多进度消息卡住界面
+    TASK_POLL_BATCH = 64
+    # 表格分批插入行数：先显示第一批，其余分批追加
+    TABLE_CHUNK_ROWS = 400
+    # 条件查询的输出类型：下拉显示名 -> CompiledQuery.format_result 的 kind
+    EXPRESSION_RESULT_KINDS = {"时段": "segments", "小时数": "counts", "日期": "days"}
+    # 启动后多久开始后台预加载各分支（毫秒），先让当前路径加载完
+    PREFETCH_DELAY_MS = 3000
+    # 启动后多久在后台静默检查更新（毫秒）
+    UPDATE_CHECK_DELAY_MS = 5000
+
     def __init__(self, root):
         self.root = root
         self.root.title("天气数据查询 · 日历  v%s" % __version__)
@@ -121,13 +297,21 @@ class WeatherApp:
         self.root.minsize(1600, 960)
         self.root.configure(bg="#f0f0f0")
 
-        self.weather = None
-        self._data_loaded = False
+        # 当前数据快照（DatasetSnapshot）：只在主线程整体替换，未加载或加载失败时为 None
+        self._snapshot = None
         self._last_text = ""
         self._last_file_path = None
         self._current_folder = _load_saved_folder()
         self._save_folder = _load_save_folder()
         self._compare_path_b = None  # 分支对比用路径 B，默认不展示
+        # 分支注册表（配置 branches）与已加载数据的内存缓存：切换分支、对比时优先取缓存
+        self._branches = _load_branches()
+        if self._branches:
+            set_branches(self._branches)
+        self._datasets = REGISTRY
+        self._datasets.configure(*_load_branch_cache_limits())
+        self._prefetcher = None
+        self._profile = None  # 性能采样进行中时为 ProfileSession
 
         self.font = ("Microsoft YaHei UI", 11)
         self.font_bold = ("Microsoft YaHei UI", 11, "bold")
@@ -136,13 +320,45 @@ class WeatherApp:
         self._cal_month = date.today().month
         self._day_buttons = []
 
+        # 统一后台执行器：worker 把结果放入队列，主线程用 root.after 轮询取回
+        self._executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS, thread_name_prefix="weather-worker")
+        self._task_queue = queue.Queue()
+        self._current_tasks = {}  # channel -> _Task
+        self._table_fill_seq = 0
+        # 当前表格待插入的行：[(行列表, 已插入到的下标), ...]，按到达顺序分批插入
+        self._table_pending = deque()
+        self._table_draining = False
+
         self._setup_styles()
         self._build_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+        # 界面卡顿监视：事件循环心跳迟到超过阈值时，记录当时主线程正在执行的处理函数与调用栈
+        self._watchdog = None
+        stall_threshold = _load_stall_threshold_ms()
+        if stall_threshold:
+            self._watchdog = StallWatchdog(self.root, os.path.join(_app_dir(), "weather_stalls.log"),
+                                           threshold_ms=stall_threshold, app_files=[os.path.abspath(__file__)])
+            self._watchdog.start()
+        self.root.after(self.TASK_POLL_MS, self._poll_tasks)
         # 若有已保存路径且文件存在，进入应用后自动加载
         if self._current_folder and os.path.isdir(self._current_folder):
-            excel_path = os.path.join(self._current_folder, EXCEL_REL_PATH)
+            excel_path = resolve_excel_path(self._current_folder)
             if os.path.isfile(excel_path):
                 self.root.after(80, self._auto_load)
+        if self._branches:
+            self.root.after(self.PREFETCH_DELAY_MS, self._start_prefetch)
+        if _load_update_check()[1] > 0:
+            self.root.after(self.UPDATE_CHECK_DELAY_MS, self._check_update, True)
+
+    @property
+    def weather(self):
+        """当前快照的数据；后台任务应在提交时取一次引用，执行期间不再读取此属性"""
+        snapshot = self._snapshot
+        return snapshot.weather if snapshot is not None else None
+
+    @property
+    def _data_loaded(self):
+        return self._snapshot is not None
 
     def _setup_styles(self):
         """统一放大并美化 ttk 控件样式"""
@@ -160,6 +376,11 @@ class WeatherApp:
         style.configure("TButton", font=self.font_small, padding=(10, 6))
         style.configure("TNotebook", padding=2)
         style.configure("TNotebook.Tab", font=self.font_small, padding=(12, 6))
+        # 日历格子：普通日期 / 今天 / 空白格（空白格无边框，与背景一致）
+        style.configure("CalDay.TButton", padding=(4, 4))
+        style.configure("CalToday.TButton", padding=(4, 4), font=self.font_bold, foreground="#1a5fb4")
+        style.configure("CalEmpty.TButton", padding=(4, 4), relief="flat", borderwidth=0, background="#f0f0f0")
+        style.map("CalEmpty.TButton", background=[("disabled", "#f0f0f0")])
 
     def _build_ui(self):
         main = ttk.Frame(self.root, padding=16)
@@ -183,7 +404,13 @@ class WeatherApp:
 
         self.status_var = tk.StringVar(value="请点击「选择路径」选择项目根目录" if not self._current_folder else "正在加载…" if self._data_loaded else "已记住路径")
         ttk.Label(top, textvariable=self.status_var, font=self.font_small).grid(row=0, column=2, padx=12)
-        ttk.Button(top, text="检查更新", command=self._check_update).grid(row=0, column=3, padx=4)
+        self.update_btn_var = tk.StringVar(value="检查更新")
+        ttk.Button(top, textvariable=self.update_btn_var, command=self._check_update).grid(row=0, column=3, padx=4)
+        if self._branches:
+            ttk.Label(top, text="分支:").grid(row=0, column=4, padx=(12, 2))
+            self.branch_combo = ttk.Combobox(top, values=list(self._branches), width=12, state="readonly")
+            self.branch_combo.grid(row=0, column=5, padx=4)
+            self.branch_combo.bind("<<ComboboxSelected>>", lambda e: self._on_choose_branch(self.branch_combo.get()))
 
         # ----- 左：日历 + 保存/打开栏（上下排列） -----
         left_wrapper = ttk.Frame(main)
@@ -229,6 +456,12 @@ class WeatherApp:
         ttk.Label(save_frame, textvariable=self.save_path_var, font=self.font_small).grid(row=1, column=0, sticky="w", padx=0, pady=(0, 4))
         ttk.Button(save_frame, text="保存当前结果到文件", command=self._save_current_result).grid(row=2, column=0, sticky="w", pady=2)
         ttk.Button(save_frame, text="打开刚刚保存的文件", command=self._open_last_saved_file).grid(row=3, column=0, sticky="w", pady=2)
+        profile_row = ttk.Frame(save_frame)
+        profile_row.grid(row=4, column=0, sticky="w", pady=(6, 2))
+        self.profile_btn_var = tk.StringVar(value="开始性能采样")
+        ttk.Button(profile_row, textvariable=self.profile_btn_var, command=self._toggle_profile).pack(side=tk.LEFT)
+        self.profile_memory_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(profile_row, text="含内存", variable=self.profile_memory_var).pack(side=tk.LEFT, padx=(6, 0))
 
         # ----- 中：天气 ID 含义（与日历、查询结果同高） -----
         mid_wrapper = ttk.Frame(main)
@@ -305,6 +538,7 @@ class WeatherApp:
         self._add_tab_find_weather_id()
         self._add_tab_special()
         self._add_tab_compare()
+        self._add_tab_stats()
 
     def _set_id_meanings_placeholder(self):
         """未加载时显示的占位文字"""
@@ -317,12 +551,13 @@ class WeatherApp:
         """根据已加载的 weather 数据填充「天气 ID 含义」"""
         self.id_meanings_text.config(state="normal")
         self.id_meanings_text.delete("1.0", tk.END)
-        if not self.weather or not self._data_loaded:
+        weather = self.weather
+        if weather is None:
             self.id_meanings_text.insert(tk.END, "请先加载数据，此处将显示所有天气 ID 与含义。")
             self.id_meanings_text.config(state="disabled")
             return
         try:
-            ids = sorted(self.weather.df_weather_type["id"].dropna().unique().tolist())
+            ids = sorted(weather.df_weather_type["id"].dropna().unique().tolist())
             # 转为 int 再排序，避免 119.0 与 119 重复
             seen = set()
             id_list = []
@@ -337,34 +572,56 @@ class WeatherApp:
             id_list = [x for x in id_list if x not in exclude_ids]
             lines = []
             for wid in id_list:
-                name = self.weather.get_weather_type(wid)
+                name = weather.get_weather_type(wid)
                 lines.append(f"  {wid:>4}  →  {name}")
             self.id_meanings_text.insert(tk.END, "\n".join(lines) if lines else "无数据")
         except Exception:
             self.id_meanings_text.insert(tk.END, "加载 ID 含义时出错")
         self.id_meanings_text.config(state="disabled")
 
+    # 日历固定 6 行 × 7 列格子，创建一次后只改内容，翻月时不再销毁/新建控件
+    CAL_ROWS = 6
+
+    def _build_calendar_cells(self):
+        """创建日历格子池：每格一个按钮，command 只绑定一次（按格子序号回调）"""
+        self._cal_cells = []
+        self._cal_cell_days = [0] * (self.CAL_ROWS * 7)
+        for r in range(self.CAL_ROWS):
+            for c in range(7):
+                idx = r * 7 + c
+                btn = ttk.Button(
+                    self.cal_grid_frame, text="", width=3, style="CalEmpty.TButton",
+                    command=lambda i=idx: self._on_cal_cell_click(i)
+                )
+                btn.grid(row=r, column=c, padx=2, pady=2)
+                self._cal_cells.append(btn)
+
     def _refresh_calendar(self):
-        """根据当前年月重绘日历格子"""
+        """根据当前年月原地更新日历格子（文字、状态、样式），不重建控件"""
         self.cal_title_var.set(f"{self._cal_year}年 {self._cal_month}月")
-        # 清空旧按钮
-        for w in self.cal_grid_frame.winfo_children():
-            w.destroy()
+        if not getattr(self, "_cal_cells", None):
+            self._build_calendar_cells()
         self._day_buttons.clear()
 
+        today = date.today()
+        is_this_month = (today.year, today.month) == (self._cal_year, self._cal_month)
         weeks = calendar.monthcalendar(self._cal_year, self._cal_month)
-        for r, week in enumerate(weeks):
-            for c, day in enumerate(week):
-                if day == 0:
-                    lbl = ttk.Label(self.cal_grid_frame, text="", width=2)
-                    lbl.grid(row=r, column=c, padx=2, pady=2)
-                else:
-                    btn = ttk.Button(
-                        self.cal_grid_frame, text=str(day), width=3,
-                        command=lambda d=day: self._on_cal_day_click(d)
-                    )
-                    btn.grid(row=r, column=c, padx=2, pady=2)
-                    self._day_buttons.append((self._cal_month, day, btn))
+        for idx, btn in enumerate(self._cal_cells):
+            r, c = divmod(idx, 7)
+            day = weeks[r][c] if r < len(weeks) else 0
+            self._cal_cell_days[idx] = day
+            if day == 0:
+                btn.configure(text="", state="disabled", style="CalEmpty.TButton")
+            else:
+                style = "CalToday.TButton" if is_this_month and day == today.day else "CalDay.TButton"
+                btn.configure(text=str(day), state="normal", style=style)
+                self._day_buttons.append((self._cal_month, day, btn))
+
+    def _on_cal_cell_click(self, idx):
+        """日历格子点击：按格子序号取当前月对应的日期"""
+        day = self._cal_cell_days[idx]
+        if day:
+            self._on_cal_day_click(day)
 
     def _cal_prev_month(self):
         if self._cal_month <= 1:
@@ -385,19 +642,22 @@ class WeatherApp:
     def _on_cal_day_click(self, day):
         """点击日历某日：查询当日 24 小时天气并显示在右侧；右侧同时展示该日特殊天气"""
         month = self._cal_month
-        if not self._data_loaded or self.weather is None:
+        # 单日查询在主线程直接完成，先取消尚未返回的后台查询，避免旧结果覆盖当前日期
+        self._cancel_channel("result")
+        weather = self.weather
+        if weather is None:
             self.result_title_var.set(f"{month}月{day}日 — 请先加载数据")
             self._set_result("请先选择分支并点击「加载数据」，再点击日期查询。")
             return
         try:
-            _, text, _, cols, rows = self.weather.get_weather_list_by_day(month=month, day=day)
+            _, text, _, cols, rows = weather.get_weather_list_by_day(month=month, day=day)
             self.result_title_var.set(f"{month}月{day}日 全天天气")
             self._last_file_path = None
             if cols and rows:
                 self._set_result_table(cols, rows, text_for_save=text or "")
             else:
                 self._set_result(text or "未找到该日期数据。")
-            special_text = self.weather.get_special_weather_for_day(month, day)
+            special_text = weather.get_special_weather_for_day(month, day)
             if special_text:
                 special_text = f"  ┌─ {month}月{day}日\n{special_text}\n  └" + "─" * 10
             self._set_special_weather_content(special_text)
@@ -442,7 +702,20 @@ class WeatherApp:
         ttk.Entry(f, textvariable=self.find_weather_ids_var, width=28).grid(row=0, column=1, padx=6, pady=6)
         ttk.Button(f, text="查询", command=self._query_find_weather_id).grid(row=0, column=2, padx=8)
         ttk.Button(f, text="查询并保存", command=self._query_find_weather_id_save).grid(row=0, column=3, padx=4)
-        ttk.Label(f, text="使用方法：输入一个或多个天气 ID（逗号分隔，如 119 或 301,302,303），点击「查询」可查看这些天气在全年中的连续时间段（按 ID 分组、按时间排序）；「查询并保存」将结果保存到已选路径。", font=self.font_small, wraplength=900).grid(row=1, column=0, columnspan=12, sticky="w", padx=6, pady=(8, 0))
+        ttk.Label(f, text="时序模式（如 雨天{2,} > *{0,4} > 301-305 > 晴天）:").grid(row=1, column=0, padx=6, pady=6, sticky="e")
+        self.find_pattern_var = tk.StringVar(value="雨天{2,} > *{0,4} > 301-305 > 晴天")
+        ttk.Entry(f, textvariable=self.find_pattern_var, width=40).grid(row=1, column=1, padx=6, pady=6)
+        ttk.Button(f, text="查找模式", command=self._query_pattern).grid(row=1, column=2, padx=8)
+        ttk.Button(f, text="查找并保存", command=lambda: self._query_pattern(save_to_file=True)).grid(row=1, column=3, padx=4)
+        ttk.Label(f, text="条件查询（如 id in (119..121) and month in 6..8 and hour in 18..23）:").grid(row=2, column=0, padx=6, pady=6, sticky="e")
+        self.find_expr_var = tk.StringVar(value="id in (119..121) and month in 6..8 and hour in 18..23")
+        ttk.Entry(f, textvariable=self.find_expr_var, width=40).grid(row=2, column=1, padx=6, pady=6)
+        ttk.Button(f, text="条件查询", command=self._query_expression).grid(row=2, column=2, padx=8)
+        ttk.Button(f, text="查询并保存", command=lambda: self._query_expression(save_to_file=True)).grid(row=2, column=3, padx=4)
+        self.find_expr_kind = ttk.Combobox(f, values=list(self.EXPRESSION_RESULT_KINDS), width=8, state="readonly")
+        self.find_expr_kind.set("时段")
+        self.find_expr_kind.grid(row=2, column=4, padx=4)
+        ttk.Label(f, text="使用方法：输入一个或多个天气 ID（逗号分隔，如 119 或 301,302,303），点击「查询」可查看这些天气在全年中的连续时间段（按 ID 分组、按时间排序）；「查询并保存」将结果保存到已选路径。时序模式用 > 连接先后出现的天气：每步可写分类名或 ID（前加 ! 表示「不是」），{2,} 表示至少 2 小时、{1,3} 表示 1~3 小时，*{0,4} 表示中间间隔 0~4 小时任意天气；匹配可跨零点。条件查询可组合 id / month / day / hour / cat（分类名）：in、==、!=、<、>=，范围写 6..8，集合写 (119..121, 301)，用 and / or / not 与括号组合；右侧选择输出时段、小时数或日期。", font=self.font_small, wraplength=900).grid(row=3, column=0, columnspan=12, sticky="w", padx=6, pady=(8, 0))
 
     def _add_tab_special(self):
         f = ttk.Frame(self.notebook, padding=12)
@@ -470,139 +743,528 @@ class WeatherApp:
         ttk.Button(f, text="选择路径 B", command=self._on_choose_compare_path_b).grid(row=1, column=1, padx=4, pady=6)
         self.compare_path_b_var = tk.StringVar(value="未选择")
         ttk.Label(f, textvariable=self.compare_path_b_var, font=self.font_small).grid(row=1, column=2, columnspan=2, padx=6, pady=6, sticky="w")
+        if self._branches:
+            self.compare_branch_combo = ttk.Combobox(f, values=list(self._branches), width=12, state="readonly")
+            self.compare_branch_combo.grid(row=1, column=4, padx=4, pady=6)
+            self.compare_branch_combo.bind("<<ComboboxSelected>>", lambda e: self._on_choose_compare_branch(self.compare_branch_combo.get()))
         ttk.Button(f, text="对比", command=self._query_compare).grid(row=2, column=0, columnspan=2, padx=8, pady=8)
         ttk.Button(f, text="对比并保存", command=self._query_compare_save).grid(row=2, column=2, columnspan=2, padx=4, pady=8)
-        ttk.Label(f, text="使用方法：路径 A 为当前已加载的项目根目录，路径 B 需点击「选择路径 B」选择另一项目根目录（与加载时选择方式相同）。点击「对比」可比较两路径下 weather.xlsx 的 weatherType / weatherList 差异；「对比并保存」将报告保存到已选路径。", font=self.font_small, wraplength=900).grid(row=3, column=0, columnspan=4, sticky="w", padx=6, pady=(8, 4))
+        ttk.Label(f, text="历史版本 A / B:").grid(row=3, column=0, padx=6, pady=6, sticky="w")
+        self.history_ref_a_var = tk.StringVar(value="-2")
+        self.history_ref_b_var = tk.StringVar(value="-1")
+        ttk.Entry(f, textvariable=self.history_ref_a_var, width=14).grid(row=3, column=1, padx=4, pady=6, sticky="w")
+        ttk.Entry(f, textvariable=self.history_ref_b_var, width=14).grid(row=3, column=2, padx=4, pady=6, sticky="w")
+        ttk.Button(f, text="对比历史版本", command=self._query_history_diff).grid(row=3, column=3, padx=4, pady=6)
+        ttk.Button(f, text="查看历史", command=self._query_history_log).grid(row=3, column=4, padx=4, pady=6)
+        ttk.Label(f, text="使用方法：路径 A 为当前已加载的项目根目录，路径 B 需点击「选择路径 B」选择另一项目根目录（与加载时选择方式相同），配置了分支时也可在右侧下拉直接选分支（已预加载的分支无需再读取）。点击「对比」可比较两路径下 weather.xlsx 的 weatherType / weatherList 差异；「对比并保存」将报告保存到已选路径。配置了 history_dir 时每次加载会记录版本历史：「查看历史」列出记录，历史版本可填版本号前缀或序号（-1 为最近一次、-2 为上一次），「对比历史版本」直接对比两个历史版本。", font=self.font_small, wraplength=900).grid(row=4, column=0, columnspan=5, sticky="w", padx=6, pady=(8, 4))
+
+    def _submit(self, channel, work, on_done, on_error=None, on_progress=None, on_partial=None, pin=None):
+        """在后台线程池执行 work(task)，结果经队列回到主线程调用 on_done(result)。
+        同一 channel 的旧任务会被取消（协作式），其后续结果与进度一律丢弃。
+        pin 为任务要用的已登记数据：提交时（主线程）即引用，work 结束（完成、出错或因取消退出）后释放"""
+        old = self._current_tasks.get(channel)
+        if old is not None:
+            old.cancelled = True
+        task = _Task(channel, self._task_queue, (on_done, on_error, on_progress, on_partial))
+        self._current_tasks[channel] = task
+        session = self._profile
+        pinned = pin is not None and self._datasets.acquire(pin)
+
+        def run():
+            try:
+                result = session.profile(work, task, blocking=False) if session is not None else work(task)
+            except _TaskCancelled:
+                return
+            except Exception as e:
+                self._task_queue.put(("error", task, e))
+                return
+            finally:
+                if pinned:
+                    self._datasets.release(pin)
+            self._task_queue.put(("done", task, result))
+
+        self._executor.submit(run)
+        return task
+
+    def _cancel_channel(self, channel):
+        task = self._current_tasks.pop(channel, None)
+        if task is not None:
+            task.cancelled = True
+
+    def _poll_tasks(self):
+        """主线程轮询后台结果队列，分发给对应任务的回调；已被取代的任务消息直接丢弃"""
+        for _ in range(self.TASK_POLL_BATCH):
+            try:
+                kind, task, payload = self._task_queue.get_nowait()
+            except queue.Empty:
+                break
+            if task.cancelled or self._current_tasks.get(task.channel) is not task:
+                continue
+            on_done, on_error, on_progress, on_partial = task.handlers
+            try:
+                if kind == "progress":
+                    if on_progress:
+                        on_progress(*payload)
+                elif kind == "partial":
+                    if on_partial:
+                        self._profiled(on_partial, payload)
+                else:
+                    del self._current_tasks[task.channel]
+                    if kind == "done":
+                        self._profiled(on_done, payload)
+                    elif on_error:
+                        on_error(payload)
+                    else:
+                        messagebox.showerror("出错", str(payload))
+            except Exception as e:
+                messagebox.showerror("出错", str(e))
+        self.root.after(self.TASK_POLL_MS, self._poll_tasks)
+
+    def _profiled(self, fn, *args):
+        """性能采样进行中时，结果回调（填充结果区等界面工作）也计入采样；不等待后台任务的 cProfile，以免卡住界面"""
+        if self._profile is None:
+            return fn(*args)
+        return self._profile.profile(fn, *args, blocking=False)
+
+    def _toggle_profile(self):
+        """开始 / 停止性能采样：停止时把 .prof、火焰图用的 .folded（及内存快照）写入保存目录，结果区显示耗时前若干项"""
+        if self._profile is None:
+            if not self._save_folder or not os.path.isdir(self._save_folder):
+                messagebox.showwarning("请选择保存路径", "性能采样结果将写入保存目录，请先点击「选择保存路径」。")
+                return
+            self._profile = ProfileSession(trace_memory=self.profile_memory_var.get())
+            self._profile.start()
+            self.profile_btn_var.set("停止性能采样")
+            self.status_var.set("性能采样中：执行要分析的查询或加载，完成后点击「停止性能采样」")
+            return
+        session, self._profile = self._profile, None
+        self.profile_btn_var.set("开始性能采样")
+        session.stop()
+        try:
+            paths = session.save(self._save_folder)
+        except Exception as e:
+            messagebox.showerror("保存失败", str(e))
+            paths = []
+        head = ["性能采样结果", "=" * 60]
+        head += [f"  已写入: {p}" for p in paths]
+        if any(p.endswith(".folded") for p in paths):
+            head.append("  .folded 可导入 https://www.speedscope.app 或用 flamegraph.pl 生成火焰图；.prof 可用 snakeviz 查看")
+        self.result_title_var.set("性能采样结果")
+        self._set_result("\n".join(head) + "\n\n" + session.summary_text(), file_path=paths[0] if paths else None)
+        self.status_var.set(f"性能采样已停止，共分析 {session.tasks} 个任务")
+
+    def _on_close(self):
+        """关闭窗口：取消所有后台任务后退出"""
+        if self._profile is not None:
+            self._profile.stop()
+            self._profile = None
+        if self._prefetcher is not None:
+            self._prefetcher.stop()
+        if self._watchdog is not None:
+            self._watchdog.stop()
+        for task in list(self._current_tasks.values()):
+            task.cancelled = True
+        self._current_tasks.clear()
+        try:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        except TypeError:  # Python 3.8 无 cancel_futures
+            self._executor.shutdown(wait=False)
+        self.root.destroy()
+
+    def _idle_status(self):
+        return "已加载，可点击日历日期或使用下方功能" if self._data_loaded else "已记住路径"
+
+    def _run_result_query(self, title, work, on_done, error_title="查询失败", on_partial=None):
+        """在「result」通道后台执行查询；新查询会取代尚未完成的旧查询，进度显示在状态栏。
+        on_partial 接收 work 中 task.partial() 送回的部分结果（流式显示）。
+        提交时即引用当前数据快照：其间重新加载切换了数据，该快照也要等查询结束才会被释放"""
+        self.result_title_var.set(f"{title}（查询中…）")
+        snapshot = self._snapshot
+
+        def on_progress(done, total):
+            self.status_var.set(f"正在查询… {done}/{total}")
+
+        def finish(result):
+            self.status_var.set(self._idle_status())
+            self.result_title_var.set(title)
+            on_done(result)
+
+        def on_error(e):
+            self.status_var.set(self._idle_status())
+            self.result_title_var.set(f"{title} — 查询出错")
+            messagebox.showerror(error_title, str(e))
+
+        return self._submit("result", work, finish, on_error=on_error, on_progress=on_progress, on_partial=on_partial,
+                            pin=snapshot.weather if snapshot is not None else None)
+
+    def _run_paged_day_query(self, title, query, on_done, extra=None):
+        """日期范围 / 全部日期查询的流式版：后台逐页（每页 PAGE_DAYS 天）渲染，每页完成即追加到表格，
+        首页不必等全部日期格式化完。on_done((完整文本, 是否有表格行, extra 的结果))，extra(task) 在全部页之后于后台执行"""
+        weather = self.weather
+        shown = [False]
+
+        def work(task):
+            texts = []
+            has_rows = False
+            for page in weather.iter_pages(**query):
+                task.progress(page.done, page.total)
+                texts.append(page.text)
+                if page.table_rows:
+                    has_rows = True
+                    task.partial((page.table_columns, page.table_rows))
+            return "\n".join(texts), has_rows, extra(task) if extra else None
+
+        def on_partial(payload):
+            columns, rows = payload
+            if shown[0]:
+                self._append_result_table(rows)
+            else:
+                shown[0] = True
+                self._set_result_table(columns, rows, text_for_save="")
+
+        return self._run_result_query(title, work, on_done, on_partial=on_partial)
+
+    def _add_tab_stats(self):
+        """出现次数统计：按天气 ID 或按分类统计全年小时数、季节分布、连续时长、首末次出现"""
+        f = ttk.Frame(self.notebook, padding=12)
+        self.notebook.add(f, text="统计")
+        ttk.Button(f, text="按天气 ID 统计", command=lambda: self._query_stats(by_category=False)).grid(row=0, column=0, padx=8, pady=6)
+        ttk.Button(f, text="按分类统计", command=lambda: self._query_stats(by_category=True)).grid(row=0, column=1, padx=8, pady=6)
+        ttk.Button(f, text="统计并保存", command=lambda: self._query_stats(by_category=False, save_to_file=True)).grid(row=0, column=2, padx=8, pady=6)
+        ttk.Button(f, text="天气转移（按 ID）", command=lambda: self._query_transitions(by_category=False)).grid(row=0, column=3, padx=(24, 8), pady=6)
+        ttk.Button(f, text="天气转移（按分类）", command=lambda: self._query_transitions(by_category=True)).grid(row=0, column=4, padx=8, pady=6)
+        ttk.Button(f, text="数据检查", command=self._query_validate).grid(row=0, column=5, padx=(24, 8), pady=6)
+        if self._branches:
+            ttk.Button(f, text="检查全部分支", command=self._query_validate_branches).grid(row=0, column=6, padx=8, pady=6)
+
+        ttk.Label(f, text="先后关系：").grid(row=1, column=0, padx=6, pady=6, sticky="e")
+        self.follow_a_var = tk.StringVar(value="雨天")
+        ttk.Entry(f, textvariable=self.follow_a_var, width=14).grid(row=1, column=1, padx=4, pady=6)
+        ttk.Label(f, text="结束后").grid(row=1, column=2, padx=2)
+        self.follow_within = ttk.Combobox(f, values=list(range(0, 25)), width=5)
+        self.follow_within.set("3")
+        self.follow_within.grid(row=1, column=3, padx=4, pady=6)
+        ttk.Label(f, text="小时内出现").grid(row=1, column=4, padx=2)
+        self.follow_b_var = tk.StringVar(value="彩虹")
+        ttk.Entry(f, textvariable=self.follow_b_var, width=14).grid(row=1, column=5, padx=4, pady=6)
+        ttk.Button(f, text="查询", command=self._query_followed_within).grid(row=1, column=6, padx=8)
+        ttk.Label(f, text="使用方法：点击「按天气 ID 统计」或「按分类统计」，表格显示全年总小时数、四季小时数、连续出现段数与时长、首次/末次出现时间；保存的文本另含按月、按小时分布与时长分布（连续时长跨零点计算）。「天气转移」列出天气变化时从哪种天气变为哪种及次数；「先后关系」的两侧可填分类名（如 雨天）或 ID（如 301-305、119,120），统计前者每段结束后指定小时内出现后者的次数。「数据检查」列出当前数据中的未知天气 ID、缺失 / 重复 / 不存在的日期、空或非数字的小时格与未使用的 ID（附 Excel 行号）；配置了分支时「检查全部分支」逐个检查。", font=self.font_small, wraplength=900).grid(row=2, column=0, columnspan=12, sticky="w", padx=6, pady=(8, 0))
+
+    def _query_stats(self, by_category=False, save_to_file=False):
+        if not self._ensure_loaded():
+            return
+        weather = self.weather
+
+        def work(task):
+            stats = WeatherStats(weather)
+            return stats.table_rows(by_category), stats.format_report(by_category)
+
+        def on_done(result):
+            rows, text = result
+            self._set_result_table(WeatherStats.TABLE_COLUMNS, rows, text_for_save=text)
+            if save_to_file and text:
+                path = self._write_to_save_folder(text, "weather_stats")
+                if path:
+                    self._last_file_path = path
+                    messagebox.showinfo("已保存", f"已保存到:\n{path}")
+
+        self._run_result_query("分类出现统计" if by_category else "天气 ID 出现统计", work, on_done)
+
+    def _query_transitions(self, by_category=False):
+        """天气转移：全年逐小时序列中天气变化的「从 → 到」次数（跨日连续）"""
+        if not self._ensure_loaded():
+            return
+        weather = self.weather
+
+        def work(task):
+            rows = transition_rows(weather, by_category=by_category)
+            text = "\n".join(f"  {a}  →  {b}    {n} 次（{pct}）" for a, b, n, pct in rows)
+            return rows, text
+
+        def on_done(result):
+            rows, text = result
+            if rows:
+                self._set_result_table(TRANSITION_COLUMNS, rows, text_for_save=text)
+            else:
+                self._set_result("无天气变化。")
+
+        self._run_result_query("天气转移（按分类）" if by_category else "天气转移（按 ID）", work, on_done)
+
+    def _query_validate(self):
+        """数据检查：当前数据的检查报告（加载时已算好，这里直接取缓存）"""
+        if not self._ensure_loaded():
+            return
+        weather = self.weather
+        self._run_result_query("数据检查", lambda task: weather.validate().format_text(), self._set_result)
+
+    def _query_validate_branches(self):
+        """检查全部分支：已在内存缓存中的分支直接检查，其余读取后检查（不放入缓存，避免挤掉常用分支）"""
+        datasets = self._datasets
+        store_path = _load_segment_store_path()
+        compiled_dir = _load_compiled_cache_dir()
+
+        def loader(excel_path):
+            w = datasets.get(excel_path)
+            return w if w is not None else _read_weather(excel_path, store_path, compiled_dir)
+
+        names = list(self._branches)
+        self._run_result_query("数据检查（全部分支）", lambda task: format_reports(validate_paths(names, loader)), self._set_result)
+
+    def _query_followed_within(self):
+        """先后关系：A 每段结束后 N 小时内出现 B 的段数"""
+        if not self._ensure_loaded():
+            return
+        sel_a = self.follow_a_var.get().strip()
+        sel_b = self.follow_b_var.get().strip()
+        weather = self.weather
+        try:
+            within = int(self.follow_within.get())
+            ids_a = weather.ids_for(sel_a)
+            ids_b = weather.ids_for(sel_b)
+        except (ValueError, TypeError):
+            messagebox.showwarning("输入错误", "请填写分类名或天气 ID（如 雨天、301-305、119,120），小时数为整数。")
+            return
+        if not ids_a or not ids_b:
+            messagebox.showwarning("输入错误", "前后两项都需要填写。")
+            return
+
+        def work(task):
+            return weather.followed_within(sel_a, sel_b, within)
+
+        def on_done(result):
+            hit, total = result
+            pct = f"{hit * 100.0 / total:.1f}%" if total else "—"
+            self._set_result(
+                f"  {sel_a}（ID：{format_id_ranges(ids_a)}）全年共出现 {total} 段\n"
+                f"  其中结束后 {within} 小时内出现 {sel_b}（ID：{format_id_ranges(ids_b)}）的有 {hit} 段（{pct}）"
+            )
+
+        self._run_result_query(f"先后关系：{sel_a} → {within} 小时内 → {sel_b}", work, on_done)
 
     def _ensure_loaded(self):
-        if not self._data_loaded or self.weather is None:
+        if self._snapshot is None:
             messagebox.showwarning("未加载数据", "请先点击「选择路径」选择项目根目录。")
             return False
         return True
 
     def _load_from_path(self, excel_path):
-        """在后台线程中从 excel_path 加载数据，成功后更新界面"""
+        """在后台线程中从 excel_path 加载数据，成功后在主线程切换到新数据并更新界面。
+        已在数据登记表中（内容未变）时后台只核对文件指纹即返回；指纹（SHA-256）不在主线程计算"""
         self.status_var.set("正在加载…")
-        self.root.update_idletasks()
-
-        def do_load():
-            try:
-                w = Weather(custom_excel_path=excel_path)
-                w.read_file()
-                self.weather = w
-                self._data_loaded = True
-                def _after_load():
-                    self.status_var.set("已加载，可点击日历日期或使用下方功能")
-                    self._refresh_weather_id_meanings()
-                    if hasattr(self, 'compare_path_a_var'):
-                        self.compare_path_a_var.set(self._current_folder or "未加载")
-                self.root.after(0, _after_load)
-            except Exception as e:
-                self.root.after(0, lambda: self._load_error(str(e)))
 
-        threading.Thread(target=do_load, daemon=True).start()
+        store_path = _load_segment_store_path()
+        compiled_dir = _load_compiled_cache_dir()
+        history_dir = _load_history_dir()
+
+        previous = self.weather
+
+        def work(task):
+            # 只构造新数据，不触碰当前快照；查询照常在旧快照上执行，完成后在主线程一次切换。
+            # 重新加载（如文件已修改）时，未改动的天沿用上一份数据已渲染的输出片段（登记前做完）
+            w = self._datasets.load(excel_path, lambda p: _read_weather(p, store_path, compiled_dir, history_dir, previous))
+            task.check()
+            return w
+
+        self._submit("load", work, self._apply_loaded, on_error=lambda e: self._load_error(str(e)))
+
+    def _apply_loaded(self, w):
+        """切换到已加载的数据并更新界面：构造新快照后一次赋值替换（主线程）。
+        当前快照的数据在登记表中保持引用，不会被预加载等挤出；旧快照的引用随之释放"""
+        previous = self._snapshot
+        if previous is None or w is not previous.weather:
+            # 加载完成到切换之间可能已被预加载等挤出登记表：acquire() 会重新登记，仍失败时报错而不是切换到未引用的数据
+            if not self._datasets.acquire(w):
+                raise RuntimeError(f"数据登记失败，请重新加载：{w.path}")
+            self._snapshot = DatasetSnapshot(w)
+            if previous is not None:
+                self._datasets.release(previous.weather)
+        report = w._validation
+        if report is not None and any(i.level != NOTICE for i in report.issues):
+            self.status_var.set(f"已加载，数据检查：{report.summary()}（「统计」页点「数据检查」查看）")
+        else:
+            self.status_var.set("已加载，可点击日历日期或使用下方功能")
+        self._refresh_weather_id_meanings()
+        if hasattr(self, 'compare_path_a_var'):
+            self.compare_path_a_var.set(self._current_folder or "未加载")
 
     def _auto_load(self):
         """启动时若有已保存路径且文件存在，自动加载"""
         if not self._current_folder or not os.path.isdir(self._current_folder):
             return
-        excel_path = os.path.join(self._current_folder, EXCEL_REL_PATH)
+        excel_path = resolve_excel_path(self._current_folder)
         if os.path.isfile(excel_path):
             self._load_from_path(excel_path)
 
-    def _check_update(self):
-        """检查 GitHub 最新发布版本，支持自动更新或打开发布页。"""
+    def _start_prefetch(self):
+        """后台低优先级预加载注册表中的全部分支（单独一个线程，前台有任务时暂停），不占用查询线程池"""
+        store_path = _load_segment_store_path()
+        compiled_dir = _load_compiled_cache_dir()
+        history_dir = _load_history_dir()
+        self._prefetcher = BranchPrefetcher(
+            self._datasets,
+            lambda p: _read_weather(p, store_path, compiled_dir, history_dir),
+            self._branches,
+            busy=lambda: bool(self._current_tasks),
+        )
+        self._prefetcher.start()
+
+    def _on_choose_branch(self, name):
+        """顶部分支下拉：切换到该分支（已预加载时无需重新读取）"""
+        folder = self._branches.get(name)
+        if not folder:
+            return
+        excel_path = resolve_excel_path(folder)
+        if not os.path.isfile(excel_path):
+            messagebox.showwarning("路径无效", f"分支 {name} 下未找到 weather.xlsx：\n{excel_path}\n\n请检查配置文件中 branches 的路径。")
+            return
+        self._current_folder = folder
+        _save_folder(folder)
+        self.path_var.set(f"{name}：{folder}")
+        if hasattr(self, 'compare_path_a_var'):
+            self.compare_path_a_var.set(folder)
+        self._load_from_path(excel_path)
+
+    def _check_update(self, quiet=False):
+        """检查 GitHub 最新发布版本，支持自动更新或打开发布页。
+        结果与 ETag 缓存在配置中：手动检查总是发条件请求（未变化时只返回 304）；
+        quiet 为启动后的后台检查，缓存未过期时不发请求，有新版本时只在按钮与状态栏提示，出错不打扰。
+        检查走「update_check」通道，不会取消「update」通道上正在进行的下载；下载期间不再检查"""
         if "YOUR_USERNAME" in GITHUB_REPO or "/" not in GITHUB_REPO:
-            messagebox.showinfo("检查更新", "请先在代码中配置 GITHUB_REPO 为你的 用户名/仓库名。")
+            if not quiet:
+                messagebox.showinfo("检查更新", "请先在代码中配置 GITHUB_REPO 为你的 用户名/仓库名。")
             return
-        self.status_var.set("正在检查更新…")
-        def do_check():
-            try:
-                url = "https://api.github.com/repos/%s/releases/latest" % GITHUB_REPO.strip()
-                req = urllib.request.Request(url, headers={"Accept": "application/vnd.github.v3+json"})
-                with urllib.request.urlopen(req, timeout=10) as resp:
-                    data = json.loads(resp.read().decode())
-                tag = (data.get("tag_name") or "").strip().lstrip("v")
-                html_url = data.get("html_url") or ("https://github.com/%s/releases" % GITHUB_REPO)
-                assets = data.get("assets") or []
-                download_url = None
-                for a in assets:
-                    u = (a.get("browser_download_url") or "").strip()
-                    if u and u.endswith(".zip"):
-                        download_url = u
-                        break
-                def on_done():
-                    self.status_var.set("已加载，可点击日历日期或使用下方功能" if self._data_loaded else "已记住路径")
-                    if not tag:
-                        messagebox.showinfo("检查更新", "无法获取最新版本号。")
-                        return
-                    if self._version_less(__version__, tag):
-                        msg = "当前版本：%s\n最新版本：%s\n\n是否自动更新？程序将下载并替换后重启。\n选「否」则仅打开发布页。" % (__version__, tag)
-                        if messagebox.askyesno("发现新版本", msg):
-                            if download_url:
-                                self._do_auto_update(download_url, tag)
-                            else:
-                                messagebox.showwarning("自动更新", "未找到可下载的 zip，请从发布页手动下载。")
-                                webbrowser.open(html_url)
-                        else:
-                            webbrowser.open(html_url)
+        if "update" in self._current_tasks:
+            if not quiet:
+                messagebox.showinfo("检查更新", "正在下载新版本，请等待下载完成。")
+            return
+        if quiet and "update_check" in self._current_tasks:
+            return
+        if not quiet:
+            self.status_var.set("正在检查更新…")
+        cache, ttl = _load_update_check()
+        url = "https://api.github.com/repos/%s/releases/latest" % GITHUB_REPO.strip()
+
+        def work(task):
+            return check_release(url, cache, ttl=ttl, force=not quiet)
+
+        def on_done(result):
+            data, new_cache, requested = result
+            if requested:
+                _save_update_check(new_cache)
+            tag = (data.get("tag_name") or "").strip().lstrip("v")
+            if quiet:
+                if tag and self._version_less(__version__, tag):
+                    self.update_btn_var.set("有新版本 v%s" % tag)
+                    if not self._current_tasks:  # 不覆盖加载、查询中的进度提示
+                        self.status_var.set("发现新版本 v%s，点击右侧按钮更新" % tag)
+                return
+            self.status_var.set(self._idle_status())
+            html_url = data.get("html_url") or ("https://github.com/%s/releases" % GITHUB_REPO)
+            assets = data.get("assets") or []
+            download_url = None
+            manifest_url = None
+            for a in assets:
+                u = (a.get("browser_download_url") or "").strip()
+                if u and u.endswith(".zip") and not download_url:
+                    download_url = u
+                elif u and a.get("name") == MANIFEST_NAME:
+                    manifest_url = u
+            if not tag:
+                messagebox.showinfo("检查更新", "无法获取最新版本号。")
+                return
+            if self._version_less(__version__, tag):
+                msg = "当前版本：%s\n最新版本：%s\n\n是否自动更新？程序将下载并替换后重启。\n选「否」则仅打开发布页。" % (__version__, tag)
+                if messagebox.askyesno("发现新版本", msg):
+                    if download_url:
+                        self._do_auto_update(download_url, tag, manifest_url)
                     else:
-                        messagebox.showinfo("检查更新", "当前已是最新版本（v%s）。" % __version__)
-                self.root.after(0, on_done)
-            except Exception as e:
-                def on_fail():
-                    self.status_var.set("已加载，可点击日历日期或使用下方功能" if self._data_loaded else "已记住路径")
-                    messagebox.showerror("检查更新失败", str(e))
-                self.root.after(0, on_fail)
-        threading.Thread(target=do_check, daemon=True).start()
-
-    def _do_auto_update(self, download_url, tag):
-        """后台下载 zip，写 updater 脚本，运行后退出；脚本会解压覆盖并重启。"""
+                        messagebox.showwarning("自动更新", "未找到可下载的 zip，请从发布页手动下载。")
+                        webbrowser.open(html_url)
+                else:
+                    webbrowser.open(html_url)
+            else:
+                messagebox.showinfo("检查更新", "当前已是最新版本（v%s）。" % __version__)
+
+        def on_fail(e):
+            if quiet:
+                return
+            self.status_var.set(self._idle_status())
+            messagebox.showerror("检查更新失败", str(e))
+
+        self._submit("update_check", work, on_done, on_error=on_fail)
+
+    def _do_auto_update(self, download_url, tag, manifest_url=None):
+        """后台下载新版本，写 updater 脚本，运行后退出；脚本会覆盖并重启。
+        发布附带清单时按清单校验 SHA-256，并在可按文件下载（base_url）且改动量小于 zip 时只下载改动的文件；
+        下载中断后再次更新会从已下载处续传。"""
         self.status_var.set("正在下载新版本…")
-        def work():
-            try:
-                self.root.after(0, lambda: self.status_var.set("正在下载新版本…"))
-                zip_path = os.path.join(tempfile.gettempdir(), "WeatherQuery-%s.zip" % tag)
-                req = urllib.request.Request(download_url, headers={"Accept": "application/octet-stream"})
-                with urllib.request.urlopen(req, timeout=60) as resp:
-                    with open(zip_path, "wb") as f:
-                        while True:
-                            chunk = resp.read(65536)
-                            if not chunk:
-                                break
-                            f.write(chunk)
-                install_dir = _app_dir()
-                bat = self._write_updater_bat(zip_path, install_dir)
-                if not bat:
-                    self.root.after(0, lambda: messagebox.showerror("自动更新", "无法创建更新脚本。"))
-                    return
-                CREATE_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0x08000000)
-                subprocess.Popen(
-                    ["cmd", "/c", bat, zip_path, install_dir],
-                    creationflags=CREATE_NO_WINDOW,
-                    shell=False,
-                )
-                self.root.after(0, lambda: (messagebox.showinfo("自动更新", "程序即将退出并完成更新，请稍候重新打开。"), sys.exit(0)))
-            except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("自动更新失败", str(e)))
-        threading.Thread(target=work, daemon=True).start()
+        base_url = _load_update_base_url()
+
+        def work(task):
+            install_dir = _app_dir()
+            manifest = fetch_manifest(manifest_url) if manifest_url else None
+            if manifest and manifest.get("version") and manifest["version"].lstrip("v") != tag:
+                manifest = None  # 清单与发布版本不符时不使用
+            zip_info = (manifest or {}).get("zip") or {}
+            if zip_info.get("name") != download_url.rsplit("/", 1)[-1]:
+                zip_info = {}
+            if manifest and (base_url or manifest.get("base_url")):
+                changed = plan_delta(manifest, install_dir)
+                if not zip_info.get("size") or delta_bytes(changed) < zip_info["size"]:
+                    stage_dir = os.path.join(tempfile.gettempdir(), "WeatherQuery-%s-files" % tag)
+                    stage_delta(manifest, changed, stage_dir, base_url=base_url, progress=task.progress, check=task.check)
+                    return stage_dir, install_dir, self._write_updater_bat(stage_dir, install_dir)
+            zip_path = os.path.join(tempfile.gettempdir(), "WeatherQuery-%s.zip" % tag)
+            download(download_url, zip_path, size=zip_info.get("size"), sha256=zip_info.get("sha256"),
+                     progress=task.progress, check=task.check)
+            return zip_path, install_dir, self._write_updater_bat(zip_path, install_dir)
+
+        def on_progress(done, total):
+            percent = done * 100 // total if total else 0
+            self.status_var.set("正在下载新版本… %d%%（%.1f / %.1f MB）" % (percent, done / 1048576, total / 1048576))
+
+        def on_done(result):
+            zip_path, install_dir, bat = result
+            if not bat:
+                messagebox.showerror("自动更新", "无法创建更新脚本。")
+                return
+            CREATE_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0x08000000)
+            subprocess.Popen(
+                ["cmd", "/c", bat, zip_path, install_dir],
+                creationflags=CREATE_NO_WINDOW,
+                shell=False,
+            )
+            messagebox.showinfo("自动更新", "程序即将退出并完成更新，请稍候重新打开。")
+            sys.exit(0)
+
+        def on_fail(e):
+            self.status_var.set(self._idle_status())
+            messagebox.showerror("自动更新失败", "%s\n\n已下载的部分会保留，再次更新时从中断处继续。" % e)
+
+        self._submit("update", work, on_done, on_error=on_fail, on_progress=on_progress)
 
     @staticmethod
-    def _write_updater_bat(zip_path, install_dir):
-        """写入用于解压覆盖并重启的 bat 到临时目录，返回 bat 路径。"""
+    def _write_updater_bat(source, install_dir):
+        """写入用于覆盖并重启的 bat 到临时目录，返回 bat 路径。source 为整包 zip（解压后覆盖）或增量文件暂存目录（直接覆盖）。"""
         content = r"""@echo off
-set "ZIP_PATH=%~1"
+set "SOURCE=%~1"
 set "INSTALL_DIR=%~2"
-if not defined ZIP_PATH exit /b 1
+if not defined SOURCE exit /b 1
 if not defined INSTALL_DIR exit /b 1
 timeout /t 2 /nobreak >nul
+if /I "%~x1"==".zip" goto unzip
+xcopy /E /Y /H "%SOURCE%\*" "%INSTALL_DIR%\" >nul 2>&1
+start "" "%INSTALL_DIR%\WeatherQuery.exe"
+rd /s /q "%SOURCE%" 2>nul
+exit /b 0
+:unzip
 set "TEMP_EXTRACT=%TEMP%\WeatherQuery_update%RANDOM%"
 mkdir "%TEMP_EXTRACT%" 2>nul
-powershell -NoProfile -ExecutionPolicy Bypass -Command "Expand-Archive -LiteralPath '%ZIP_PATH%' -DestinationPath '%TEMP_EXTRACT%' -Force"
+powershell -NoProfile -ExecutionPolicy Bypass -Command "Expand-Archive -LiteralPath '%SOURCE%' -DestinationPath '%TEMP_EXTRACT%' -Force"
 xcopy /E /Y /H "%TEMP_EXTRACT%\WeatherQuery\*" "%INSTALL_DIR%\" >nul 2>&1
 start "" "%INSTALL_DIR%\WeatherQuery.exe"
 rd /s /q "%TEMP_EXTRACT%" 2>nul
-del "%ZIP_PATH%" 2>nul
+del "%SOURCE%" 2>nul
 """
         try:
             fd, path = tempfile.mkstemp(suffix=".bat", prefix="WeatherQuery_updater_", text=True)
@@ -640,7 +1302,9 @@ del "%ZIP_PATH%" 2>nul
         self._load_from_path(excel_path)
 
     def _load_error(self, msg):
-        self._data_loaded = False
+        previous, self._snapshot = self._snapshot, None
+        if previous is not None:
+            self._datasets.release(previous.weather)
         self.status_var.set("加载失败")
         messagebox.showerror("加载失败", f"无法读取 weather.xlsx，请检查路径与文件是否存在。\n\n{msg}")
 
@@ -648,9 +1312,10 @@ del "%ZIP_PATH%" 2>nul
         """未选日期时右侧「本日特殊天气」占位"""
         self.special_weather_text.config(state="normal")
         self.special_weather_text.delete("1.0", tk.END)
+        special_ids = format_id_ranges(parse_id_spec(WEATHER_CATEGORIES.get(SPECIAL_CATEGORY, [])))
         self.special_weather_text.insert(
             tk.END,
-            "选择日历日期后，此处显示该日的特殊天气（ID：104、106、107-121、211-213、301-305）。",
+            f"选择日历日期后，此处显示该日的特殊天气（ID：{special_ids}）。",
         )
         self.special_weather_text.config(state="disabled")
 
@@ -665,6 +1330,7 @@ del "%ZIP_PATH%" 2>nul
         """纯文本结果：显示在 ScrolledText，隐藏表格。"""
         self._last_text = text or ""
         self._last_file_path = file_path
+        self._table_fill_seq += 1
         self._result_tree_container.grid_remove()
         self.result_text.grid()
         self.result_text.delete("1.0", tk.END)
@@ -678,6 +1344,20 @@ del "%ZIP_PATH%" 2>nul
             "时间段": (80, 1),
             "天气": (70, 1),
             "ID": (48, 1),
+            "总小时": (56, 1),
+            "春": (40, 1),
+            "夏": (40, 1),
+            "秋": (40, 1),
+            "冬": (40, 1),
+            "段数": (44, 1),
+            "平均时长": (64, 1),
+            "最长": (44, 1),
+            "首次": (104, 1),
+            "末次": (104, 1),
+            "从": (160, 1),
+            "到": (160, 1),
+            "次数": (56, 1),
+            "占比": (56, 1),
         }
         return layout.get(col_name, (80, 1))
 
@@ -707,19 +1387,49 @@ del "%ZIP_PATH%" 2>nul
         self._last_file_path = file_path
         self.result_text.grid_remove()
         self._result_tree_container.grid()
-        for iid in self.result_tree.get_children(""):
-            self.result_tree.delete(iid)
+        self.result_tree.delete(*self.result_tree.get_children(""))
         self.result_tree["columns"] = columns
         for c in columns:
             self.result_tree.heading(c, text=c)
             minw, _ = self._result_tree_column_layout(c)
             self.result_tree.column(c, width=minw, minwidth=minw)
-        for row in rows:
-            self.result_tree.insert("", tk.END, values=tuple(row))
+        # 先插入第一批行立即显示，其余分批在后续事件循环中追加；新结果到来时旧的追加自动停止
+        self._table_fill_seq += 1
+        self._table_pending = deque()
+        self._table_draining = False
+        self._append_result_table(rows)
         self.root.update_idletasks()
         self._on_result_tree_configure(None)
         self._set_special_weather_placeholder()
 
+    def _append_result_table(self, rows):
+        """流式结果：在当前表格末尾追加一批行（与 _set_result_table 同一批次，新结果到来时同样停止）。
+        排在此前尚未插完的行之后，保证按到达顺序显示"""
+        if len(rows):
+            self._table_pending.append((rows, 0))
+        if not self._table_draining:
+            self._fill_result_table(self._table_fill_seq)
+
+    def _fill_result_table(self, seq):
+        """按顺序插入排队的行，每次最多 TABLE_CHUNK_ROWS 行，其余在后续事件循环中继续"""
+        if seq != self._table_fill_seq:
+            return
+        pending = self._table_pending
+        budget = self.TABLE_CHUNK_ROWS
+        while pending and budget:
+            rows, start = pending[0]
+            end = min(start + budget, len(rows))
+            for i in range(start, end):
+                self.result_tree.insert("", tk.END, values=tuple(rows[i]))
+            budget -= end - start
+            if end < len(rows):
+                pending[0] = (rows, end)
+            else:
+                pending.popleft()
+        self._table_draining = bool(pending)
+        if pending:
+            self.root.after(1, self._fill_result_table, seq)
+
     def _on_choose_save_path(self):
         """选择保存文件时的目标目录，并记住"""
         initial = self._save_folder if self._save_folder and os.path.isdir(self._save_folder) else None
@@ -730,13 +1440,13 @@ del "%ZIP_PATH%" 2>nul
         _save_save_folder(folder)
         self.save_path_var.set(folder)
 
-    def _write_to_save_folder(self, content, filename_prefix="weather"):
-        """将 content 写入已选择的保存目录，文件名 prefix_时间戳.txt。未选择保存路径时提示并返回 None。"""
+    def _write_to_save_folder(self, content, filename_prefix="weather", ext="txt", timestamp=None):
+        """将 content 写入已选择的保存目录，文件名 prefix_时间戳.ext。未选择保存路径时提示并返回 None。"""
         if not self._save_folder or not os.path.isdir(self._save_folder):
             messagebox.showwarning("请选择保存路径", "请先点击「选择保存路径」选择保存文件的目录。")
             return None
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{filename_prefix}_{timestamp}.txt"
+        timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"{filename_prefix}_{timestamp}.{ext}"
         path = os.path.join(self._save_folder, filename)
         try:
             with open(path, "w", encoding="utf-8") as f:
@@ -787,55 +1497,51 @@ del "%ZIP_PATH%" 2>nul
         except (ValueError, TypeError):
             messagebox.showwarning("输入错误", "请填写有效的开始/结束月、日。")
             return
-        try:
-            _, text, _, cols, rows = self.weather.get_weather_list_by_day(
-                start_month=sm, start_day=sd, end_month=em, end_day=ed, save_to_file=False
-            )
-            self.result_title_var.set(f"日期范围 {sm}月{sd}日～{em}月{ed}日")
-            if cols and rows:
-                self._set_result_table(cols, rows, text_for_save=text or "")
+        weather = self.weather
+
+        def special(task):
+            return weather.get_special_weather_for_range(sm, sd, em, ed, progress=task.progress)
+
+        def on_done(result):
+            text, has_rows, special_text = result
+            if has_rows:
+                # 表格已随各页流式填好，这里只补上保存用的完整文本
+                self._last_text = text or ""
             else:
                 self._set_result(text or "范围内无数据。")
-            special_text = self.weather.get_special_weather_for_range(sm, sd, em, ed)
             self._set_special_weather_content(special_text)
             if save_to_file and text:
                 path = self._write_to_save_folder(text, "weather_range")
                 if path:
                     self._last_file_path = path
                     messagebox.showinfo("已保存", f"已保存到:\n{path}")
-        except Exception as e:
-            messagebox.showerror("查询失败", str(e))
+
+        query = dict(start_month=sm, start_day=sd, end_month=em, end_day=ed)
+        self._run_paged_day_query(f"日期范围 {sm}月{sd}日～{em}月{ed}日", query, on_done, extra=special)
 
     def _query_all(self):
-        if not self._ensure_loaded():
-            return
-        try:
-            _, text, _, cols, rows = self.weather.get_weather_list_by_day(show_all=True)
-            self.result_title_var.set("全部日期天气")
-            if cols and rows:
-                self._set_result_table(cols, rows, text_for_save=text or "")
-            else:
-                self._set_result(text or "无数据。")
-        except Exception as e:
-            messagebox.showerror("查询失败", str(e))
+        self._query_all_impl(save_to_file=False)
 
     def _query_all_save(self):
+        self._query_all_impl(save_to_file=True)
+
+    def _query_all_impl(self, save_to_file=False):
         if not self._ensure_loaded():
             return
-        try:
-            _, text, _, cols, rows = self.weather.get_weather_list_by_day(show_all=True, save_to_file=False)
-            self.result_title_var.set("全部日期天气")
-            if cols and rows:
-                self._set_result_table(cols, rows, text_for_save=text or "")
+
+        def on_done(result):
+            text, has_rows, _ = result
+            if has_rows:
+                self._last_text = text or ""
             else:
                 self._set_result(text or "无数据。")
-            if text:
+            if save_to_file and text:
                 path = self._write_to_save_folder(text, "weather_all")
                 if path:
                     self._last_file_path = path
                     messagebox.showinfo("已保存", f"已保存到:\n{path}")
-        except Exception as e:
-            messagebox.showerror("查询失败", str(e))
+
+        self._run_paged_day_query("全部日期天气", dict(show_all=True), on_done)
 
     def _query_find_weather_id(self):
         self._query_find_weather_id_impl(save_to_file=False)
@@ -859,21 +1565,84 @@ del "%ZIP_PATH%" 2>nul
         if not ids:
             messagebox.showwarning("输入错误", "至少填写一个天气 ID。")
             return
-        try:
-            _, text, _, cols, rows = self.weather.find_weather_ids_time_ranges(weather_ids=ids, save_to_file=False)
-            title = f"天气 ID {ids} 时间段" if len(ids) > 1 else f"天气 ID {ids[0]} 时间段"
-            self.result_title_var.set(title)
+        title = f"天气 ID {ids} 时间段" if len(ids) > 1 else f"天气 ID {ids[0]} 时间段"
+        self._run_id_ranges_query(title, ids, save_to_file, "weather_ids")
+
+    def _run_id_ranges_query(self, title, ids, save_to_file, filename_prefix):
+        """后台查询多个天气 ID 的时间段并展示（查找天气ID、特殊天气两个选项卡共用）"""
+        weather = self.weather
+
+        def work(task):
+            _, text, _, cols, rows = weather.find_weather_ids_time_ranges(
+                weather_ids=ids, save_to_file=False, progress=task.progress
+            )
+            return text, cols, rows
+
+        def on_done(result):
+            text, cols, rows = result
             if cols and rows:
                 self._set_result_table(cols, rows, text_for_save=text)
             else:
                 self._set_result(text)
             if save_to_file and text:
-                path = self._write_to_save_folder(text, "weather_ids")
+                path = self._write_to_save_folder(text, filename_prefix)
                 if path:
                     self._last_file_path = path
                     messagebox.showinfo("已保存", f"已保存到:\n{path}")
-        except Exception as e:
-            messagebox.showerror("查询失败", str(e))
+
+        self._run_result_query(title, work, on_done)
+
+    def _query_pattern(self, save_to_file=False):
+        """时序模式查找：在全年逐小时序列中查找先后出现的天气组合"""
+        if not self._ensure_loaded():
+            return
+        pattern = self.find_pattern_var.get().strip()
+        if not pattern:
+            messagebox.showwarning("输入错误", "请填写时序模式，如 雨天{2,} > *{0,4} > 301-305 > 晴天")
+            return
+        weather = self.weather
+
+        def work(task):
+            return weather.find_pattern(pattern)
+
+        def on_done(result):
+            matches, text = result
+            self._set_result(text)
+            if save_to_file and matches:
+                path = self._write_to_save_folder(text, "weather_pattern")
+                if path:
+                    self._last_file_path = path
+                    messagebox.showinfo("已保存", f"已保存到:\n{path}")
+
+        self._run_result_query(f"时序模式「{pattern}」", work, on_done)
+
+    def _query_expression(self, save_to_file=False):
+        """条件查询：把 id / month / day / hour / cat 组合条件编译为逐小时掩码，输出时段、小时数或日期"""
+        if not self._ensure_loaded():
+            return
+        expression = self.find_expr_var.get().strip()
+        if not expression:
+            messagebox.showwarning("输入错误", "请填写查询条件，如 id in (119..121) and month in 6..8 and hour in 18..23")
+            return
+        kind = self.EXPRESSION_RESULT_KINDS.get(self.find_expr_kind.get(), "segments")
+        weather = self.weather
+
+        def work(task):
+            return compile_query(expression).format_result(weather, kind)
+
+        def on_done(result):
+            text, cols, rows = result
+            if cols and rows:
+                self._set_result_table(cols, rows, text_for_save=text)
+            else:
+                self._set_result(text)
+            if save_to_file and rows:
+                path = self._write_to_save_folder(text, "weather_query")
+                if path:
+                    self._last_file_path = path
+                    messagebox.showinfo("已保存", f"已保存到:\n{path}")
+
+        self._run_result_query(f"条件「{expression}」", work, on_done)
 
     def _query_special(self):
         self._query_special_impl(save_to_file=False)
@@ -897,20 +1666,7 @@ del "%ZIP_PATH%" 2>nul
         if not ids:
             messagebox.showwarning("请选择属性", "请至少勾选一个天气属性后再查询。")
             return
-        try:
-            _, text, _, cols, rows = self.weather.find_weather_ids_time_ranges(weather_ids=ids, save_to_file=False)
-            self.result_title_var.set(f"特殊天气（{'、'.join(selected)}）时间段")
-            if cols and rows:
-                self._set_result_table(cols, rows, text_for_save=text)
-            else:
-                self._set_result(text)
-            if save_to_file and text:
-                path = self._write_to_save_folder(text, "weather_special")
-                if path:
-                    self._last_file_path = path
-                    messagebox.showinfo("已保存", f"已保存到:\n{path}")
-        except Exception as e:
-            messagebox.showerror("查询失败", str(e))
+        self._run_id_ranges_query(f"特殊天气（{'、'.join(selected)}）时间段", ids, save_to_file, "weather_special")
 
     def _on_choose_compare_path_b(self):
         """选择路径 B（同加载时的选择方式：选项目根目录，程序校验 weather.xlsx 是否存在）"""
@@ -928,6 +1684,18 @@ del "%ZIP_PATH%" 2>nul
         self._compare_path_b = folder
         self.compare_path_b_var.set(folder)
 
+    def _on_choose_compare_branch(self, name):
+        """分支对比：下拉选择分支作为路径 B"""
+        folder = self._branches.get(name)
+        if not folder:
+            return
+        excel_path = resolve_excel_path(folder)
+        if not os.path.isfile(excel_path):
+            messagebox.showwarning("路径无效", f"分支 {name} 下未找到 weather.xlsx：\n{excel_path}\n\n请检查配置文件中 branches 的路径。")
+            return
+        self._compare_path_b = folder
+        self.compare_path_b_var.set(f"{name}：{folder}")
+
     def _query_compare(self):
         """分支对比：仅对比并显示结果"""
         self._query_compare_impl(save_to_file=False)
@@ -949,32 +1717,75 @@ del "%ZIP_PATH%" 2>nul
             messagebox.showwarning("分支对比", "路径 A 与路径 B 不能相同。")
             return
 
-        self.result_title_var.set("分支对比（对比中…）")
         self._set_result("正在读取两路径的 weather.xlsx，请稍候…")
 
-        def do_compare():
-            try:
-                diff_dict, report, _ = Weather.compare_two_paths(
-                    path_a, path_b,
-                    label_a=path_a,
-                    label_b=path_b,
-                    save_to_file=False
-                )
-                def _after():
-                    self.result_title_var.set("分支对比 路径 A vs 路径 B")
-                    self._set_result(report)
-                    if save_to_file and report:
-                        path = self._write_to_save_folder(report, "weather_compare")
-                        if path:
-                            self._last_file_path = path
-                            messagebox.showinfo("已保存", f"对比结果已保存到:\n{path}")
-                self.root.after(0, _after)
-            except FileNotFoundError as e:
-                self.root.after(0, lambda: messagebox.showerror("分支对比", str(e)))
-            except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("分支对比", str(e)))
+        datasets = self._datasets
+        store_path = _load_segment_store_path()
+        compiled_dir = _load_compiled_cache_dir()
+
+        def _dataset(path, label):
+            # 已加载 / 预加载的数据直接取用，否则读取后放入缓存供下次对比
+            excel_path = resolve_excel_path(path)
+            if not os.path.isfile(excel_path):
+                raise FileNotFoundError(f"{label} 对应的 weather.xlsx 不存在: {excel_path}")
+            return datasets.load(excel_path, lambda p: _read_weather(p, store_path, compiled_dir))
+
+        def work(task):
+            wa = _dataset(path_a, "路径 A")
+            task.check()
+            wb = _dataset(path_b, "路径 B")
+            task.check()
+            diff_dict, report, _ = Weather.compare_weathers(wa, wb, label_a=path_a, label_b=path_b)
+            if save_to_file:
+                return report, Weather.diff_to_json(diff_dict), Weather.diff_to_csv(diff_dict)
+            return report, None, None
+
+        def on_done(result):
+            report, diff_json, diff_csv = result
+            self._set_result(report)
+            if save_to_file and report:
+                # 报告 txt 之外同时保存结构化的 JSON / CSV（同一时间戳）
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                path = self._write_to_save_folder(report, "weather_compare", timestamp=timestamp)
+                if path:
+                    self._write_to_save_folder(diff_json, "weather_compare", ext="json", timestamp=timestamp)
+                    self._write_to_save_folder(diff_csv, "weather_compare", ext="csv", timestamp=timestamp)
+                    self._last_file_path = path
+                    messagebox.showinfo("已保存", f"对比结果已保存到:\n{path}\n（同名 .json / .csv 为结构化差异）")
+
+        self._run_result_query("分支对比 路径 A vs 路径 B", work, on_done, error_title="分支对比")
+
+    def _history_or_warn(self):
+        history_dir = _load_history_dir()
+        if not history_dir:
+            messagebox.showwarning("版本历史", "未启用版本历史。请在配置文件中加入 \"history_dir\"（如 \"weather_history\"），之后每次加载会自动记录。")
+            return None
+        return WeatherHistory(history_dir)
+
+    def _query_history_log(self):
+        """列出版本历史记录"""
+        history = self._history_or_warn()
+        if history is None:
+            return
+        self._run_result_query("版本历史", lambda task: format_entries(history.entries()), self._set_result,
+                               error_title="版本历史")
+
+    def _query_history_diff(self):
+        """对比两个历史版本（不读取 Excel），报告格式同分支对比"""
+        history = self._history_or_warn()
+        if history is None:
+            return
+        ref_a = self.history_ref_a_var.get().strip()
+        ref_b = self.history_ref_b_var.get().strip()
+        if not ref_a or not ref_b:
+            messagebox.showwarning("输入错误", "请填写两个历史版本（版本号前缀或序号，如 -2 与 -1）。")
+            return
+
+        def work(task):
+            _, report = history.diff(ref_a, ref_b)
+            return report
 
-        threading.Thread(target=do_compare, daemon=True).start()
+        self._run_result_query(f"历史版本对比 {ref_a} vs {ref_b}", work, self._set_result, error_title="版本历史")
 
 
 def main():
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+编译后的天气数据文件（.wqbin）：固定布局的二进制格式，用 mmap 打开，
+同一台机器上的多个进程（界面、脚本、对比任务）打开同一文件时共享同一份物理内存页，打开几乎不耗时。
+
+布局（小端）：
+  - 文件头（HEADER_SIZE 字节）：魔数、格式版本、源文件内容指纹（SHA-256）、行数、段数，
+    以及段表（每段：名称、类型、列数、偏移、长度）
+  - months      int16[行数]          weatherList 每行的月
+  - days        int16[行数]          weatherList 每行的日
+  - hours       int32[行数 × 24]     小时天气 ID（空 / 非数字单元格为 -1）
+  - id_bits     int64[最大 ID + 2]   写入时分类表下每个 ID 的分类位掩码
+  - hour_bits   int64[行数 × 24]     小时分类位掩码（id_bits[hours]），打开时分类表相同才直接使用
+  - doy、order、loose_rows、row_of_doy、year_ids、seg_start、seg_end、seg_id
+                                     由月、日、小时 ID 算出的日期索引与全年时段模型（见 weather._WeatherData）
+  - meta        UTF-8 JSON           {ID: 显示名} 及读取源文件时记录的非数字 / 非整数单元格（数据检查用）
+  - weatherType、weatherList  UTF-8 JSON   两张原始表，首次访问 df_weather_type / df_weather_list 时才切出并解析
+数组段均以共享的只读视图映射，不在进程内复制。各段按 64 字节对齐。
+源文件内容变化后文件头中的指纹不再匹配，open_compiled 返回 None，需重新编译。
+
+命令行：
+  python weather_binary.py 缓存目录 路径 [路径 ...]   路径为 weather.xlsx 或项目根目录；已是最新的跳过
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+
+import numpy as np
+
+from weather import Weather, _WeatherData, frame_from_json, frame_to_json, normalize_path, resolve_excel_path
+from weather_registry import REGISTRY
+
+MAGIC = b"WQBIN\x00\x00\x00"
+FORMAT_VERSION = 2
+HEADER_SIZE = 1024
+# 魔数、格式版本、指纹、行数、段数
+_HEADER = struct.Struct("<8sI64sII")
+# 段表项：名称、类型（numpy dtype 串，JSON 段为 "json"）、列数（0 为一维）、偏移、字节长度
+_SECTION = struct.Struct("<16s4sIQQ")
+_ALIGN = 64
+_JSON = "json"
+
+
+def _aligned(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def cache_path_for(cache_dir, excel_path):
+    """某个 weather.xlsx 在缓存目录中对应的编译文件路径（按规范化路径取哈希命名）"""
+    key = hashlib.sha1(normalize_path(excel_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"weather_{key}.wqbin")
+
+
+def write_compiled(weather, out_path, fingerprint=None):
+    """把已加载的 Weather 写成编译文件（先写临时文件再替换，读者不会看到写了一半的文件）。
+    fingerprint 默认取 weather.path 的内容指纹"""
+    data = weather._data
+    if fingerprint is None:
+        fingerprint = REGISTRY.fingerprint(weather.path)
+    n = len(data.months)
+    names = {}
+    ids = set(int(x) for x in np.unique(data.hour_ids) if x >= 0)
+    if "id" in weather.df_weather_type.columns:
+        ids.update(weather.df_weather_type["id"].dropna().tolist())
+    for wid in sorted(ids):
+        try:
+            name = data.names[wid]
+        except Exception:
+            continue
+        if isinstance(name, str):
+            names[str(wid)] = name
+
+    def as_json(value):
+        return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+    def as_array(arr, dtype=None):
+        arr = np.asarray(arr)
+        dtype = np.dtype(dtype or arr.dtype).newbyteorder("<")
+        return dtype.str, arr.shape[1] if arr.ndim == 2 else 0, np.ascontiguousarray(arr, dtype=dtype).tobytes()
+
+    sections = [("months",) + as_array(data.months, "<i2"),
+                ("days",) + as_array(data.days, "<i2"),
+                ("hours",) + as_array(data.hour_ids, "<i4"),
+                ("id_bits",) + as_array(data.id_bits),
+                ("hour_bits",) + as_array(data.hour_bits)]
+    sections += [(name,) + as_array(getattr(data, name)) for name in _WeatherData.DERIVED]
+    sections += [("meta", _JSON, 0, as_json({"names": names, "cellIssues": weather._cell_issues})),
+                 ("weatherType", _JSON, 0, as_json(frame_to_json(weather.df_weather_type))),
+                 ("weatherList", _JSON, 0, as_json(frame_to_json(weather.df_weather_list)))]
+
+    table, offsets = [], []
+    offset = HEADER_SIZE
+    for name, dtype, cols, payload in sections:
+        table.append(_SECTION.pack(name.encode("ascii"), dtype.encode("ascii"), cols, offset, len(payload)))
+        offsets.append(offset)
+        offset = _aligned(offset + len(payload))
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, fingerprint.encode("ascii"), n, len(sections)) + b"".join(table)
+    if len(header) > HEADER_SIZE:
+        raise ValueError(f"编译文件段表过长：{len(header)} 字节，超过文件头 {HEADER_SIZE} 字节")
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp = f"{out_path}.tmp{os.getpid()}_{threading.get_ident()}"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for (_, _, _, payload), offset in zip(sections, offsets):
+            f.seek(offset)
+            f.write(payload)
+    try:
+        os.replace(tmp, out_path)
+    except OSError:
+        os.remove(tmp)
+        raise
+    return out_path
+
+
+def read_header(path):
+    """读取编译文件头：返回 {fingerprint, rows, sections}，sections 为 {段名: (类型, 列数, 偏移, 长度)}；
+    不是有效的编译文件时返回 None"""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(HEADER_SIZE)
+    except OSError:
+        return None
+    if len(raw) < HEADER_SIZE:
+        return None
+    magic, version, fingerprint, n, count = _HEADER.unpack_from(raw)
+    if magic != MAGIC or version != FORMAT_VERSION or _HEADER.size + count * _SECTION.size > HEADER_SIZE:
+        return None
+    sections = {}
+    for i in range(count):
+        name, dtype, cols, offset, length = _SECTION.unpack_from(raw, _HEADER.size + i * _SECTION.size)
+        sections[name.rstrip(b"\x00").decode("ascii")] = (dtype.rstrip(b"\x00").decode("ascii"), cols, offset, length)
+    return {"fingerprint": fingerprint.decode("ascii"), "rows": n, "sections": sections}
+
+
+def open_compiled(path, expected_fingerprint=None, source_path=None, categories=None):
+    """以 mmap 打开编译文件并构造 Weather（数组为共享的只读视图）。
+    expected_fingerprint 不为 None 且与文件头不符（源文件已变化）、或文件无效时返回 None"""
+    header = read_header(path)
+    if header is None:
+        return None
+    if expected_fingerprint is not None and header["fingerprint"] != expected_fingerprint:
+        return None
+    sections = header["sections"]
+    required = ("months", "days", "hours", "id_bits", "hour_bits", "meta", "weatherType", "weatherList")
+    if any(name not in sections for name in required + _WeatherData.DERIVED):
+        return None
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if any(offset + length > len(mm) for _, _, offset, length in sections.values()):
+        return None
+
+    def array(name):
+        dtype, cols, offset, length = sections[name]
+        arr = np.frombuffer(mm, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=offset)
+        return arr.reshape(-1, cols) if cols else arr
+
+    def parse(name):
+        _, _, offset, length = sections[name]
+        return json.loads(mm[offset:offset + length].decode("utf-8"))
+
+    meta = parse("meta")
+    names = {int(k): v for k, v in meta["names"].items()}
+
+    def frames_loader():
+        # 两张原始表各自切片解析，用到时才复制出对应字节
+        return frame_from_json(*parse("weatherType")), frame_from_json(*parse("weatherList"))
+
+    issues = meta.get("cellIssues")
+    return Weather.from_compiled(source_path or path, array("months"), array("days"), array("hours"), names,
+                                 frames_loader=frames_loader, categories=categories,
+                                 cell_issues=None if issues is None else [tuple(x) for x in issues],
+                                 derived={name: array(name) for name in _WeatherData.DERIVED},
+                                 id_bits=array("id_bits"), hour_bits=array("hour_bits"))
+
+
+def load_weather(cache_dir, excel_path, categories=None):
+    """经编译文件加载：缓存目录中已有与 excel_path 内容一致的编译文件时直接 mmap 打开，
+    否则读取 Excel 并写出编译文件。返回 Weather。
+    内容指纹取登记表中按文件时间戳记忆的值，文件未变化时不再重新计算"""
+    fingerprint = REGISTRY.fingerprint(excel_path)
+    cache_path = cache_path_for(cache_dir, excel_path)
+    if fingerprint is not None:
+        weather = open_compiled(cache_path, fingerprint, source_path=excel_path, categories=categories)
+        if weather is not None:
+            return weather
+    weather = Weather(custom_excel_path=excel_path, categories=categories)
+    weather.read_file()
+    try:
+        write_compiled(weather, cache_path, fingerprint)
+    except OSError:
+        # 旧文件正被其他进程映射（Windows 下无法替换）等情况：本次直接使用已读取的数据
+        pass
+    return weather
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
+        print(__doc__.strip())
+        return 2
+    cache_dir, paths = argv[0], argv[1:]
+    for path in paths:
+        excel_path = resolve_excel_path(path)
+        cache_path = cache_path_for(cache_dir, excel_path)
+        header = read_header(cache_path)
+        if header is not None and header["fingerprint"] == REGISTRY.fingerprint(excel_path):
+            print(f"已是最新，跳过：{excel_path}")
+            continue
+        weather = Weather(custom_excel_path=excel_path)
+        weather.read_file()
+        write_compiled(weather, cache_path)
+        print(f"已编译：{excel_path} -> {cache_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+分支预加载：启动后在一个低优先级的后台线程里依次读取注册表中的全部分支，登记到进程内的数据登记表
+（weather_registry.REGISTRY），之后切换分支、与任一分支对比时直接取用，无需再读 Excel。
+登记表的淘汰与失效规则见 weather_registry。
+"""
+import os
+import threading
+
+from weather import resolve_excel_path
+
+# 预加载两个分支之间的间隔，以及前台忙时的等待轮询间隔（秒），让出 CPU 与磁盘给前台操作
+PREFETCH_PAUSE = 0.5
+BUSY_POLL = 0.2
+
+
+class BranchPrefetcher:
+    """后台依次加载各分支到登记表 cache（DatasetRegistry）。loader(excel_path) -> Weather，由调用方决定读取方式（索引库 / 编译文件 / Excel）；
+    busy() 返回真时（前台有任务在执行）暂停，等前台空闲再继续"""
+
+    def __init__(self, cache, loader, branches, busy=None):
+        self.cache = cache
+        self.loader = loader
+        self.branches = dict(branches)
+        self.busy = busy
+        self.errors = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None or not self.branches:
+            return
+        self._thread = threading.Thread(target=self._run, name="weather-prefetch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        loaded = []
+        for name, folder in self.branches.items():
+            while self.busy is not None and self.busy() and not self._stop.is_set():
+                self._stop.wait(BUSY_POLL)
+            if self._stop.is_set():
+                return
+            excel_path = resolve_excel_path(folder)
+            if not os.path.isfile(excel_path) or self.cache.get(excel_path) is not None:
+                continue
+            try:
+                self.cache.load(excel_path, self.loader)
+            except Exception as e:
+                self.errors[name] = str(e)
+                continue
+            # 缓存已放不下（先加载的分支被挤出）时停止，避免后面的分支互相淘汰、反复读取
+            if any(self.cache.get(p) is None for p in loaded):
+                return
+            loaded.append(excel_path)
+            self._stop.wait(PREFETCH_PAUSE)
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+weather.xlsx 版本历史：每次加载（或文件变化）时把读取结果按内容寻址存入本地历史目录，
+任意两个历史版本可直接对比（报告格式同「分支对比」），无需保留或重新解析旧的 Excel。
+
+存储方式（目录下）：
+  - objects/xx/<sha256>  zlib 压缩的 JSON 对象：weatherType 整表、weatherList 每一行、版本清单；
+                         相同内容只存一份，未改动的行在各版本间共享
+  - log.jsonl            记录日志：每行一条 {version, path, fingerprint, recorded_at, changed_days}
+版本号为整份数据（weatherType + 全部行）内容的 SHA-256；版本清单只记录相对上一版本改动的行（每 KEYFRAME_INTERVAL
+个版本存一次完整行表），还原时沿上一版本回溯。
+
+版本引用：完整版本号、唯一前缀，或日志序号（-1 为最近一次，-2 为上一次，以此类推）。
+
+命令行：
+  python weather_history.py record 历史目录 路径 [路径 ...]   路径为 weather.xlsx 或项目根目录
+  python weather_history.py log 历史目录 [路径]                列出记录
+  python weather_history.py diff 历史目录 版本A 版本B          对比两个历史版本
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import zlib
+from datetime import datetime
+
+from weather import Weather, file_fingerprint, frame_from_json, frame_to_json, normalize_path, resolve_excel_path
+
+
+def _canonical(obj):
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _plain(value):
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+class HistoryEntry:
+    """日志中的一条记录"""
+    __slots__ = ("index", "version", "path", "fingerprint", "recorded_at", "changed_days")
+
+    def __init__(self, index, version, path, fingerprint, recorded_at, changed_days):
+        self.index = index
+        self.version = version
+        self.path = path
+        self.fingerprint = fingerprint
+        self.recorded_at = recorded_at
+        self.changed_days = changed_days
+
+    def __repr__(self):
+        return f"HistoryEntry({self.version[:12]}, {self.recorded_at}, {self.path})"
+
+
+class WeatherHistory:
+    # 每隔多少个版本保存一次完整行表（其余版本只存相对上一版本的改动行），限制还原时的回溯长度
+    KEYFRAME_INTERVAL = 16
+
+    def __init__(self, root):
+        self.root = root
+        self._objects = os.path.join(root, "objects")
+        self._log_path = os.path.join(root, "log.jsonl")
+        self._manifests = {}
+
+    # ---------- 对象存储 ----------
+
+    def _object_path(self, key):
+        return os.path.join(self._objects, key[:2], key)
+
+    def _put(self, obj, key=None):
+        """写入对象（已存在则跳过），返回键；key 为 None 时以内容的 SHA-256 为键"""
+        data = _canonical(obj)
+        key = key or _sha(data)
+        path = self._object_path(key)
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.tmp{os.getpid()}_{threading.get_ident()}"
+            with open(tmp, "wb") as f:
+                f.write(zlib.compress(data))
+            os.replace(tmp, path)
+        return key
+
+    def _get(self, key):
+        path = self._object_path(key)
+        if not os.path.isfile(path):
+            raise KeyError(f"历史库中缺少对象：{key}")
+        with open(path, "rb") as f:
+            return json.loads(zlib.decompress(f.read()).decode("utf-8"))
+
+    # ---------- 版本 ----------
+
+    def _manifest(self, version):
+        """版本清单（含完整行表），结果缓存"""
+        cached = self._manifests.get(version)
+        if cached is not None:
+            return cached
+        stored = self._get(version)
+        if "rows" in stored:
+            rows = stored["rows"]
+        else:
+            rows = list(self._manifest(stored["parent"])["rows"])
+            rows = rows[:stored["count"]] + [None] * max(stored["count"] - len(rows), 0)
+            for i, key in stored["changed"].items():
+                rows[int(i)] = key
+        manifest = {"type": stored["type"], "columns": stored["columns"], "dtypes": stored["dtypes"],
+                    "rows": rows, "depth": stored["depth"]}
+        self._manifests[version] = manifest
+        return manifest
+
+    def _snapshot(self, weather):
+        """把已加载数据拆为对象：返回 (weatherType 对象键, 列名, 列类型, 每行对象键列表)。
+        weatherType 只记录查询用到的列（df_weather_type）：索引库、编译文件等各种加载方式都有这几列，
+        同一内容不论怎样加载都得到同一版本号，也不必为记录而重新读取 Excel"""
+        type_text, type_dtypes = frame_to_json(weather.df_weather_type)
+        type_key = self._put({"data": type_text, "dtypes": type_dtypes})
+        list_text, list_dtypes = frame_to_json(weather.df_weather_list)
+        split = json.loads(list_text)
+        # 行内容与列类型无关（同一行在整数列 / 含空值的浮点列中应得到同一对象）：整数值的浮点数存为整数
+        row_keys = [self._put([_plain(v) for v in row]) for row in split["data"]]
+        return type_key, split["columns"], list_dtypes, row_keys
+
+    def record(self, weather, source_path=None):
+        """记录一份已加载数据（source_path 默认 weather.path）。与该路径上一次记录内容相同时不重复记录。
+        返回 (版本号, 是否新记录)"""
+        source_path = normalize_path(source_path or weather.path)
+        type_key, columns, dtypes, row_keys = self._snapshot(weather)
+        version = _sha(_canonical({"type": type_key, "columns": columns, "dtypes": dtypes, "rows": row_keys}))
+
+        previous = next((e for e in reversed(self.entries()) if e.path == source_path), None)
+        if previous is not None and previous.version == version:
+            return version, False
+        parent = previous.version if previous is not None else None
+        if not os.path.isfile(self._object_path(version)):
+            parent_manifest = self._manifest(parent) if parent else None
+            depth = parent_manifest["depth"] + 1 if parent_manifest else 0
+            if parent_manifest is None or depth % self.KEYFRAME_INTERVAL == 0:
+                stored = {"rows": row_keys}
+            else:
+                old_rows = parent_manifest["rows"]
+                changed = {str(i): key for i, key in enumerate(row_keys) if i >= len(old_rows) or old_rows[i] != key}
+                stored = {"parent": parent, "count": len(row_keys), "changed": changed}
+            stored.update({"type": type_key, "columns": columns, "dtypes": dtypes, "depth": depth})
+            self._put(stored, key=version)
+
+        changed_days = None
+        if parent:
+            old_rows = set(self._manifest(parent)["rows"])
+            changed_days = sum(1 for key in row_keys if key not in old_rows)
+        try:
+            fingerprint = file_fingerprint(weather.path) if os.path.isfile(weather.path) else None
+        except OSError:
+            fingerprint = None
+        entry = {"version": version, "path": source_path, "fingerprint": fingerprint,
+                 "recorded_at": datetime.now().isoformat(timespec="seconds"), "changed_days": changed_days}
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return version, True
+
+    def entries(self, path=None):
+        """日志记录（按记录顺序）；path 不为 None 时只返回该文件的记录"""
+        if not os.path.isfile(self._log_path):
+            return []
+        entries = []
+        with open(self._log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    d = json.loads(line)
+                except ValueError:
+                    continue
+                entries.append(HistoryEntry(len(entries), d.get("version", ""), d.get("path", ""),
+                                            d.get("fingerprint"), d.get("recorded_at", ""), d.get("changed_days")))
+        if path is not None:
+            key = normalize_path(path)
+            entries = [e for e in entries if e.path == key]
+        return entries
+
+    def resolve(self, ref):
+        """版本引用 -> 日志记录：完整版本号、唯一前缀，或日志序号（-1 为最近一次）"""
+        ref = str(ref).strip()
+        entries = self.entries()
+        if not entries:
+            raise ValueError("历史库为空，尚无任何记录")
+        if ref.lstrip("-").isdigit() and len(ref) < 8:
+            n = int(ref)
+            try:
+                return entries[n]
+            except IndexError:
+                raise ValueError(f"历史记录序号超出范围：{ref}（共 {len(entries)} 条）")
+        matches = {e.version: e for e in entries if e.version.startswith(ref.lower())}
+        if not matches:
+            raise ValueError(f"历史库中没有版本「{ref}」")
+        if len(matches) > 1:
+            raise ValueError(f"版本前缀「{ref}」不唯一，请写更长的版本号")
+        return [e for e in entries if e.version in matches][-1]
+
+    def load(self, ref, categories=None):
+        """还原某个历史版本为 Weather（不读取 Excel）"""
+        entry = self.resolve(ref)
+        manifest = self._manifest(entry.version)
+        type_obj = self._get(manifest["type"])
+        df_type = frame_from_json(type_obj["data"], type_obj["dtypes"])
+        split = {"columns": manifest["columns"], "index": list(range(len(manifest["rows"]))),
+                 "data": [self._get(key) for key in manifest["rows"]]}
+        df_list = frame_from_json(json.dumps(split, ensure_ascii=False), manifest["dtypes"])
+        return Weather.from_frames(entry.path, df_type, df_list, categories=categories, keep_full_type=True)
+
+    def diff(self, ref_a, ref_b):
+        """对比两个历史版本，返回 (diff_dict, formatted_report)，报告格式同 compare_two_paths"""
+        entry_a, entry_b = self.resolve(ref_a), self.resolve(ref_b)
+        wa, wb = self.load(entry_a.version), self.load(entry_b.version)
+        diff_dict = {'version_a': entry_a.version, 'version_b': entry_b.version,
+                     'path_a': entry_a.path, 'path_b': entry_b.path}
+        diff_dict.update(Weather.diff_weather(wa, wb))
+        report = Weather.format_compare_report(
+            diff_dict,
+            f"历史版本对比：{entry_a.version[:12]}  vs  {entry_b.version[:12]}",
+            [f"  版本 A: {entry_a.version[:12]}（{entry_a.recorded_at}）", f"  版本 B: {entry_b.version[:12]}（{entry_b.recorded_at}）", "",
+             f"  文件 A: {entry_a.path}", f"  文件 B: {entry_b.path}", ""],
+            "仅存在于版本 A",
+            "仅存在于版本 B",
+        )
+        return diff_dict, report
+
+
+def format_entries(entries):
+    """日志记录 -> 文本（每行：序号、版本前缀、记录时间、改动天数、文件）"""
+    if not entries:
+        return "历史库中暂无记录"
+    lines = []
+    for e in entries:
+        changed = "首次" if e.changed_days is None else f"改动 {e.changed_days} 天"
+        lines.append(f"  {e.index:>4}  {e.version[:12]}  {e.recorded_at}  {changed:<10}  {e.path}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2 or argv[0] not in ("record", "log", "diff"):
+        print(__doc__.strip())
+        return 2
+    command, root, rest = argv[0], argv[1], argv[2:]
+    history = WeatherHistory(root)
+    if command == "record":
+        if not rest:
+            print("请指定要记录的 weather.xlsx 或项目根目录")
+            return 2
+        for path in rest:
+            excel_path = resolve_excel_path(path)
+            weather = Weather(custom_excel_path=excel_path)
+            weather.read_file()
+            version, is_new = history.record(weather)
+            print(f"{'已记录' if is_new else '未变化'}：{version[:12]}  {excel_path}")
+    elif command == "log":
+        print(format_entries(history.entries(rest[0] if rest else None)))
+    else:
+        if len(rest) != 2:
+            print("请指定两个版本，如：diff 历史目录 -2 -1")
+            return 2
+        _, report = history.diff(rest[0], rest[1])
+        print(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
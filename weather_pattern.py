@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+天气时序模式查找：在全年逐小时序列（跨日连续）中查找「先 A 若干小时，再 B，再 C」这类先后出现的位置。
+
+模式写法：各步用 > 连接，每步为「条件{时长}」：
+  - 条件：分类名（如 雨天）、ID 或 ID 范围（如 119、301-305、119,120），前加 ! 表示「不是」；
+  - 时长：{2,} 至少 2 小时，{1,3} 1~3 小时，{4} 恰好 4 小时；省略为至少 1 小时；
+  - 任意天气用 *，如 *{0,4} 表示中间隔 0~4 小时任意天气（只能出现在两步之间）；不写上限（*{0,}）时最多隔 7 天。
+例：「雨天{2,} > *{0,4} > 301-305 > 晴天」= 下雨至少 2 小时，之后 4 小时内出现彩虹，彩虹结束紧接着晴天。
+
+每步匹配一段「连续满足条件的最长时段」，时长需在范围内；相邻两步之间的间隔由 * 步决定（无 * 时须紧接）。
+最后一步的每一段至多报告一处匹配：取能接到该段的最早开始（逐步动态规划，不枚举各步时段的全部组合）。
+"""
+import re
+
+import numpy as np
+
+from weather import run_bounds, ordinal_to_month_day
+
+# 「无上限」用的大数（小时）
+_UNBOUNDED = 1 << 40
+# * 步不写上限（如 *{0,}）时的间隔上限：7 天
+MAX_GAP_HOURS = 7 * 24
+
+_STEP_RE = re.compile(r"^(?P<term>[^{}]+?)\s*(?:\{\s*(?P<lo>\d*)\s*(?:(?P<comma>,)\s*(?P<hi>\d*))?\s*\})?$")
+
+
+class _Step:
+    """编译后的一步：ids（None 表示任意天气）、是否取反、时长下限/上限（小时）"""
+    __slots__ = ("label", "ids", "negate", "lo", "hi")
+
+    def __init__(self, label, ids, negate, lo, hi):
+        self.label = label
+        self.ids = ids
+        self.negate = negate
+        self.lo = lo
+        self.hi = hi
+
+
+class PatternMatch:
+    """一次匹配：start ~ end 为整体起止小时序号（end 不含），spans 为每步的 (起, 止)"""
+    __slots__ = ("start", "end", "spans")
+
+    def __init__(self, start, end, spans):
+        self.start = start
+        self.end = end
+        self.spans = spans
+
+    def __repr__(self):
+        return f"PatternMatch({format_span(self.start, self.end)})"
+
+
+def _format_ordinal(ordinal):
+    month, day = ordinal_to_month_day(ordinal // 24)
+    return month, day, ordinal % 24
+
+
+def format_span(start, end):
+    """小时序号区间 -> 「3月5日 18点～3月6日 2点」（同日时省略结束日期）"""
+    m1, d1, h1 = _format_ordinal(start)
+    m2, d2, h2 = _format_ordinal(end - 1)
+    h2 += 1
+    if (m1, d1) == (m2, d2):
+        return f"{m1}月{d1}日 {h1}点～{h2}点"
+    return f"{m1}月{d1}日 {h1}点～{m2}月{d2}日 {h2}点"
+
+
+def _range_argmin(values, lo, hi):
+    """对每个 j 求 values[lo[j]:hi[j]] 中最小值的下标（相同取靠前者），区间为空时为 -1。
+    用稀疏表（每级存 2^k 长区间的最小值下标），总计 O(n log n)"""
+    n = len(values)
+    result = np.full(len(lo), -1, dtype=np.int64)
+    if n == 0:
+        return result
+    table = [np.arange(n)]
+    width = 1
+    while width * 2 <= n:
+        below = table[-1]
+        left, right = below[:n - 2 * width + 1], below[width:n - width + 1]
+        table.append(np.where(values[right] < values[left], right, left))
+        width *= 2
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.minimum(np.asarray(hi, dtype=np.int64), n)
+    ok = hi > lo
+    if not ok.any():
+        return result
+    a, b = lo[ok], hi[ok]
+    level = np.floor(np.log2(b - a)).astype(np.int64)
+    left = np.empty(len(a), dtype=np.int64)
+    right = np.empty(len(a), dtype=np.int64)
+    for k in np.unique(level):
+        sel = level == k
+        left[sel] = table[k][a[sel]]
+        right[sel] = table[k][b[sel] - (1 << int(k))]
+    result[ok] = np.where(values[right] < values[left], right, left)
+    return result
+
+
+class CompiledPattern:
+    """编译后的时序模式：steps 为实际匹配的各步，gaps[i] 为第 i 步与第 i+1 步之间允许的间隔 (下限, 上限)"""
+
+    def __init__(self, text, steps, gaps):
+        self.text = text
+        self.steps = steps
+        self.gaps = gaps
+
+    def search(self, weather):
+        """在 weather 的全年逐小时序列中查找全部匹配，返回按开始时间排序的 PatternMatch 列表"""
+        ordinals, ids = weather.hour_series()
+        valid = ids >= 0
+        breaks = np.empty(len(ordinals), dtype=bool)
+        breaks[:1] = False
+        breaks[1:] = np.diff(ordinals) != 1
+
+        runs = []
+        for step in self.steps:
+            hit = np.isin(ids, step.ids)
+            if step.negate:
+                hit = ~hit & valid
+            starts, ends = run_bounds(hit, breaks)
+            lengths = ends - starts
+            keep = hit[starts] & (lengths >= step.lo) & (lengths <= step.hi)
+            runs.append((ordinals[starts[keep]], ordinals[ends[keep] - 1] + 1))
+
+        # 逐步动态规划：best[j] 为能以第 k 步第 j 段结束的最早开始时间，prev[k][j] 为回溯用的上一步段下标
+        first_starts, first_ends = runs[0]
+        best = first_starts.astype(np.int64)
+        prev = [None]
+        for k in range(1, len(self.steps)):
+            run_starts, run_ends = runs[k]
+            last_ends = runs[k - 1][1]
+            gap_lo, gap_hi = self.gaps[k - 1]
+            # 上一步各段按结束时间升序：可接到第 j 段的上一步段为一个连续区间 [lo, hi)
+            lo = np.searchsorted(last_ends, run_starts - gap_hi, side='left')
+            hi = np.searchsorted(last_ends, run_starts - gap_lo, side='right')
+            pick = _range_argmin(best, lo, hi)
+            best_k = np.full(len(run_starts), _UNBOUNDED, dtype=np.int64)
+            best_k[pick >= 0] = best[pick[pick >= 0]]
+            pick[best_k >= _UNBOUNDED] = -1   # 可接的上一步段都不可达
+            best = best_k
+            prev.append(pick)
+
+        # 每个最后一步的段报告一处匹配（取最早的开始），只对报告的匹配回溯各步时段
+        matches = []
+        last_ends = runs[-1][1]
+        for j in np.flatnonzero(best < _UNBOUNDED):
+            spans = []
+            i = int(j)
+            for k in range(len(self.steps) - 1, -1, -1):
+                spans.append((int(runs[k][0][i]), int(runs[k][1][i])))
+                if k:
+                    i = int(prev[k][i])
+            spans.reverse()
+            matches.append(PatternMatch(int(best[j]), int(last_ends[j]), spans))
+        matches.sort(key=lambda m: (m.start, m.end))
+        return matches
+
+    def format_matches(self, matches, weather):
+        """匹配结果文本：每个匹配一行总区间，下面列出各步对应时段"""
+        if not matches:
+            return f"未找到符合模式「{self.text}」的时段"
+        lines = [f"模式「{self.text}」共找到 {len(matches)} 处：", ""]
+        for n, match in enumerate(matches, 1):
+            lines.append(f"  {n:>3}. {format_span(match.start, match.end)}")
+            for step, (s, e) in zip(self.steps, match.spans):
+                lines.append(f"         {step.label:<10} {format_span(s, e)}")
+        return "\n".join(lines)
+
+
+def compile_pattern(text, weather):
+    """解析模式字符串（见模块说明），条件中的分类名 / ID 按 weather 的分类表解析。格式错误抛 ValueError"""
+    parts = [p.strip() for p in re.split(r"-?>", text or "")]
+    if not parts or not all(parts):
+        raise ValueError("模式格式错误：各步之间用 > 连接，且每步不能为空")
+    steps = []
+    gaps = []
+    pending_gap = [0, 0]
+    for part in parts:
+        m = _STEP_RE.match(part)
+        if not m:
+            raise ValueError(f"无法解析模式中的「{part}」")
+        term = m.group("term").strip()
+        lo_s, hi_s = m.group("lo"), m.group("hi")
+        if m.group("comma"):
+            lo = int(lo_s) if lo_s else 0
+            hi = int(hi_s) if hi_s else _UNBOUNDED
+        elif lo_s:
+            lo = hi = int(lo_s)
+        else:
+            lo, hi = (0, 0) if term == "*" else (1, _UNBOUNDED)
+        if lo > hi:
+            raise ValueError(f"「{part}」的时长下限大于上限")
+        if hi < 1 and term != "*":
+            raise ValueError(f"「{part}」的时长上限至少为 1 小时")
+        if term == "*":
+            if not steps:
+                raise ValueError("模式不能以 * 开头")
+            pending_gap[0] += lo
+            pending_gap[1] += MAX_GAP_HOURS if hi >= _UNBOUNDED else hi
+            continue
+        negate = term.startswith("!") or term.startswith("！")
+        selector = term[1:].strip() if negate else term
+        try:
+            ids = weather.ids_for(selector)
+        except (KeyError, ValueError):
+            raise ValueError(f"无法识别条件「{selector}」：应为分类名或天气 ID（如 雨天、119、301-305）")
+        if not ids:
+            raise ValueError(f"条件「{selector}」不含任何天气 ID")
+        if steps:
+            gaps.append(tuple(pending_gap))
+        pending_gap = [0, 0]
+        steps.append(_Step(term, np.array(sorted(set(ids)), dtype=np.int32), negate, max(lo, 1), hi))
+    if not steps:
+        raise ValueError("模式中至少需要一个非 * 的条件")
+    if parts[-1].startswith("*"):
+        raise ValueError("模式不能以 * 结尾")
+    return CompiledPattern(text, steps, gaps)
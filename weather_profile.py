@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+性能采样：在一段时间内（界面「开始性能采样」到「停止性能采样」之间）对执行的查询 / 加载任务做 cProfile，
+同时定时采样这些任务所在线程的调用栈，可选记录内存分配（tracemalloc）。停止后输出：
+  - .prof        cProfile 统计，可用 snakeviz、pstats 等工具查看
+  - .folded      折叠调用栈（每行「外层;…;内层 次数」），可直接导入 speedscope 或 flamegraph.pl 生成火焰图
+  - .tracemalloc 内存快照（开启内存记录时），可用 tracemalloc.Snapshot.load 读取
+以及耗时 / 内存占用前若干项的文本摘要。
+
+同一时刻只对一个任务做 cProfile（Python 3.12 起不允许多个 cProfile 同时启用）；
+其他并发任务照常执行，只计入调用栈采样。
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# 调用栈采样间隔（秒）、摘要列出的函数 / 内存位置数、tracemalloc 记录的栈深度
+SAMPLE_INTERVAL = 0.005
+TOP_N = 20
+TRACE_FRAMES = 25
+
+
+class ProfileSession:
+    """一次性能采样。start() 后用 profile(fn, ...) 执行要分析的任务，stop() 后 save() / summary_text()"""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.tasks = 0        # 做了 cProfile 的任务数
+        self.skipped = 0      # 因已有任务在做 cProfile 而只参与栈采样的任务数
+        self.duration = 0.0
+        self._stats = None
+        self._folded = Counter()
+        self._snapshot = None
+        self._own_tracemalloc = False
+        self._active = set()  # 正在执行被采样任务的线程
+        self._active_lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._started = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            self._own_tracemalloc = True
+        self._sampler = threading.Thread(target=self._sample_loop, name="weather-profile-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=1)
+        self.duration = time.perf_counter() - self._started if self._started else 0.0
+        if tracemalloc.is_tracing() and self.trace_memory:
+            # 排除采样工具自身的分配
+            self._snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, cProfile.__file__),
+                tracemalloc.Filter(False, pstats.__file__),
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+        return self
+
+    def profile(self, fn, *args, blocking=True, **kwargs):
+        """执行 fn(*args, **kwargs) 并计入本次采样。blocking=False 时若已有任务在做 cProfile 则不等待，只参与栈采样
+        （界面回调与后台任务都用此方式：回调不卡界面，并发任务也不排队等 cProfile）"""
+        ident = threading.get_ident()
+        with self._active_lock:
+            self._active.add(ident)
+        try:
+            if not self._profile_lock.acquire(blocking):
+                self._count_skipped()
+                return fn(*args, **kwargs)
+            try:
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # 其他分析工具（调试器等）已占用
+                    self._count_skipped()
+                    return fn(*args, **kwargs)
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    profiler.disable()
+                    self._add_stats(profiler)
+            finally:
+                self._profile_lock.release()
+        finally:
+            with self._active_lock:
+                self._active.discard(ident)
+
+    def _count_skipped(self):
+        with self._stats_lock:
+            self.skipped += 1
+
+    def _add_stats(self, profiler):
+        with self._stats_lock:
+            self.tasks += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+
+    def _sample_loop(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            with self._active_lock:
+                idents = list(self._active)
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self._folded[";".join(reversed(stack))] += 1
+
+    def folded_text(self):
+        """折叠调用栈文本（火焰图输入）"""
+        return "".join(f"{stack} {count}\n" for stack, count in self._folded.most_common())
+
+    def save(self, out_dir, prefix="weather_profile", timestamp=None):
+        """把 .prof / .folded /（.tracemalloc）写入 out_dir，返回写出的文件路径列表"""
+        from datetime import datetime
+        timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+        base = os.path.join(out_dir, f"{prefix}_{timestamp}")
+        paths = []
+        if self._stats is not None:
+            self._stats.dump_stats(base + ".prof")
+            paths.append(base + ".prof")
+        if self._folded:
+            with open(base + ".folded", "w", encoding="utf-8") as f:
+                f.write(self.folded_text())
+            paths.append(base + ".folded")
+        if self._snapshot is not None:
+            self._snapshot.dump(base + ".tracemalloc")
+            paths.append(base + ".tracemalloc")
+        return paths
+
+    def summary_text(self, top_n=TOP_N):
+        lines = [f"  采样时长 {self.duration:.1f} 秒，分析任务 {self.tasks} 个"
+                 + (f"（另有 {self.skipped} 个与之并发的任务只做了调用栈采样）" if self.skipped else "")
+                 + f"，调用栈样本 {sum(self._folded.values())} 个", ""]
+        if self._stats is None:
+            lines.append("  采样期间没有执行查询或加载：请先开始采样，再执行要分析的操作，之后停止采样。")
+            return "\n".join(lines)
+        for title, key in (("累计耗时（含调用的函数）", "cumulative"), ("自身耗时", "tottime")):
+            stream = io.StringIO()
+            stats = pstats.Stats(stream=stream)
+            stats.add(self._stats)
+            stats.strip_dirs().sort_stats(key).print_stats(top_n)
+            body = stream.getvalue()
+            # 去掉 pstats 开头的统计行，从表头（ncalls …）开始
+            start = body.find("ncalls")
+            start = body.rfind("\n", 0, start) + 1 if start >= 0 else 0
+            lines += ["─" * 60, f"  前 {top_n} 项 · {title}", "─" * 60, body[start:].rstrip(), ""]
+        if self._snapshot is not None:
+            lines += ["─" * 60, f"  前 {top_n} 项 · 采样结束时仍占用的内存（按代码行）", "─" * 60]
+            for stat in self._snapshot.statistics("lineno")[:top_n]:
+                frame = stat.traceback[0]
+                lines.append(f"  {stat.size / 1024:10.1f} KiB  {stat.count:>7} 块  {os.path.basename(frame.filename)}:{frame.lineno}")
+        return "\n".join(lines)
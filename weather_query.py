@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+天气条件查询表达式：把「id in (119..121) and month in 6..8 and hour in 18..23」这类条件
+编译成对 (天数 × 24) 小时矩阵的布尔运算，返回满足条件的时段、小时数或日期。
+
+写法：
+  - 字段：id（天气 ID）、month（月）、day（日）、hour（小时）、cat（分类名）；也可写 天气 / 月 / 日 / 小时 / 分类；
+  - 比较：in、not in、==、!=、<、<=、>、>=（= 等同 ==）；
+  - 取值：数字、范围 6..8、集合 (119..121, 301)；分类用名称，如 cat in (极光, 彩虹)、cat == 雨天；
+  - 组合：and / or / not 与括号（也可写 且 / 或 / 非）。
+例：「cat == 雨天 and hour in 0..5」「id in (301..305) and not month in 12..2」（月份范围可跨年，如 12..2）。
+"""
+import re
+
+import numpy as np
+
+from weather import run_bounds
+
+_TOKEN_RE = re.compile(r"\s*(\.\.|==|!=|<=|>=|[()<>=,]|[^\s(),=!<>.]+)")
+
+_FIELDS = {
+    "id": "id", "天气": "id",
+    "month": "month", "月": "month",
+    "day": "day", "日": "day",
+    "hour": "hour", "小时": "hour", "时": "hour",
+    "cat": "cat", "category": "cat", "分类": "cat",
+}
+_KEYWORDS = {"and": "and", "且": "and", "or": "or", "或": "or", "not": "not", "非": "not", "in": "in"}
+# 各字段取值范围（用于「12..2」这类回绕范围展开）
+_FIELD_SPAN = {"month": (1, 12), "day": (1, 31), "hour": (0, 23)}
+
+
+class _Context:
+    """表达式求值用的数组：行与全年连续日期对齐，列为 0~23 点"""
+    __slots__ = ("ids", "months", "days", "hours", "bits", "category_bits")
+
+    def __init__(self, weather, rows):
+        data = weather._data
+        self.ids = data.hour_ids[rows]
+        self.months = data.months[rows].astype(np.int32)[:, None]
+        self.days = data.days[rows].astype(np.int32)[:, None]
+        self.hours = np.arange(24, dtype=np.int32)[None, :]
+        self.bits = data.hour_bits[rows]
+        self.category_bits = data.category_bits
+
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        pos = 0
+        self.tokens = []
+        text = text or ""
+        while pos < len(text):
+            m = _TOKEN_RE.match(text, pos)
+            if not m or not m.group(1):
+                if text[pos:].strip() == "":
+                    break
+                raise ValueError(f"查询表达式错误：无法识别「{text[pos:].strip()}」")
+            self.tokens.append(m.group(1))
+            pos = m.end()
+        self.i = 0
+
+    def peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else None
+
+    def keyword(self):
+        tok = self.peek()
+        return _KEYWORDS.get(tok.lower() if tok else tok)
+
+    def take(self, expected=None):
+        tok = self.peek()
+        if tok is None:
+            raise ValueError(f"查询表达式错误：表达式不完整{f'，缺少「{expected}」' if expected else ''}")
+        if expected is not None and tok != expected and _KEYWORDS.get(tok.lower()) != expected:
+            raise ValueError(f"查询表达式错误：此处应为「{expected}」，实际为「{tok}」")
+        self.i += 1
+        return tok
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("查询表达式为空")
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError(f"查询表达式错误：多余的「{self.peek()}」")
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.keyword() == "or":
+            self.take()
+            node = ("or", node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.keyword() == "and":
+            self.take()
+            node = ("and", node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.keyword() == "not":
+            self.take()
+            return ("not", self.parse_not())
+        if self.peek() == "(":
+            self.take("(")
+            node = self.parse_or()
+            self.take(")")
+            return node
+        return self.parse_compare()
+
+    def parse_compare(self):
+        name = self.take()
+        field = _FIELDS.get(name.lower())
+        if field is None:
+            raise ValueError(f"查询表达式错误：未知字段「{name}」，可用 id / month / day / hour / cat")
+        if self.keyword() == "not":
+            self.take()
+            self.take("in")
+            return ("not", ("cmp", field, "in", self.parse_values(field)))
+        op = self.take()
+        if _KEYWORDS.get(op.lower()) == "in":
+            return ("cmp", field, "in", self.parse_values(field))
+        if op == "=":
+            op = "=="
+        if op not in ("==", "!=", "<", "<=", ">", ">="):
+            raise ValueError(f"查询表达式错误：不支持的比较「{op}」")
+        if field == "cat" and op not in ("==", "!="):
+            raise ValueError("查询表达式错误：分类只能用 ==、!=、in 比较")
+        if op in ("==", "!="):
+            values = self.parse_values(field)
+            return ("cmp", field, "in", values) if op == "==" else ("not", ("cmp", field, "in", values))
+        return ("cmp", field, op, self.number(self.take()))
+
+    def parse_values(self, field):
+        """单个值、范围 a..b 或括号集合，返回值列表（分类为名称列表，其余为整数列表）"""
+        if self.peek() == "(":
+            self.take("(")
+            values = self.parse_item(field)
+            while self.peek() == ",":
+                self.take(",")
+                values += self.parse_item(field)
+            self.take(")")
+            return values
+        return self.parse_item(field)
+
+    def parse_item(self, field):
+        tok = self.take()
+        if field == "cat":
+            return [tok]
+        lo = self.number(tok)
+        if self.peek() != "..":
+            return [lo]
+        self.take("..")
+        hi = self.number(self.take())
+        if hi >= lo:
+            return list(range(lo, hi + 1))
+        if field not in _FIELD_SPAN:
+            raise ValueError(f"查询表达式错误：范围 {lo}..{hi} 起点大于终点")
+        first, last = _FIELD_SPAN[field]
+        return list(range(lo, last + 1)) + list(range(first, hi + 1))
+
+    @staticmethod
+    def number(tok):
+        try:
+            return int(tok)
+        except (TypeError, ValueError):
+            raise ValueError(f"查询表达式错误：「{tok}」不是数字")
+
+
+class CompiledQuery:
+    """编译后的条件表达式：mask(weather) 得到与全年连续日期对齐的 (天数 × 24) 布尔矩阵"""
+
+    def __init__(self, text):
+        self.text = text
+        self.tree = _Parser(text).parse()
+
+    def _eval(self, node, ctx):
+        kind = node[0]
+        if kind == "and":
+            return self._eval(node[1], ctx) & self._eval(node[2], ctx)
+        if kind == "or":
+            return self._eval(node[1], ctx) | self._eval(node[2], ctx)
+        if kind == "not":
+            return ~self._eval(node[1], ctx)
+        _, field, op, value = node
+        if field == "cat":
+            bits = 0
+            for name in value:
+                if name not in ctx.category_bits:
+                    raise ValueError(f"查询表达式错误：未知分类「{name}」")
+                bits |= ctx.category_bits[name]
+            return (ctx.bits & bits) != 0
+        arr = {"id": ctx.ids, "month": ctx.months, "day": ctx.days, "hour": ctx.hours}[field]
+        if op == "in":
+            return np.isin(arr, np.asarray(value, dtype=np.int32))
+        return {"<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal}[op](arr, value)
+
+    def mask(self, weather):
+        """返回 (rows, mask)：rows 为全年连续日期对应的 weatherList 行号，mask 为 (len(rows) × 24) 布尔矩阵（空单元格恒为 False）"""
+        rows = weather._data.order
+        ctx = _Context(weather, rows)
+        mask = np.broadcast_to(self._eval(self.tree, ctx), ctx.ids.shape)
+        return rows, mask & (ctx.ids >= 0)
+
+    def segments(self, weather):
+        """满足条件的连续时段（跨零点相连，ID 变化处分段）：返回 WeatherSegment 列表"""
+        from weather import WeatherSegment
+        data = weather._data
+        rows, mask = self.mask(weather)
+        ordinals = (data.doy[rows].astype(np.int64)[:, None] * 24 + np.arange(24)).ravel()
+        ids = np.where(mask, data.hour_ids[rows], -1).ravel()
+        breaks = np.zeros(len(ordinals), dtype=bool)
+        breaks[1:] = np.diff(ordinals) != 1
+        starts, ends = run_bounds(ids, breaks)
+        keep = ids[starts] >= 0
+        return [
+            WeatherSegment(int(ordinals[s]), int(ordinals[e - 1]) + 1, int(ids[s]), data.names)
+            for s, e in zip(starts[keep], ends[keep])
+        ]
+
+    def counts(self, weather):
+        """满足条件的小时数：返回 (总小时数, {天气 ID: 小时数})"""
+        rows, mask = self.mask(weather)
+        hit = weather._data.hour_ids[rows][mask]
+        ids, counts = np.unique(hit, return_counts=True)
+        return int(mask.sum()), {int(i): int(c) for i, c in zip(ids, counts)}
+
+    def days(self, weather):
+        """至少有一个小时满足条件的日期：返回 [(月, 日), ...]"""
+        data = weather._data
+        rows, mask = self.mask(weather)
+        hit_rows = rows[mask.any(axis=1)]
+        return [(int(data.months[r]), int(data.days[r])) for r in hit_rows]
+
+    def format_result(self, weather, kind="segments"):
+        """按 kind（segments 时段 / counts 小时数 / days 日期）生成结果：返回 (文本, 表格列, 表格行)"""
+        names = weather._data.names
+        if kind == "segments":
+            segments = self.segments(weather)
+            if not segments:
+                return f"未找到满足「{self.text}」的时段", [], []
+            lines = [f"条件「{self.text}」共 {len(segments)} 个时段：", ""]
+            rows = []
+            for seg in segments:
+                if seg.spans_days:
+                    end_text = f"{seg.end_month}月{seg.end_day}日{seg.end_hour:>2}点"
+                    time_str = f"{seg.start}点~{seg.end_month}月{seg.end_day}日{seg.end_hour}点"
+                else:
+                    end_text = f"{seg.end:>2}点"
+                    time_str = f"{seg.start}~{seg.end}点" if seg.start != seg.end else f"{seg.start}点"
+                lines.append(f"  {seg.month}月{seg.day:>2}日  {seg.start:>2}点～{end_text}  {seg.wid}  {seg.name}")
+                rows.append((f"{seg.month}月{seg.day}日", time_str, seg.wid, seg.name))
+            return "\n".join(lines), ["日期", "时间段", "ID", "天气"], rows
+        if kind == "counts":
+            total, by_id = self.counts(weather)
+            if not total:
+                return f"未找到满足「{self.text}」的小时", [], []
+            lines = [f"条件「{self.text}」共 {total} 小时：", ""]
+            rows = []
+            for wid, count in sorted(by_id.items(), key=lambda kv: (-kv[1], kv[0])):
+                share = f"{count / total:.1%}"
+                lines.append(f"  {wid:>5}  {names[wid]:<10} {count:>5} 小时  {share:>6}")
+                rows.append((wid, names[wid], count, share))
+            return "\n".join(lines), ["ID", "天气", "总小时", "占比"], rows
+        if kind == "days":
+            days = self.days(weather)
+            if not days:
+                return f"未找到满足「{self.text}」的日期", [], []
+            lines = [f"条件「{self.text}」共 {len(days)} 天：", ""]
+            lines += [f"  {m}月{d}日" for m, d in days]
+            return "\n".join(lines), ["日期"], [(f"{m}月{d}日",) for m, d in days]
+        raise ValueError(f"未知的结果类型：{kind}（应为 segments / counts / days）")
+
+
+def compile_query(text):
+    """解析条件表达式（见模块说明），格式错误抛 ValueError"""
+    return CompiledQuery(text)
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+进程内已加载数据的登记表：同一份 weather.xlsx（规范化路径 + 内容指纹 + 分类表）在进程内只解析一次，
+Weather.read_file、分支对比（compare_two_paths / compare_branches）、界面的加载与分支预加载共用同一份数据。
+
+  - 指纹为文件内容的 SHA-256，按文件大小与修改时间记忆，文件未变化时不重复计算；
+    内容变化后旧数据不再命中，未被引用的旧数据随即释放
+  - 引用计数：acquire() 的数据（如界面当前显示的数据）不会被淘汰，release() 后恢复可淘汰；
+    acquire() 时该数据已被淘汰则按原来的键重新登记（该键空着时）；被引用的数据不会被同键的新数据顶替
+  - 容量：按最近使用顺序淘汰（LRU），受条数与估算内存两个上限约束
+  - load() 对同一文件加锁：多个线程同时请求同一份未加载的数据时只解析一次，其余等待并共用结果；
+    Weather.read_file 也经 load() 加载。锁可重入，loader 内部再调用 read_file 读同一文件不会死锁
+  - DatasetSnapshot：界面「当前数据」的只读快照。查询提交时（主线程）取当前快照并 acquire() 引用、任务结束后释放，
+    重新加载时在后台构造新数据，完成后整体替换快照引用；读者不等待加载，也不会看到加载了一半的状态，
+    旧快照在最后一个查询结束后释放
+"""
+import itertools
+import json
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from weather import Weather, file_fingerprint, file_stamp, normalize_path
+
+# 默认上限：最多常驻 4 份数据、估算内存合计不超过 512 MB（界面中由配置 branch_cache_max / branch_cache_mb 修改）
+DEFAULT_MAX_ITEMS = 4
+DEFAULT_MAX_MB = 512
+
+
+def estimate_bytes(weather):
+    """估算一份已加载数据占用的内存：编译后的数组 + 已解析的两张表（延迟加载尚未解析的表不计）"""
+    total = 0
+    data = getattr(weather, "_data", None)
+    if data is not None:
+        for name in data.__slots__:
+            value = getattr(data, name, None)
+            if isinstance(value, np.ndarray):
+                total += value.nbytes
+            elif isinstance(value, dict):
+                total += sum(v.nbytes for v in value.values() if isinstance(v, np.ndarray))
+    for df in (weather._df_weather_type, weather._df_weather_list, weather._df_weather_type_full):
+        if isinstance(df, pd.DataFrame):
+            total += int(df.memory_usage(index=True, deep=True).sum())
+    return total
+
+
+def _categories_key(categories):
+    """分类表 -> 可作键的字符串（内容相同的分类表得到同一键）"""
+    return json.dumps(categories, ensure_ascii=False, sort_keys=True, default=str)
+
+
+class _Entry:
+    __slots__ = ("weather", "nbytes", "refs")
+
+    def __init__(self, weather, nbytes):
+        self.weather = weather
+        self.nbytes = nbytes
+        self.refs = 0
+
+
+class DatasetRegistry:
+    """(规范化路径, 内容指纹, 分类表) -> 已加载 Weather 的登记表（线程安全）"""
+
+    def __init__(self, max_items=DEFAULT_MAX_ITEMS, max_bytes=DEFAULT_MAX_MB << 20):
+        self.max_items = max(1, int(max_items))
+        self.max_bytes = max(0, int(max_bytes))
+        self._items = OrderedDict()   # (路径, 指纹, 分类表) -> _Entry，按最近使用排序
+        self._fingerprints = {}       # 路径 -> (文件大小与修改时间, 指纹)
+        self._loading = {}            # (路径, 指纹, 分类表或 None) -> 该文件的加载锁
+        self._registered = weakref.WeakKeyDictionary()  # Weather -> (登记时的键, 估算字节数)，淘汰后 acquire() 据此重新登记
+        self._lock = threading.Lock()
+
+    def configure(self, max_items=None, max_bytes=None):
+        """修改容量上限（立即按新上限淘汰）"""
+        with self._lock:
+            if max_items is not None:
+                self.max_items = max(1, int(max_items))
+            if max_bytes is not None:
+                self.max_bytes = max(0, int(max_bytes))
+            self._evict()
+
+    def fingerprint(self, excel_path):
+        """文件内容指纹；文件不存在时返回 None"""
+        path = normalize_path(excel_path)
+        stamp = file_stamp(path)
+        if stamp is None:
+            return None
+        with self._lock:
+            known = self._fingerprints.get(path)
+        if known is not None and known[0] == stamp:
+            return known[1]
+        fingerprint = file_fingerprint(path)
+        with self._lock:
+            self._fingerprints[path] = (stamp, fingerprint)
+            # 内容已变化：未被引用的旧数据立即释放
+            for key in [k for k in self._items if k[0] == path and k[1] != fingerprint and not self._items[k].refs]:
+                del self._items[key]
+        return fingerprint
+
+    def _file_key(self, excel_path):
+        fingerprint = self.fingerprint(excel_path)
+        return None if fingerprint is None else (normalize_path(excel_path), fingerprint)
+
+    def get(self, excel_path, categories=None):
+        """取已加载的数据（并标记为最近使用）；categories 不为 None 时只取分类表相同的一份，否则取最近用过的一份。
+        未加载或文件内容已变化时返回 None"""
+        base = self._file_key(excel_path)
+        if base is None:
+            return None
+        with self._lock:
+            if categories is not None:
+                key = base + (_categories_key(dict(categories)),)
+            else:
+                key = next((k for k in reversed(self._items) if k[:2] == base), None)
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            self._items.move_to_end(key)
+            return entry.weather
+
+    def __contains__(self, excel_path):
+        return self.get(excel_path) is not None
+
+    def put(self, excel_path, weather):
+        """登记一份已加载的数据，超出上限时淘汰最久未用且未被引用的数据（刚登记的一份始终保留）。
+        返回登记表中的那一份：同一键已有另一份被引用的数据时保留它（不顶替）并返回它，否则返回 weather"""
+        base = self._file_key(excel_path)
+        if base is None:
+            return weather
+        key = base + (_categories_key(weather.categories),)
+        nbytes = estimate_bytes(weather)
+        with self._lock:
+            old = self._items.get(key)
+            if old is not None and old.weather is not weather and old.refs:
+                self._items.move_to_end(key)
+                return old.weather
+            self._registered[weather] = (key, nbytes)
+            if old is not None and old.weather is weather:
+                self._items.move_to_end(key)
+                return weather
+            self._items[key] = _Entry(weather, nbytes)
+            self._items.move_to_end(key)
+            self._evict()
+            return weather
+
+    def load(self, excel_path, loader=None, categories=None):
+        """取已加载的数据，没有时用 loader(excel_path) 加载（默认直接解析 Excel）并登记。
+        同一文件同一时刻只有一个线程在加载，其余线程等待后直接取用"""
+        base = self._file_key(excel_path)
+        if base is None:
+            raise FileNotFoundError(f"未找到文件：{excel_path}")
+        key = base + (None if categories is None else _categories_key(dict(categories)),)
+        weather = self.get(excel_path, categories)
+        if weather is not None:
+            return weather
+        with self._lock:
+            lock = self._loading.setdefault(key, threading.RLock())
+        with lock:
+            weather = self.get(excel_path, categories)
+            if weather is None:
+                if loader is not None:
+                    weather = loader(excel_path)
+                else:
+                    weather = Weather(custom_excel_path=excel_path, categories=categories)._read_excel()
+                weather = self.put(excel_path, weather)
+        with self._lock:
+            if self._loading.get(key) is lock:
+                del self._loading[key]
+        return weather
+
+    def acquire(self, weather):
+        """引用一份登记过的数据（引用期间不会被淘汰），返回是否成功。
+        已被淘汰的按原来的键重新登记；该键已被另一份数据占用（不顶替）、从未登记或已 discard() 的返回 False"""
+        with self._lock:
+            for entry in self._items.values():
+                if entry.weather is weather:
+                    entry.refs += 1
+                    return True
+            known = self._registered.get(weather)
+            if known is None:
+                return False
+            key, nbytes = known
+            if key in self._items:
+                return False
+            entry = self._items[key] = _Entry(weather, nbytes)
+            entry.refs = 1
+            self._items.move_to_end(key)
+            self._evict()
+            return True
+
+    def release(self, weather):
+        """释放 acquire() 的引用；文件内容已变化的旧数据在最后一个引用释放后移除"""
+        with self._lock:
+            for key, entry in list(self._items.items()):
+                if entry.weather is weather and entry.refs:
+                    entry.refs -= 1
+                    known = self._fingerprints.get(key[0])
+                    if not entry.refs and known is not None and known[1] != key[1]:
+                        del self._items[key]
+                    break
+            self._evict()
+
+    @contextmanager
+    def pinned(self, weather):
+        """with 块内引用 weather（未登记时不做处理），块结束时释放：后台查询执行期间所用数据不会被淘汰"""
+        acquired = self.acquire(weather)
+        try:
+            yield weather
+        finally:
+            if acquired:
+                self.release(weather)
+
+    def discard(self, excel_path):
+        """移除某文件的全部数据（不论引用）"""
+        path = normalize_path(excel_path)
+        with self._lock:
+            for key in [k for k in self._items if k[0] == path]:
+                del self._items[key]
+            for weather in [w for w, (k, _) in self._registered.items() if k[0] == path]:
+                del self._registered[weather]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._fingerprints.clear()
+            self._registered.clear()
+
+    def _total(self):
+        return sum(entry.nbytes for entry in self._items.values())
+
+    def _evict(self):
+        """在锁内调用：超出上限时按最久未用顺序淘汰未被引用的数据，最近登记的一份除外"""
+        while len(self._items) > 1 and (len(self._items) > self.max_items or self._total() > self.max_bytes):
+            newest = next(reversed(self._items))
+            victim = next((k for k, e in self._items.items() if not e.refs and k != newest), None)
+            if victim is None:
+                return
+            del self._items[victim]
+
+    def usage(self):
+        """(登记条数, 估算字节数)"""
+        with self._lock:
+            return len(self._items), self._total()
+
+
+class DatasetSnapshot:
+    """一份已加载数据的只读快照：数据（Weather，只读共用）、来源路径与生成序号，构造后不可修改。
+    持有者只整体替换快照引用（一次赋值），不修改快照本身"""
+    __slots__ = ("weather", "path", "serial")
+    _serials = itertools.count(1)
+
+    def __init__(self, weather, path=None):
+        object.__setattr__(self, "weather", weather)
+        object.__setattr__(self, "path", path or weather.path)
+        object.__setattr__(self, "serial", next(DatasetSnapshot._serials))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("数据快照只读，请构造新快照替换")
+
+    def __delattr__(self, name):
+        raise AttributeError("数据快照只读，请构造新快照替换")
+
+    def __repr__(self):
+        return f"DatasetSnapshot(#{self.serial}, {self.path})"
+
+
+# 进程内共用的登记表
+REGISTRY = DatasetRegistry()
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+天气出现次数统计：基于已加载的 Weather（read_file 之后），一次向量化遍历得出
+按月 / 按小时 / 按季节的小时数、连续时长分布、首次 / 末次出现时间，按天气 ID 与按分类各一份。
+"""
+import numpy as np
+
+from weather import MONTH_DAYS, run_bounds, ordinal_to_month_day
+
+# 季节划分：春 3-5 月、夏 6-8 月、秋 9-11 月、冬 12-2 月
+SEASONS = ("春", "夏", "秋", "冬")
+_MONTH_SEASON = np.array([3, 3, 0, 0, 0, 1, 1, 1, 2, 2, 2, 3])
+# 日期序号 -> 月份下标（0~11）
+_DOY_MONTH0 = np.repeat(np.arange(12), MONTH_DAYS)
+
+
+def format_hour_ordinal(ordinal):
+    """小时序号 -> 「3月5日 18点」"""
+    month, day = ordinal_to_month_day(int(ordinal) // 24)
+    return f"{month}月{day}日 {int(ordinal) % 24}点"
+
+
+class WeatherStats:
+    """全年统计结果。按 ID 的数组第一维与 self.ids 对齐，按分类的与 self.categories 对齐：
+    by_month (K×12)、by_hour (K×24)、by_season (K×4)、total (K)、
+    run_lengths[k]（该 ID / 分类每段连续出现的小时数）、first / last（首次、末次出现的小时序号，-1 表示未出现）。
+    连续段按全年逐小时序列计算，跨零点不断开，缺失日期处断开。"""
+
+    def __init__(self, weather):
+        ordinals, ids = weather.hour_series()
+        valid = ids >= 0
+        ordinals, ids = ordinals[valid], ids[valid]
+        months = _DOY_MONTH0[ordinals // 24]
+        hours = ordinals % 24
+
+        # ---------- 按天气 ID ----------
+        self.ids, idx = np.unique(ids, return_inverse=True)
+        k = len(self.ids)
+        self.by_month = np.bincount(idx * 12 + months, minlength=k * 12).reshape(k, 12)
+        self.by_hour = np.bincount(idx * 24 + hours, minlength=k * 24).reshape(k, 24)
+        self.by_season = self._seasons(self.by_month)
+        self.total = self.by_month.sum(axis=1)
+        gap = np.empty(len(ordinals), dtype=bool)
+        gap[:1] = False
+        gap[1:] = np.diff(ordinals) != 1
+        starts, ends = run_bounds(ids, gap)
+        run_idx = idx[starts]
+        self.run_lengths = self._split_by_key(run_idx, ends - starts, k)
+        # 序列已按时间排序：每个 ID 第一次出现的位置即首次，倒序第一次出现即末次
+        _, first_pos = np.unique(idx, return_index=True)
+        _, last_pos = np.unique(idx[::-1], return_index=True)
+        self.first = ordinals[first_pos]
+        self.last = ordinals[len(idx) - 1 - last_pos]
+
+        # ---------- 按分类：ID 属于分类的关系矩阵 M (K×C)，小时计数 = M.T @ 按 ID 计数 ----------
+        data = weather._data
+        self.categories = list(data.category_bits)
+        bits = np.array([data.category_bits[c] for c in self.categories], dtype=np.int64)
+        member = (data.id_bits[self.ids][:, None] & bits[None, :]) != 0
+        m = member.T.astype(np.int64)
+        self.cat_by_month = m @ self.by_month
+        self.cat_by_hour = m @ self.by_hour
+        self.cat_by_season = m @ self.by_season
+        self.cat_total = m @ self.total
+        hour_bits = data.id_bits[ids]
+        self.cat_run_lengths = []
+        self.cat_first = np.full(len(bits), -1, dtype=np.int64)
+        self.cat_last = np.full(len(bits), -1, dtype=np.int64)
+        for c, bit in enumerate(bits):
+            hit = (hour_bits & bit) != 0
+            starts, ends = run_bounds(hit, gap)
+            keep = hit[starts]
+            self.cat_run_lengths.append(ends[keep] - starts[keep])
+            pos = np.flatnonzero(hit)
+            if len(pos):
+                self.cat_first[c] = ordinals[pos[0]]
+                self.cat_last[c] = ordinals[pos[-1]]
+
+        self._names = weather._data.names
+
+    @staticmethod
+    def _seasons(by_month):
+        out = np.zeros((by_month.shape[0], 4), dtype=by_month.dtype)
+        for s in range(4):
+            out[:, s] = by_month[:, _MONTH_SEASON == s].sum(axis=1)
+        return out
+
+    @staticmethod
+    def _split_by_key(keys, values, k):
+        """按 keys（0..k-1）把 values 分组，返回长度为 k 的数组列表"""
+        order = np.argsort(keys, kind='stable')
+        bounds = np.searchsorted(keys[order], np.arange(k + 1))
+        values = values[order]
+        return [values[bounds[i]:bounds[i + 1]] for i in range(k)]
+
+    def id_index(self, weather_id):
+        """天气 ID 在 self.ids 中的下标，未出现返回 None"""
+        i = int(np.searchsorted(self.ids, int(weather_id)))
+        return i if i < len(self.ids) and self.ids[i] == int(weather_id) else None
+
+    @staticmethod
+    def duration_summary(lengths):
+        """连续时长分布摘要：(段数, 平均小时, 最短, 最长, {时长: 段数})"""
+        if len(lengths) == 0:
+            return 0, 0.0, 0, 0, {}
+        hist = np.bincount(lengths)
+        dist = {int(h): int(c) for h, c in enumerate(hist) if c}
+        return len(lengths), float(lengths.mean()), int(lengths.min()), int(lengths.max()), dist
+
+    # 表格列：与 table_rows 的元组一一对应
+    TABLE_COLUMNS = ["ID", "天气", "总小时", "春", "夏", "秋", "冬", "段数", "平均时长", "最长", "首次", "末次"]
+
+    def table_rows(self, by_category=False):
+        """按 ID（或按分类）汇总的表格行"""
+        rows = []
+        if by_category:
+            keys = [("", c) for c in self.categories]
+            arrays = (self.cat_total, self.cat_by_season, self.cat_run_lengths, self.cat_first, self.cat_last)
+        else:
+            keys = [(str(int(wid)), self._names[int(wid)]) for wid in self.ids]
+            arrays = (self.total, self.by_season, self.run_lengths, self.first, self.last)
+        total, by_season, run_lengths, first, last = arrays
+        for i, (key, name) in enumerate(keys):
+            count, mean, _, longest, _ = self.duration_summary(run_lengths[i])
+            rows.append((
+                key, name, int(total[i]), *(int(x) for x in by_season[i]), count,
+                f"{mean:.1f}", longest,
+                format_hour_ordinal(first[i]) if first[i] >= 0 else "",
+                format_hour_ordinal(last[i]) if last[i] >= 0 else "",
+            ))
+        return rows
+
+    def format_report(self, by_category=False):
+        """文本报告：每个 ID / 分类一段，含按月、按季节、按小时的小时数及时长分布"""
+        if by_category:
+            keys = list(self.categories)
+            arrays = (self.cat_total, self.cat_by_month, self.cat_by_season, self.cat_by_hour,
+                      self.cat_run_lengths, self.cat_first, self.cat_last)
+        else:
+            keys = [f"{int(wid)} {self._names[int(wid)]}" for wid in self.ids]
+            arrays = (self.total, self.by_month, self.by_season, self.by_hour,
+                      self.run_lengths, self.first, self.last)
+        total, by_month, by_season, by_hour, run_lengths, first, last = arrays
+        lines = []
+        for i, key in enumerate(keys):
+            count, mean, shortest, longest, dist = self.duration_summary(run_lengths[i])
+            lines.append("═" * 44)
+            lines.append(f"  ◆ {key}  共 {int(total[i])} 小时")
+            lines.append("─" * 44)
+            if not total[i]:
+                lines.append("    全年未出现")
+                lines.append("")
+                continue
+            lines.append("    按月: " + "  ".join(f"{m + 1}月{int(v)}" for m, v in enumerate(by_month[i]) if v))
+            lines.append("    按季: " + "  ".join(f"{SEASONS[s]}{int(v)}" for s, v in enumerate(by_season[i])))
+            lines.append("    按小时: " + "  ".join(f"{h}点{int(v)}" for h, v in enumerate(by_hour[i]) if v))
+            lines.append(f"    连续出现 {count} 段，平均 {mean:.1f} 小时，最短 {shortest} 小时，最长 {longest} 小时")
+            lines.append("    时长分布: " + "  ".join(f"{h}h×{c}" for h, c in dist.items()))
+            lines.append(f"    首次: {format_hour_ordinal(first[i])}    末次: {format_hour_ordinal(last[i])}")
+            lines.append("")
+        return "\n".join(lines).strip()
+
+
+# ---------- 天气转移 / 先后关系（全年逐小时序列，跨日连续） ----------
+
+def _lag_pairs(ordinals, lag):
+    """序列中相隔 lag 小时的下标对 (i, j)，缺失日期造成的不连续处不计"""
+    if lag <= 0 or len(ordinals) <= lag:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    i = np.arange(len(ordinals) - lag)
+    i = i[ordinals[i + lag] - ordinals[i] == lag]
+    return i, i + lag
+
+
+def transition_matrix(weather, by_category=False, lag=1, include_self=True):
+    """转移计数矩阵：counts[a, b] = 某小时为 labels[a]、lag 小时后为 labels[b] 的次数。
+    include_self=False 时不计天气 ID 未变化的小时对；by_category=True 时按分类统计（一个 ID 可属于多个分类，
+    在 ID 级矩阵上投影得到）。返回 (labels, counts)。"""
+    ordinals, ids = weather.hour_series()
+    valid = ids >= 0
+    ordinals, ids = ordinals[valid], ids[valid]
+    labels, idx = np.unique(ids, return_inverse=True)
+    k = len(labels)
+    src, dst = _lag_pairs(ordinals, lag)
+    counts = np.bincount(idx[src] * k + idx[dst], minlength=k * k).reshape(k, k)
+    if not include_self:
+        np.fill_diagonal(counts, 0)
+    if not by_category:
+        return [int(x) for x in labels], counts
+    data = weather._data
+    categories = list(data.category_bits)
+    bits = np.array([data.category_bits[c] for c in categories], dtype=np.int64)
+    member = ((data.id_bits[labels][:, None] & bits[None, :]) != 0).astype(np.int64)
+    return categories, member.T @ counts @ member
+
+
+def co_occurrence_matrix(weather, within, by_category=False):
+    """滞后共现：counts[a, b] = 某小时为 labels[a]、其后 1~within 小时内某小时为 labels[b] 的（小时对）次数"""
+    labels, total = transition_matrix(weather, by_category, lag=1)
+    for lag in range(2, int(within) + 1):
+        total = total + transition_matrix(weather, by_category, lag=lag)[1]
+    return labels, total
+
+
+def followed_within(weather, ids_a, ids_b, within):
+    """A 出现的每一段结束后 within 小时内是否出现 B：返回 (后接 B 的段数, A 总段数)。
+    例：雨天结束后 3 小时内出现彩虹的次数。"""
+    ordinals, ids = weather.hour_series()
+    hit_a = np.isin(ids, list(ids_a))
+    gap = np.empty(len(ordinals), dtype=bool)
+    gap[:1] = False
+    gap[1:] = np.diff(ordinals) != 1
+    starts, ends = run_bounds(hit_a, gap)
+    keep = hit_a[starts]
+    a_last = ordinals[ends[keep] - 1]
+    b_ord = ordinals[np.isin(ids, list(ids_b))]
+    if len(a_last) == 0 or len(b_ord) == 0:
+        return 0, len(a_last)
+    nxt = np.searchsorted(b_ord, a_last, side='right')
+    found = nxt < len(b_ord)
+    delay = np.full(len(a_last), np.iinfo(np.int64).max)
+    delay[found] = b_ord[nxt[found]] - a_last[found]
+    return int((delay <= within).sum()), len(a_last)
+
+
+# 转移表格列：与 transition_rows 的元组一一对应
+TRANSITION_COLUMNS = ["从", "到", "次数", "占比"]
+
+
+def transition_rows(weather, by_category=False, lag=1, include_self=False):
+    """转移表格行（按次数降序）；占比 = 该转移次数 / 起点的转移总数。
+    include_self=False 时只看天气 ID 发生变化的小时对（按分类时同分类内的 ID 变化仍计入）"""
+    labels, counts = transition_matrix(weather, by_category, lag, include_self=include_self)
+    row_total = counts.sum(axis=1)
+    src, dst = np.nonzero(counts)
+    order = np.argsort(-counts[src, dst], kind='stable')
+    names = weather._data.names
+
+    def label(i):
+        return labels[i] if by_category else f"{labels[i]} {names[labels[i]]}"
+
+    rows = []
+    for a, b in zip(src[order], dst[order]):
+        rows.append((label(a), label(b), int(counts[a, b]), f"{counts[a, b] * 100.0 / row_total[a]:.1f}%"))
+    return rows
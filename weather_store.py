@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+天气时段索引库（可选）：把 Weather 加载结果写入本地 SQLite，便于跨分支 / 跨时间用 SQL 做临时查询，
+也可作为快速加载来源（文件未变化时直接从库中还原，不再解析 Excel）。
+
+表（均带 source_id，对应 sources 中的路径与内容指纹）：
+  - sources        每个 weather.xlsx：path、fingerprint（SHA-256）、size、mtime_ns、ingested_at
+  - days           weatherList 每行：row、month、day、doy（非法日期为 -1）
+  - hours          全年逐小时：ordinal（doy*24+小时）、month、day、hour、weather_id（空单元格为 NULL）
+  - segments       合并后的时段（跨零点相连）：start_ordinal、end_ordinal（不含）、weather_id、month、day、start_hour、hours
+  - weather_types  weatherType：id、name（程序解析后的显示名）、name_day、type_name（第 8 列类型名）
+  - sheets         两张表（JSON，已按列类型整理）与读取时记录的非数字 / 非整数单元格（cellIssues），用于快速还原 Weather
+视图 v_hours / v_segments 已连接 path 与 fingerprint，可直接按路径过滤。
+
+命令行：
+  python weather_store.py ingest 库文件 路径 [路径 ...]    路径为 weather.xlsx 或项目根目录；未变化的文件跳过
+  python weather_store.py sources 库文件                   列出已入库文件
+  python weather_store.py sql 库文件 "SELECT ..."           执行 SQL 并以制表符分隔输出
+"""
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from weather import (TYPE_NAME_COLUMN, Weather, file_fingerprint, frame_from_json, frame_to_json, normalize_path,
+                     ordinal_to_month_day, resolve_excel_path)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    source_id   INTEGER PRIMARY KEY,
+    path        TEXT NOT NULL UNIQUE,
+    fingerprint TEXT NOT NULL,
+    size        INTEGER,
+    mtime_ns    INTEGER,
+    ingested_at TEXT
+);
+CREATE TABLE IF NOT EXISTS days (
+    source_id INTEGER NOT NULL,
+    row       INTEGER NOT NULL,
+    month     INTEGER,
+    day       INTEGER,
+    doy       INTEGER,
+    PRIMARY KEY (source_id, row)
+);
+CREATE TABLE IF NOT EXISTS hours (
+    source_id  INTEGER NOT NULL,
+    ordinal    INTEGER NOT NULL,
+    month      INTEGER,
+    day        INTEGER,
+    hour       INTEGER,
+    weather_id INTEGER,
+    PRIMARY KEY (source_id, ordinal)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS segments (
+    source_id     INTEGER NOT NULL,
+    start_ordinal INTEGER NOT NULL,
+    end_ordinal   INTEGER NOT NULL,
+    weather_id    INTEGER NOT NULL,
+    month         INTEGER,
+    day           INTEGER,
+    start_hour    INTEGER,
+    hours         INTEGER
+);
+CREATE TABLE IF NOT EXISTS weather_types (
+    source_id INTEGER NOT NULL,
+    id        INTEGER NOT NULL,
+    name      TEXT,
+    name_day  TEXT,
+    type_name TEXT,
+    PRIMARY KEY (source_id, id)
+);
+CREATE TABLE IF NOT EXISTS sheets (
+    source_id INTEGER NOT NULL,
+    sheet     TEXT NOT NULL,
+    data      TEXT NOT NULL,
+    dtypes    TEXT NOT NULL,
+    PRIMARY KEY (source_id, sheet)
+);
+CREATE INDEX IF NOT EXISTS idx_sources_fingerprint ON sources (fingerprint);
+CREATE INDEX IF NOT EXISTS idx_hours_weather ON hours (weather_id, source_id);
+CREATE INDEX IF NOT EXISTS idx_segments_source ON segments (source_id, start_ordinal);
+CREATE INDEX IF NOT EXISTS idx_segments_weather ON segments (weather_id, source_id);
+CREATE INDEX IF NOT EXISTS idx_days_date ON days (month, day);
+CREATE VIEW IF NOT EXISTS v_hours AS
+    SELECT s.path, s.fingerprint, h.* FROM hours h JOIN sources s USING (source_id);
+CREATE VIEW IF NOT EXISTS v_segments AS
+    SELECT s.path, s.fingerprint, g.* FROM segments g JOIN sources s USING (source_id);
+"""
+
+# 数据表（不含 sources）；重新入库时按 source_id 先清空
+_DATA_TABLES = ("days", "hours", "segments", "weather_types", "sheets")
+
+
+class WeatherStore:
+    """SQLite 索引库；可作上下文管理器使用（退出时关闭连接）"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _source(self, excel_path):
+        return self.conn.execute(
+            "SELECT source_id, fingerprint, size, mtime_ns FROM sources WHERE path = ?", (normalize_path(excel_path),)
+        ).fetchone()
+
+    def fingerprint_if_changed(self, excel_path):
+        """文件与库中记录一致时返回 None；否则返回新指纹。大小与修改时间都未变时不计算指纹"""
+        st = os.stat(excel_path)
+        row = self._source(excel_path)
+        if row and row[2] == st.st_size and row[3] == st.st_mtime_ns:
+            return None
+        fingerprint = file_fingerprint(excel_path)
+        if row and row[1] == fingerprint:
+            # 内容未变（仅被重新保存 / 复制）：只更新文件状态
+            with self.conn:
+                self.conn.execute("UPDATE sources SET size = ?, mtime_ns = ? WHERE source_id = ?",
+                                  (st.st_size, st.st_mtime_ns, row[0]))
+            return None
+        return fingerprint
+
+    def ingest(self, excel_path, weather=None, fingerprint=None, force=False):
+        """把 excel_path 写入库：文件未变化（且非 force）时跳过，返回 False；写入返回 True。
+        weather 为已加载的同一文件的 Weather 时直接使用，否则读取 Excel"""
+        excel_path = resolve_excel_path(excel_path)
+        if not os.path.isfile(excel_path):
+            raise FileNotFoundError(f"未找到文件：{excel_path}")
+        if fingerprint is None:
+            fingerprint = self.fingerprint_if_changed(excel_path)
+            if fingerprint is None and not force:
+                return False
+            if fingerprint is None:
+                fingerprint = file_fingerprint(excel_path)
+        if weather is None:
+            weather = Weather(custom_excel_path=excel_path)
+            weather.read_file()
+        st = os.stat(excel_path)
+        with self.conn:
+            row = self._source(excel_path)
+            if row:
+                source_id = row[0]
+                for table in _DATA_TABLES:
+                    self.conn.execute(f"DELETE FROM {table} WHERE source_id = ?", (source_id,))
+                self.conn.execute(
+                    "UPDATE sources SET fingerprint = ?, size = ?, mtime_ns = ?, ingested_at = ? WHERE source_id = ?",
+                    (fingerprint, st.st_size, st.st_mtime_ns, datetime.now().isoformat(timespec="seconds"), source_id),
+                )
+            else:
+                source_id = self.conn.execute(
+                    "INSERT INTO sources (path, fingerprint, size, mtime_ns, ingested_at) VALUES (?, ?, ?, ?, ?)",
+                    (normalize_path(excel_path), fingerprint, st.st_size, st.st_mtime_ns,
+                     datetime.now().isoformat(timespec="seconds")),
+                ).lastrowid
+            self._insert_weather(source_id, weather)
+        return True
+
+    def _insert_weather(self, source_id, weather):
+        data = weather._data
+        self.conn.executemany(
+            "INSERT INTO days VALUES (?, ?, ?, ?, ?)",
+            zip([source_id] * len(data.months), range(len(data.months)),
+                data.months.tolist(), data.days.tolist(), data.doy.tolist()),
+        )
+        ordinals, ids = weather.hour_series()
+        hour_ids = [None if w < 0 else w for w in ids.tolist()]
+        self.conn.executemany(
+            "INSERT INTO hours VALUES (?, ?, ?, ?, ?, ?)",
+            zip([source_id] * len(ordinals), ordinals.tolist(),
+                np.repeat(data.months[data.order], 24).tolist(), np.repeat(data.days[data.order], 24).tolist(),
+                (ordinals % 24).tolist(), hour_ids),
+        )
+        keep = data.seg_id >= 0
+        seg_rows = []
+        for s, e, w in zip(data.seg_start[keep].tolist(), data.seg_end[keep].tolist(), data.seg_id[keep].tolist()):
+            month, day = ordinal_to_month_day(s // 24)
+            seg_rows.append((source_id, s, e, w, month, day, s % 24, e - s))
+        self.conn.executemany("INSERT INTO segments VALUES (?, ?, ?, ?, ?, ?, ?, ?)", seg_rows)
+
+        df_type = weather.df_weather_type
+        type_rows = []
+        for i, wid in enumerate(df_type["id"].tolist()):
+            if pd.isna(wid):
+                continue
+            try:
+                name = data.names[wid]
+            except Exception:
+                name = None
+            name_day = df_type["nameDay"].iat[i] if "nameDay" in df_type.columns else None
+            type_name = df_type[TYPE_NAME_COLUMN].iat[i] if TYPE_NAME_COLUMN in df_type.columns else None
+            type_rows.append((source_id, wid, name if isinstance(name, str) else None,
+                              None if pd.isna(name_day) else str(name_day),
+                              None if pd.isna(type_name) else str(type_name)))
+        self.conn.executemany("INSERT OR REPLACE INTO weather_types VALUES (?, ?, ?, ?, ?)", type_rows)
+
+        for sheet, df in (("weatherType", weather.df_weather_type), ("weatherList", weather.df_weather_list)):
+            text, dtypes = frame_to_json(df)
+            self.conn.execute("INSERT INTO sheets VALUES (?, ?, ?, ?)",
+                              (source_id, sheet, text, json.dumps(dtypes, ensure_ascii=False)))
+        if weather._cell_issues is not None:
+            # 读取时记录的非数字 / 非整数单元格（库中的表已整理为整数列，数据检查靠它区分空格子与非数字）
+            self.conn.execute("INSERT INTO sheets VALUES (?, ?, ?, ?)",
+                              (source_id, "cellIssues", json.dumps(weather._cell_issues, ensure_ascii=False), "{}"))
+
+    def _read_sheet(self, source_id, sheet):
+        text, dtypes = self.conn.execute(
+            "SELECT data, dtypes FROM sheets WHERE source_id = ? AND sheet = ?", (source_id, sheet)
+        ).fetchone()
+        return frame_from_json(text, json.loads(dtypes))
+
+    def load(self, excel_path, categories=None):
+        """文件与库中记录一致时从库中还原 Weather（不解析 Excel），否则返回 None"""
+        excel_path = resolve_excel_path(excel_path)
+        row = self._source(excel_path)
+        if not row or not os.path.isfile(excel_path) or self.fingerprint_if_changed(excel_path) is not None:
+            return None
+        df_type = self._read_sheet(row[0], "weatherType")
+        df_list = self._read_sheet(row[0], "weatherList")
+        issues = self.conn.execute(
+            "SELECT data FROM sheets WHERE source_id = ? AND sheet = 'cellIssues'", (row[0],)
+        ).fetchone()
+        return Weather.from_frames(excel_path, df_type, df_list, categories=categories,
+                                   cell_issues=[tuple(x) for x in json.loads(issues[0])] if issues else None)
+
+    def sources(self):
+        """已入库文件：[(source_id, path, fingerprint, ingested_at), ...]"""
+        return self.conn.execute(
+            "SELECT source_id, path, fingerprint, ingested_at FROM sources ORDER BY source_id"
+        ).fetchall()
+
+    def query(self, sql, params=()):
+        """执行只读 SQL，返回 (列名列表, 行列表)"""
+        cur = self.conn.execute(sql, params)
+        columns = [d[0] for d in cur.description] if cur.description else []
+        return columns, cur.fetchall()
+
+
+def load_weather(db_path, excel_path, categories=None):
+    """经索引库加载：文件未变化时从库中还原，否则读取 Excel 并写入库。返回 Weather"""
+    with WeatherStore(db_path) as store:
+        weather = store.load(excel_path, categories=categories)
+        if weather is not None:
+            return weather
+        fingerprint = file_fingerprint(excel_path)
+        weather = Weather(custom_excel_path=excel_path, categories=categories)
+        weather.read_file()
+        store.ingest(excel_path, weather=weather, fingerprint=fingerprint)
+        return weather
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2 or argv[0] not in ("ingest", "sources", "sql"):
+        print(__doc__.strip())
+        return 2
+    command, db_path, rest = argv[0], argv[1], argv[2:]
+    with WeatherStore(db_path) as store:
+        if command == "ingest":
+            if not rest:
+                print("请指定要入库的 weather.xlsx 或项目根目录")
+                return 2
+            for path in rest:
+                changed = store.ingest(path)
+                print(f"{'已入库' if changed else '未变化，跳过'}：{resolve_excel_path(path)}")
+        elif command == "sources":
+            for source_id, path, fingerprint, ingested_at in store.sources():
+                print(f"{source_id}\t{fingerprint[:12]}\t{ingested_at}\t{path}")
+        else:
+            if not rest:
+                print("请指定 SQL 语句")
+                return 2
+            columns, rows = store.query(rest[0])
+            if columns:
+                print("\t".join(columns))
+            for row in rows:
+                print("\t".join("" if v is None else str(v) for v in row))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
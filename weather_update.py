@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+自动更新：检查新版本（条件请求 + 缓存）与下载（断点续传、SHA-256 校验、按文件增量更新）。
+
+发布清单（MANIFEST_NAME，随发布一起上传）为 JSON：
+  {"version": "1.0.7",
+   "zip":   {"name": "WeatherQuery-v1.0.7.zip", "size": 字节数, "sha256": "…"},
+   "files": {"WeatherQuery.exe": {"size": …, "sha256": "…"}, "_internal/xxx.dll": {…}, …},
+   "base_url": "https://内网镜像/WeatherQuery/1.0.7/"}      （可选）
+files 为目录版（dist/WeatherQuery）中每个文件的相对路径与校验值。提供了 base_url（或配置 update_base_url）时，
+只下载与本地不同的文件（base_url + 相对路径），否则下载整个 zip。
+
+检查更新用 check_release：结果连同 ETag 缓存（由调用方存入配置），有效期内不发请求；过期后带 If-None-Match 发条件请求，
+未变化时服务器只返回 304（GitHub 的 304 不计入访问频率限制）。
+
+下载写入「目标文件.part」，中断后再次下载从已有长度处用 HTTP Range 续传（服务器不支持 Range 时从头下载）；
+下载完成后核对大小与 SHA-256，不一致则删除 .part 并报错，核对通过才改名为目标文件。
+
+命令行（发布时生成清单，或对照本地 HTTP 服务测试）：
+  python weather_update.py manifest 目录版文件夹 版本号 [--zip ZIP文件] [--base-url URL] [-o 输出文件]
+  python weather_update.py download URL 目标文件 [--sha256 校验值]
+  python weather_update.py delta 清单URL 安装目录 暂存目录 [--base-url URL]
+  python weather_update.py check 发布信息URL [--etag ETag]
+"""
+import hashlib
+import http.client
+import json
+import os
+import socket
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+MANIFEST_NAME = "WeatherQuery-manifest.json"
+CHUNK = 1 << 16
+# 单次读取的网络超时（秒）；中断后自动续传的次数与间隔
+TIMEOUT = 30
+RETRIES = 5
+RETRY_PAUSE = 2
+# 检查更新结果的缓存有效期（秒）与请求超时
+UPDATE_CHECK_TTL = 6 * 3600
+CHECK_TIMEOUT = 10
+# 进度回调的最小间隔（字节）
+PROGRESS_STEP = 1 << 18
+# 下载中断时可续传的异常
+_RETRYABLE = (urllib.error.URLError, socket.timeout, ConnectionError, http.client.IncompleteRead, http.client.RemoteDisconnected)
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _safe_rel_path(rel):
+    """清单中的相对路径：统一为 / 分隔，拒绝绝对路径与 .. 以免写到安装目录之外"""
+    rel = rel.replace("\\", "/")
+    parts = rel.split("/")
+    if not rel or rel.startswith("/") or ":" in parts[0] or any(p in ("", ".", "..") for p in parts):
+        raise ValueError(f"更新清单中的文件路径无效: {rel}")
+    return rel
+
+
+def build_manifest(dist_dir, version, zip_path=None, base_url=None):
+    """为目录版 dist_dir 生成发布清单"""
+    if not os.path.isdir(dist_dir):
+        raise FileNotFoundError(f"目录不存在: {dist_dir}")
+    files = {}
+    for folder, _, names in os.walk(dist_dir):
+        for name in sorted(names):
+            path = os.path.join(folder, name)
+            rel = os.path.relpath(path, dist_dir).replace(os.sep, "/")
+            files[rel] = {"size": os.path.getsize(path), "sha256": file_sha256(path)}
+    manifest = {"version": str(version).lstrip("v"), "files": dict(sorted(files.items()))}
+    if zip_path:
+        manifest["zip"] = {"name": os.path.basename(zip_path), "size": os.path.getsize(zip_path), "sha256": file_sha256(zip_path)}
+    if base_url:
+        manifest["base_url"] = base_url
+    return manifest
+
+
+def parse_manifest(data):
+    """校验清单结构，返回清单 dict"""
+    if not isinstance(data, dict) or not isinstance(data.get("files", {}), dict):
+        raise ValueError("更新清单格式无效")
+    for rel, entry in data.get("files", {}).items():
+        _safe_rel_path(rel)
+        if not isinstance(entry, dict) or not entry.get("sha256"):
+            raise ValueError(f"更新清单缺少校验值: {rel}")
+    return data
+
+
+def fetch_manifest(url, timeout=TIMEOUT):
+    req = urllib.request.Request(url, headers={"Accept": "application/octet-stream"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return parse_manifest(json.loads(resp.read().decode("utf-8")))
+
+
+def _release_summary(data):
+    """只保留检查更新用到的字段（版本号、发布页、附件名与下载地址），便于缓存到配置"""
+    assets = [{"name": a.get("name") or "", "browser_download_url": a.get("browser_download_url") or ""}
+              for a in data.get("assets") or [] if isinstance(a, dict)]
+    return {"tag_name": data.get("tag_name") or "", "html_url": data.get("html_url") or "", "assets": assets}
+
+
+def check_release(url, cache=None, ttl=UPDATE_CHECK_TTL, force=False, timeout=CHECK_TIMEOUT, now=None):
+    """查询最新发布（GitHub releases/latest 格式），返回 (发布信息, 新缓存, 是否发出了请求)。
+    cache 为上次返回的缓存 {"url", "etag", "checked_at", "release"}：同一 url 且未超过 ttl 秒时（force 除外）直接返回缓存；
+    否则带 If-None-Match 发条件请求，304 时沿用缓存的发布信息并刷新检查时间"""
+    now = time.time() if now is None else now
+    if not (isinstance(cache, dict) and cache.get("url") == url and isinstance(cache.get("release"), dict)):
+        cache = None
+    if cache is not None and not force:
+        try:
+            age = now - float(cache.get("checked_at") or 0)
+        except (TypeError, ValueError):
+            age = -1
+        if 0 <= age < ttl:
+            return cache["release"], cache, False
+    headers = {"Accept": "application/vnd.github.v3+json"}
+    if cache is not None and cache.get("etag"):
+        headers["If-None-Match"] = cache["etag"]
+    req = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            release = _release_summary(json.loads(resp.read().decode("utf-8")))
+            etag = resp.headers.get("ETag")
+    except urllib.error.HTTPError as e:
+        if e.code != 304 or cache is None:
+            raise
+        release, etag = cache["release"], e.headers.get("ETag") or cache.get("etag")
+    return release, {"url": url, "etag": etag, "checked_at": now, "release": release}, True
+
+
+def _verify(path, size=None, sha256=None):
+    if size is not None and os.path.getsize(path) != size:
+        return False
+    return sha256 is None or file_sha256(path) == sha256.lower()
+
+
+def download(url, dest, size=None, sha256=None, progress=None, check=None, timeout=TIMEOUT, retries=RETRIES):
+    """断点续传下载 url 到 dest 并校验，返回 dest。dest 已存在且校验一致时直接返回。
+    progress(已下载字节, 总字节) 定期回调；check() 在每块之间调用，可抛异常中止（.part 保留，下次续传）"""
+    if os.path.isfile(dest) and (size is not None or sha256 is not None) and _verify(dest, size, sha256):
+        return dest
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    part = dest + ".part"
+    attempt = 0
+    while True:
+        offset = os.path.getsize(part) if os.path.isfile(part) else 0
+        if size is not None and offset > size:
+            os.remove(part)
+            offset = 0
+        try:
+            if size is None or offset < size:
+                _fetch_into(url, part, offset, size, progress, check, timeout)
+            break
+        except _RETRYABLE as e:
+            if isinstance(e, urllib.error.HTTPError) and e.code != 416:
+                raise
+            if isinstance(e, urllib.error.HTTPError):
+                # 416：已有长度不小于文件长度（.part 可能已完整），交给下面的校验
+                break
+            attempt += 1
+            if attempt > retries:
+                raise
+            time.sleep(RETRY_PAUSE)
+    if not _verify(part, size, sha256):
+        os.remove(part)
+        raise ValueError(f"下载的文件校验失败（大小或 SHA-256 不一致），已删除，请重试: {os.path.basename(dest)}")
+    os.replace(part, dest)
+    return dest
+
+
+def _fetch_into(url, part, offset, size, progress, check, timeout):
+    headers = {"Accept": "application/octet-stream"}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+    req = urllib.request.Request(url, headers=headers)
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        if offset and resp.status != 206:
+            # 服务器不支持 Range：从头下载
+            offset = 0
+        length = resp.headers.get("Content-Length")
+        total = size if size is not None else (offset + int(length) if length and length.isdigit() else None)
+        done, reported = offset, offset
+        with open(part, "ab" if offset else "wb") as f:
+            while True:
+                if check is not None:
+                    check()
+                chunk = resp.read(CHUNK)
+                if not chunk:
+                    break
+                f.write(chunk)
+                done += len(chunk)
+                if progress is not None and done - reported >= PROGRESS_STEP:
+                    reported = done
+                    progress(done, total or done)
+        if total is not None and done < total:
+            raise http.client.IncompleteRead(b"", total - done)
+        if progress is not None:
+            progress(done, total or done)
+
+
+def plan_delta(manifest, install_dir):
+    """列出安装目录中缺失或与清单不一致的文件：[(相对路径, 清单项), ...]（先比大小，大小相同再比 SHA-256）"""
+    changed = []
+    for rel, entry in manifest.get("files", {}).items():
+        local = os.path.join(install_dir, *_safe_rel_path(rel).split("/"))
+        if not os.path.isfile(local) or not _verify(local, entry.get("size"), entry["sha256"]):
+            changed.append((rel, entry))
+    return changed
+
+
+def delta_bytes(changed):
+    return sum(entry.get("size") or 0 for _, entry in changed)
+
+
+def stage_delta(manifest, changed, stage_dir, base_url=None, progress=None, check=None):
+    """把 changed 中的文件下载到 stage_dir（保持相对路径），已下载并校验过的文件不再下载；返回 stage_dir"""
+    base_url = base_url or manifest.get("base_url")
+    if not base_url:
+        raise ValueError("更新清单未提供 base_url，无法按文件增量更新")
+    if not base_url.endswith("/"):
+        base_url += "/"
+    total = delta_bytes(changed)
+    finished = 0
+    for rel, entry in changed:
+        def file_progress(done, _total, start=finished):
+            if progress is not None:
+                progress(start + done, total)
+        url = base_url + urllib.parse.quote(rel)
+        dest = os.path.join(stage_dir, *rel.split("/"))
+        download(url, dest, size=entry.get("size"), sha256=entry["sha256"], progress=file_progress, check=check)
+        finished += entry.get("size") or 0
+        if progress is not None:
+            progress(finished, total)
+    return stage_dir
+
+
+def _option(args, name, default=None):
+    if name in args:
+        i = args.index(name)
+        if i + 1 >= len(args):
+            raise ValueError(f"{name} 缺少参数")
+        value = args[i + 1]
+        del args[i:i + 2]
+        return value
+    return default
+
+
+def _print_progress(done, total):
+    print(f"\r  {done / 1048576:.1f} / {total / 1048576:.1f} MB", end="", flush=True)
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] not in ("manifest", "download", "delta", "check"):
+        print(__doc__.strip())
+        return 2
+    command, args = argv[0], argv[1:]
+    try:
+        zip_path = _option(args, "--zip")
+        base_url = _option(args, "--base-url")
+        output = _option(args, "-o")
+        sha256 = _option(args, "--sha256")
+        etag = _option(args, "--etag")
+    except ValueError as e:
+        print(e)
+        return 2
+    if command == "manifest":
+        if len(args) != 2:
+            print("用法: manifest 目录版文件夹 版本号 [--zip ZIP文件] [--base-url URL] [-o 输出文件]")
+            return 2
+        manifest = build_manifest(args[0], args[1], zip_path=zip_path, base_url=base_url)
+        text = json.dumps(manifest, ensure_ascii=False, indent=1)
+        if output:
+            with open(output, "w", encoding="utf-8") as f:
+                f.write(text)
+            print(f"已写入清单（{len(manifest['files'])} 个文件）: {output}")
+        else:
+            print(text)
+    elif command == "download":
+        if len(args) != 2:
+            print("用法: download URL 目标文件 [--sha256 校验值]")
+            return 2
+        download(args[0], args[1], sha256=sha256, progress=_print_progress)
+        print(f"\n已下载: {args[1]}")
+    elif command == "check":
+        if len(args) != 1:
+            print("用法: check 发布信息URL [--etag ETag]")
+            return 2
+        cache = {"url": args[0], "etag": etag, "checked_at": 0, "release": {}} if etag else None
+        release, cache, _ = check_release(args[0], cache, force=True)
+        if etag and not release.get("tag_name"):
+            print(f"未变化（服务器返回 304）  ETag: {cache.get('etag')}")
+        else:
+            print(f"最新版本: {release.get('tag_name') or '（未知）'}  ETag: {cache.get('etag') or '（无）'}")
+    else:
+        if len(args) != 3:
+            print("用法: delta 清单URL 安装目录 暂存目录 [--base-url URL]")
+            return 2
+        manifest = fetch_manifest(args[0])
+        changed = plan_delta(manifest, args[1])
+        print(f"需更新 {len(changed)} / {len(manifest.get('files', {}))} 个文件，共 {delta_bytes(changed) / 1048576:.1f} MB")
+        if changed:
+            stage_delta(manifest, changed, args[2], base_url=base_url, progress=_print_progress)
+            print(f"\n已下载到: {args[2]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
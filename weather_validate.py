@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+数据检查：在加载后编译出的数组上做一次向量化检查（每次加载只多几毫秒），找出 weather.xlsx 中的问题数据，
+而不是等到查询结果里出现「未知(…)」或某处 int() 报错才发现。
+
+检查项：
+  错误  weatherList：日期不存在（如 2月30日、月 / 日为空）、同一日期出现多行、小时格为非数字文本或非整数、
+        小时格中的天气 ID 不在 weatherType 中；weatherType：id 为空 / 非数字、同一 id 出现多行
+  警告  weatherList：缺少日期（平年数据缺 2月29日不计）、小时格为空
+  提示  weatherType 中定义但全年从未出现的天气 ID
+
+命令行（可一次检查多个分支）：
+  python weather_validate.py 路径或分支名 [...]   路径为 weather.xlsx、项目根目录或 logic 目录；有错误时退出码为 1
+"""
+import sys
+
+import numpy as np
+
+from weather import (HOUR_COLS, MONTH_DAYS, BRANCHES, Weather, day_ordinals, format_id_ranges,
+                     ordinal_to_month_day, resolve_excel_path)
+
+ERROR = "错误"
+WARNING = "警告"
+NOTICE = "提示"
+_LEVEL_ORDER = {ERROR: 0, WARNING: 1, NOTICE: 2}
+
+# weatherList 第 0 行数据在 Excel 中的行号（read_file 跳过 4 行，第 5 行为表头）
+EXCEL_FIRST_ROW = 6
+# 每项问题最多列出的位置数
+MAX_EXAMPLES = 20
+# 2月29日的日期序号：平年数据没有这一天，不算缺失
+_FEB29 = int(day_ordinals(2, 29))
+
+
+class ValidationIssue:
+    """一项检查发现的问题：code 为英文标识（如 unknown_id），count 为涉及的行 / 单元格 / ID 数，examples 为位置说明（最多 MAX_EXAMPLES 条）"""
+    __slots__ = ("code", "level", "title", "count", "examples")
+
+    def __init__(self, code, level, title, count, examples):
+        self.code = code
+        self.level = level
+        self.title = title
+        self.count = int(count)
+        self.examples = list(examples)
+
+    def to_dict(self):
+        return {"code": self.code, "level": self.level, "title": self.title,
+                "count": self.count, "examples": self.examples}
+
+    def __repr__(self):
+        return f"ValidationIssue({self.code}, {self.level}, {self.count})"
+
+
+class ValidationReport:
+    """一份数据的检查结果"""
+    __slots__ = ("path", "rows", "issues")
+
+    def __init__(self, path, rows, issues):
+        self.path = path
+        self.rows = rows
+        self.issues = sorted(issues, key=lambda i: _LEVEL_ORDER[i.level])
+
+    def by_level(self, level):
+        return [i for i in self.issues if i.level == level]
+
+    @property
+    def ok(self):
+        """没有错误（警告、提示不算）"""
+        return not self.by_level(ERROR)
+
+    def summary(self):
+        """一行摘要，如「2 项错误、1 项警告」；无问题时为「未发现问题」"""
+        parts = [f"{len(self.by_level(level))} 项{level}" for level in (ERROR, WARNING, NOTICE) if self.by_level(level)]
+        return "、".join(parts) if parts else "未发现问题"
+
+    def to_dict(self):
+        return {"path": self.path, "rows": self.rows, "ok": self.ok, "issues": [i.to_dict() for i in self.issues]}
+
+    def format_text(self):
+        lines = ["═" * 60, "  数据检查", "═" * 60, "", f"  文件: {self.path}", f"  weatherList 行数: {self.rows}",
+                 f"  结果: {self.summary()}", ""]
+        for issue in self.issues:
+            lines += ["─" * 60, f"  【{issue.level}】{issue.title}（{issue.count}）", "─" * 60]
+            lines += [f"    {e}" for e in issue.examples]
+            if issue.count > len(issue.examples) and len(issue.examples) >= MAX_EXAMPLES:
+                lines.append(f"    …… 共 {issue.count} 处，仅列出前 {len(issue.examples)} 处")
+            lines.append("")
+        return "\n".join(lines)
+
+
+def _row_text(row):
+    return f"第 {int(row) + EXCEL_FIRST_ROW} 行"
+
+
+def _date_text(month, day):
+    month = "?" if month <= 0 else str(month)
+    day = "?" if day <= 0 else str(day)
+    return f"{month}月{day}日"
+
+
+def _cell_texts(data, cells, raw=None):
+    """(行号数组, 小时数组) -> 位置说明，如「3月5日 18点（第 70 行）」；raw（{(行号, 小时): 原值文本}）不为 None 时附上原值"""
+    texts = []
+    for row, hour in zip(cells[0][:MAX_EXAMPLES], cells[1][:MAX_EXAMPLES]):
+        text = f"{_date_text(int(data.months[row]), int(data.days[row]))} {int(hour)}点（{_row_text(row)}）"
+        if raw is not None:
+            text += f"：{raw[int(row), int(hour)]}"
+        texts.append(text)
+    return texts
+
+
+def _day_ranges(doys):
+    """已排序的日期序号 -> 合并连续日期后的文本列表，如 ["3-5 ~ 3-9", "4-1"]"""
+    if len(doys) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(doys) != 1) + 1
+    starts = np.concatenate([[0], breaks])
+    ends = np.concatenate([breaks, [len(doys)]]) - 1
+    parts = []
+    for s, e in zip(doys[starts], doys[ends]):
+        m1, d1 = ordinal_to_month_day(int(s))
+        m2, d2 = ordinal_to_month_day(int(e))
+        parts.append(f"{m1}-{d1}" if s == e else f"{m1}-{d1} ~ {m2}-{d2}")
+    return parts
+
+
+def _type_ids(weather, issues):
+    """weatherType 的 id 列 -> 合法 id 数组（升序去重），顺带检查空 / 非数字 / 重复的 id"""
+    df = weather.df_weather_type
+    if "id" not in df.columns:
+        issues.append(ValidationIssue("type_no_id", ERROR, "weatherType 缺少 id 列", 1, []))
+        return np.zeros(0, dtype=np.int64)
+    # 读取时 id 已整理为可空整数：空、非数字与非整数均为 <NA>，原值见读取时记录的单元格问题
+    bad = df["id"].isna().to_numpy()
+    if bad.any():
+        rows = np.flatnonzero(bad)
+        raw = _raw_cells(weather, "weatherType")
+        issues.append(ValidationIssue(
+            "type_bad_id", ERROR, "weatherType 中 id 为空、非数字或非整数", len(rows),
+            [f"{_row_text(r)}：{raw.get((int(r), 'id'), ('', '空'))[1]}" for r in rows[:MAX_EXAMPLES]]))
+    ids = df["id"][~bad].to_numpy(dtype=np.int64)
+    uniq, counts = np.unique(ids, return_counts=True)
+    dup = uniq[counts > 1]
+    if len(dup):
+        issues.append(ValidationIssue(
+            "type_duplicate_id", ERROR, "weatherType 中同一 id 出现多行", len(dup),
+            [f"id {int(wid)}：{int(n)} 行" for wid, n in zip(dup[:MAX_EXAMPLES], counts[counts > 1][:MAX_EXAMPLES])]))
+    return uniq
+
+
+def _raw_cells(weather, sheet):
+    """读取时记录的某张表的非数字 / 非整数单元格：{(行号, 列名): (种类, 原值文本)}；未记录时为空"""
+    return {(row, column): (kind, text) for s, row, column, kind, text in weather._cell_issues or () if s == sheet}
+
+
+def validate_weather(weather):
+    """检查一份已加载的数据，返回 ValidationReport。
+    天气 ID、日期相关检查只用编译后的数组；读取时记录了单元格问题的，另外区分空格子、非数字文本与非整数"""
+    data = weather._data
+    n = len(data.months)
+    issues = []
+    type_ids = _type_ids(weather, issues)
+
+    # ---------- 日期 ----------
+    bad_date = data.doy < 0
+    if bad_date.any():
+        rows = np.flatnonzero(bad_date)
+        issues.append(ValidationIssue(
+            "invalid_date", ERROR, "日期不存在（或月 / 日为空、非数字）", len(rows),
+            [f"{_row_text(r)}：{_date_text(int(data.months[r]), int(data.days[r]))}" for r in rows[:MAX_EXAMPLES]]))
+    valid_rows = np.flatnonzero(~bad_date)
+    doy = data.doy[valid_rows]
+    uniq, counts = np.unique(doy, return_counts=True)
+    dup_days = uniq[counts > 1]
+    if len(dup_days):
+        examples = []
+        for d in dup_days[:MAX_EXAMPLES]:
+            rows = valid_rows[doy == d]
+            month, day = ordinal_to_month_day(int(d))
+            examples.append(f"{month}月{day}日：" + "、".join(_row_text(r) for r in rows))
+        issues.append(ValidationIssue("duplicate_date", ERROR, "同一日期出现多行（查询只使用第一行）", len(dup_days), examples))
+    present = np.zeros(sum(MONTH_DAYS), dtype=bool)
+    present[uniq] = True
+    present[_FEB29] = True
+    missing = np.flatnonzero(~present)
+    if len(missing):
+        parts = _day_ranges(missing)
+        issues.append(ValidationIssue("missing_date", WARNING, "缺少日期", len(missing), parts[:MAX_EXAMPLES]))
+
+    # ---------- 小时格 ----------
+    hour_ids = data.hour_ids
+    if weather._cell_issues is not None:
+        # 读取时已记录非数字 / 非整数的小时格（非整数已截断取整，非数字与空格子在数组中都为 -1）
+        raw = {}
+        non_numeric = np.zeros(hour_ids.shape, dtype=bool)
+        non_integer = np.zeros(hour_ids.shape, dtype=bool)
+        for (row, column), (kind, text) in _raw_cells(weather, "weatherList").items():
+            if column in HOUR_COLS and row < n:
+                hour = HOUR_COLS.index(column)
+                (non_numeric if kind == "non_numeric" else non_integer)[row, hour] = True
+                raw[row, hour] = text
+        for code, mask, title in (("non_numeric_hour", non_numeric, "小时格为非数字文本"),
+                                  ("non_integer_hour", non_integer, "小时格为非整数")):
+            cells = np.nonzero(mask)
+            if len(cells[0]):
+                issues.append(ValidationIssue(code, ERROR, title, len(cells[0]), _cell_texts(data, cells, raw)))
+        empty = (hour_ids < 0) & ~non_numeric
+        empty_title = "小时格为空"
+    else:
+        # 未记录读取时的单元格问题（如由已整理的表构造）：空格子与非数字文本在数组中都记为 -1，不再区分
+        empty = hour_ids < 0
+        empty_title = "小时格为空或非数字"
+    cells = np.nonzero(empty)
+    if len(cells[0]):
+        issues.append(ValidationIssue("empty_hour", WARNING, empty_title, len(cells[0]), _cell_texts(data, cells)))
+
+    # ---------- 天气 ID ----------
+    used = hour_ids[hour_ids >= 0]
+    used_ids, used_counts = np.unique(used, return_counts=True)
+    unknown = ~np.isin(used_ids, type_ids)
+    if unknown.any():
+        examples = []
+        for wid, hours in zip(used_ids[unknown][:MAX_EXAMPLES], used_counts[unknown][:MAX_EXAMPLES]):
+            cells = np.nonzero(hour_ids == wid)
+            first = _cell_texts(data, (cells[0][:1], cells[1][:1]))[0]
+            examples.append(f"ID {int(wid)}：{int(hours)} 小时，首次在 {first}")
+        issues.append(ValidationIssue("unknown_id", ERROR, "小时格中的天气 ID 不在 weatherType 中", int(unknown.sum()), examples))
+    unused = np.setdiff1d(type_ids, used_ids)
+    if len(unused):
+        issues.append(ValidationIssue("unused_id", NOTICE, "weatherType 中定义但全年未出现的天气 ID", len(unused),
+                                      [format_id_ranges(int(x) for x in unused)]))
+
+    return ValidationReport(weather.path, n, issues)
+
+
+def validate_paths(paths, loader=None):
+    """批量检查：paths 中每项为 weather.xlsx、项目根目录、logic 目录或分支名（见 weather.BRANCHES）。
+    loader(excel_path) -> Weather 默认直接读取 Excel；读取失败的记为一项错误。返回 ValidationReport 列表"""
+    reports = []
+    for path in paths:
+        excel_path = resolve_excel_path(BRANCHES.get(path, path))
+        try:
+            if loader is not None:
+                weather = loader(excel_path)
+            else:
+                weather = Weather(custom_excel_path=excel_path)
+                weather.read_file()
+        except Exception as e:
+            reports.append(ValidationReport(excel_path, 0, [ValidationIssue("load_failed", ERROR, "读取失败", 1, [str(e)])]))
+            continue
+        reports.append(weather.validate())
+    return reports
+
+
+def format_reports(reports):
+    """多份检查结果 -> 文本：先逐份一行摘要，再附各份明细"""
+    lines = ["═" * 60, f"  数据检查（共 {len(reports)} 份）", "═" * 60, ""]
+    for report in reports:
+        lines.append(f"  {'通过' if report.ok else '未通过'}  {report.summary():<24}  {report.path}")
+    lines.append("")
+    for report in reports:
+        if report.issues:
+            lines += ["", report.format_text()]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print(__doc__.strip())
+        return 2
+    reports = validate_paths(argv)
+    print(format_reports(reports))
+    return 0 if all(r.ok for r in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+界面卡顿监视：主线程（Tk 事件循环）每隔 interval_ms 通过 root.after 打一次心跳，
+辅助线程检查心跳是否迟到；迟到超过阈值即视为卡顿，用 sys._current_frames() 抓取主线程此刻的 Python 调用栈，
+卡顿持续时每隔一个阈值再采样一次。卡顿结束后把时长、当时正在执行的界面处理函数（如 _set_result_table）
+与调用栈写入日志，便于复现和定位「偶发卡几秒」的问题。
+
+日志为 UTF-8 文本，超过 MAX_LOG_BYTES 时把旧日志改名为 .1 后重新开始。
+"""
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timedelta
+
+# 单次卡顿最多采样次数、每次采样保留的栈帧数
+MAX_SAMPLES = 10
+MAX_FRAMES = 20
+MAX_LOG_BYTES = 1 << 20
+# 主线程栈中没有界面处理函数时（卡在 Tk 自身的重绘、布局等）显示的名称
+NO_HANDLER = "（Tk 内部，无 Python 处理函数）"
+
+
+class Stall:
+    """一次卡顿：started_at 为开始时间，duration_ms 为心跳迟到的毫秒数，handler 为首次采样时正在执行的处理函数，
+    samples 为 [(卡顿已持续毫秒, 处理函数, 栈文本行列表), ...]"""
+    __slots__ = ("started_at", "duration_ms", "handler", "samples", "_beat", "_last_sample")
+
+    def __init__(self, started_at, beat):
+        self.started_at = started_at
+        self.duration_ms = 0
+        self.handler = NO_HANDLER
+        self.samples = []
+        self._beat = beat
+        self._last_sample = 0.0
+
+    def format_text(self):
+        lines = [f"{self.started_at:%Y-%m-%d %H:%M:%S}  主线程卡顿 {self.duration_ms} ms  处理函数: {self.handler}"]
+        previous = None
+        for elapsed_ms, handler, stack in self.samples:
+            if stack == previous:
+                lines.append(f"  采样（已卡 {elapsed_ms} ms）: {handler}（调用栈同上）")
+                continue
+            lines.append(f"  采样（已卡 {elapsed_ms} ms）: {handler}")
+            lines.extend(f"    {line}" for line in stack)
+            previous = stack
+        return "\n".join(lines) + "\n"
+
+    def __repr__(self):
+        return f"Stall({self.duration_ms} ms, {self.handler})"
+
+
+class StallWatchdog:
+    """Tk 事件循环卡顿监视。须在主线程中创建并 start()；app_files 为界面代码所在的源文件，
+    采样时取栈中最内层属于这些文件的函数作为「处理函数」"""
+
+    def __init__(self, root, log_path, threshold_ms=1000, interval_ms=100, app_files=()):
+        self.root = root
+        self.log_path = log_path
+        self.threshold = max(int(threshold_ms), 1) / 1000.0
+        self.interval_ms = max(int(interval_ms), 10)
+        self.app_files = {os.path.normcase(os.path.abspath(f)) for f in app_files}
+        self.stalls = deque(maxlen=50)  # 最近的卡顿记录
+        self._main_ident = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._after_id = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            self._last_beat = time.perf_counter()
+        self._after_id = self.root.after(self.interval_ms, self._beat)
+        self._thread = threading.Thread(target=self._watch, name="weather-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+
+    def _beat(self):
+        """主线程心跳：记录时间并预约下一次"""
+        with self._lock:
+            self._last_beat = time.perf_counter()
+        if not self._stop.is_set():
+            self._after_id = self.root.after(self.interval_ms, self._beat)
+
+    def _watch(self):
+        interval = self.interval_ms / 1000.0
+        stall = None
+        while not self._stop.wait(interval / 2):
+            with self._lock:
+                last = self._last_beat
+            now = time.perf_counter()
+            if stall is not None and last > stall._beat:
+                # 心跳恢复：迟到时长 = 实际心跳时刻 - 预期心跳时刻
+                stall.duration_ms = int((last - stall._beat - interval) * 1000)
+                self.stalls.append(stall)
+                self._write(stall)
+                stall = None
+            late = now - last - interval
+            if late < self.threshold:
+                continue
+            if stall is None:
+                stall = Stall(datetime.now() - timedelta(seconds=late), last)
+            if len(stall.samples) < MAX_SAMPLES and now - stall._last_sample >= self.threshold:
+                stall._last_sample = now
+                handler, stack = self._sample()
+                if not stall.samples:
+                    stall.handler = handler
+                stall.samples.append((int(late * 1000), handler, stack))
+
+    def _sample(self):
+        """抓取主线程当前的调用栈：返回 (处理函数名, 栈文本行列表（由外到内，最多 MAX_FRAMES 帧）)"""
+        frame = sys._current_frames().get(self._main_ident)
+        if frame is None:
+            return NO_HANDLER, []
+        summary = traceback.extract_stack(frame)
+        handler = NO_HANDLER
+        for entry in reversed(summary):
+            if os.path.normcase(os.path.abspath(entry.filename)) in self.app_files:
+                handler = entry.name
+                break
+        lines = []
+        for entry in summary[-MAX_FRAMES:]:
+            lines.append(f'File "{entry.filename}", line {entry.lineno}, in {entry.name}')
+            if entry.line:
+                lines.append(f"  {entry.line}")
+        return handler, lines
+
+    def _write(self, stall):
+        text = stall.format_text()
+        try:
+            if os.path.isfile(self.log_path) and os.path.getsize(self.log_path) > MAX_LOG_BYTES:
+                os.replace(self.log_path, self.log_path + ".1")
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(text + "\n")
+        except OSError:
+            pass
+        if sys.stderr is not None:
+            # 源码运行时同时在控制台提示一行；打包后的窗口程序没有 stderr
+            print(text.splitlines()[0], file=sys.stderr)
+